@@ -1,4 +1,4 @@
-from model.agent import Agent
+from model.agent import Completion
 from boundary.llms.moonshot import MoonshotChatReceiver
 from prompts.system_prompt import JSON_FIX_PROMPT
 
@@ -9,7 +9,7 @@ def make_new_json_agent():
         system_prompt=JSON_FIX_PROMPT,
         use_json=True
     )
-    return Agent(m_chat, name="json_agent")
+    return Completion(m_chat, name="json_agent")
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -1,15 +1,20 @@
 import asyncio
 
-from model.agent import Agent
+from model.agent import Completion
 from boundary.llms.deepseek import DeepseekChatReceiver
-from prompts import system_prompt
+from prompts import system_prompt, json_schemas
+
+# Model of the plan agent, part of the cache key of generated plans
+PLAN_MODEL = "deepseek-chat"
 
 def make_new_plan_agent():
     m_chat = DeepseekChatReceiver(
+        model=PLAN_MODEL,
         system_prompt=system_prompt.STUDY_PLAN_PROMPT,
-        use_json=True
+        use_json=True,
+        json_schema=json_schemas.STUDY_PLAN_SCHEMA
     )
-    return Agent(m_chat, name="your_study_planner")
+    return Completion(m_chat, name="your_study_planner")
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -1,17 +1,21 @@
 import asyncio
 
-from model.agent import Agent
+from model.agent import Completion
 from boundary.llms.deepseek import DeepseekChatReceiver
-from prompts import system_prompt
+from prompts import system_prompt, json_schemas
+
+# Model of the plan review agent, part of the cache key of generated plans
+PLAN_REVIEW_MODEL = "deepseek-reasoner"
 
 def make_new_plan_review_agent():
     # Create a DeepseekChatReceiver instance with the deepseek-reasoner model
     m_chat = DeepseekChatReceiver(
-        model="deepseek-reasoner",
+        model=PLAN_REVIEW_MODEL,
         system_prompt=system_prompt.PLAN_REVIEW_PROMPT,
-        use_json=True
+        use_json=True,
+        json_schema=json_schemas.PLAN_REVIEW_SCHEMA
     )
-    return Agent(m_chat, name="plan_review_agent")
+    return Completion(m_chat, name="plan_review_agent")
 
 if __name__ == '__main__':
     pass
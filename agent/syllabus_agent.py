@@ -1,24 +1,38 @@
-import asyncio
-from typing import Sequence
+from boundary.llms.chatgpt import ChatGPTReceiver
+from model.agent import Agent, Completion
+from prompts import system_prompt, json_schemas
+from util.document_tools import PagedDocument, make_document_tools
 
-from autogen_agentchat.agents import BaseChatAgent, AssistantAgent
-from autogen_agentchat.base import Response
-from autogen_agentchat.messages import AgentEvent, ChatMessage, TextMessage
-from autogen_agentchat.ui import Console
-from autogen_core import CancellationToken
+# Tool calls the syllabus agent may make before it has to answer
+MAX_TOOL_ITERATIONS = 8
+# Model of the syllabus agent, part of the cache key of syllabus analyses
+SYLLABUS_MODEL = "gpt-4o-mini"
 
-from boundary.llms.moonshot import MoonshotChatReceiver
-from boundary.llms.chatgpt import ChatGPTReceiver
-from model.agent import Agent
-from prompts import system_prompt
-from util.text_extractor import json_extractor
+def make_new_syllabus_agent(document: PagedDocument = None):
+    """Make a syllabus analysis agent
+
+    Args:
+        document: Extracted syllabus. When given, the agent reads it through
+            retrieval tools instead of receiving it in the message.
+    """
+    if document is None:
+        m_chat = ChatGPTReceiver(
+            model=SYLLABUS_MODEL,
+            system_prompt=system_prompt.SYLLABUS_ANALYSIS_PROMPT,
+            use_json=True,
+            json_schema=json_schemas.SYLLABUS_ANALYSIS_SCHEMA
+        )
+        return Completion(m_chat, name="syllabus_agent")
 
-def make_new_syllabus_agent():
     m_chat = ChatGPTReceiver(
-        system_prompt=system_prompt.SYLLABUS_ANALYSIS_PROMPT,
-        use_json=True
+        model=SYLLABUS_MODEL,
+        system_prompt=system_prompt.SYLLABUS_ANALYSIS_TOOLS_PROMPT,
+        use_json=True,
+        json_schema=json_schemas.SYLLABUS_ANALYSIS_SCHEMA
     )
-    return Agent(m_chat, name="syllabus_agent")
+    return Agent(m_chat, name="syllabus_agent",
+                 tools=make_document_tools(document),
+                 max_tool_iterations=MAX_TOOL_ITERATIONS)
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
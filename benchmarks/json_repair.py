@@ -0,0 +1,87 @@
+"""
+Corpus benchmark for fix_json on malformed model output.
+
+Runs every case of benchmarks/json_repair_corpus.jsonl (one {"name", "input",
+"expected"} object per line) through fix_json and reports which path fixed it,
+whether the result matches the expected value and how long it took. LLM_MODE
+defaults to "synthetic", so cases that fall through to the json_agent do not
+call a provider; any "agent" path in the report is a case to teach repair_json.
+
+Usage:
+    python -m benchmarks.json_repair --repeat 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("LLM_MODE", "synthetic")
+
+from util.json_fixer import JSON_FIX_PATHS, fix_json
+
+CORPUS = os.path.join(os.path.dirname(__file__), "json_repair_corpus.jsonl")
+PATHS = ("native", "direct", "extracted", "repaired", "agent", "failed")
+
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def path_counts():
+    return {path: JSON_FIX_PATHS.value(path=path) for path in PATHS}
+
+
+async def run_case(case, repeat):
+    """Fix one case repeat times, returning (path, correct, seconds per call)"""
+    before = path_counts()
+    try:
+        result = await fix_json(case["input"])
+    except ValueError:
+        result = None
+    after = path_counts()
+    path = next((p for p in PATHS if after[p] > before[p]), "failed")
+
+    started = time.perf_counter()
+    if path != "agent":
+        for _ in range(repeat):
+            try:
+                await fix_json(case["input"])
+            except ValueError:
+                pass
+        elapsed = (time.perf_counter() - started) / repeat
+    else:
+        elapsed = None
+    return path, result == case["expected"], elapsed
+
+
+async def main(corpus, repeat):
+    cases = load_corpus(corpus)
+    paths = {}
+    correct = 0
+    timings = []
+
+    for case in cases:
+        path, ok, elapsed = await run_case(case, repeat)
+        paths[path] = paths.get(path, 0) + 1
+        correct += ok
+        if elapsed is not None:
+            timings.append(elapsed)
+        latency = f"{elapsed * 1e6:.0f}us" if elapsed is not None else "-"
+        print(f"{case['name']:>32}: {path:<9} {'ok' if ok else 'WRONG':<5} {latency}")
+
+    print(f"cases={len(cases)} correct={correct} "
+          + " ".join(f"{path}={paths.get(path, 0)}" for path in PATHS))
+    if timings:
+        print(f"local fix: mean={statistics.mean(timings) * 1e6:.0f}us max={max(timings) * 1e6:.0f}us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.corpus, args.repeat))
@@ -0,0 +1,107 @@
+"""
+Offline load test for the syllabus -> plan -> review agent pipeline.
+
+Runs the same agent factories that run_schedule_analysis uses, with LLM_MODE
+defaulting to "synthetic" so no provider is called. Set LLM_MODE=replay (and
+LLM_CASSETTE_DIR) to replay recorded traffic instead.
+
+Usage:
+    python -m benchmarks.llm_pipeline --runs 50 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("LLM_MODE", "synthetic")
+
+from agent.plan_agent import make_new_plan_agent
+from agent.plan_review_agent import make_new_plan_review_agent
+from agent.syllabus_agent import make_new_syllabus_agent
+from util.json_stream import JsonStreamParser
+from util.plan_validator import check_plan
+
+SAMPLE_SYLLABUS = {
+    1: "Course 15-440 Distributed Systems. Labs 75%, quizzes 25%. Lab 1 released 9.1 due 9.15.",
+    2: "Quizzes are available online for three days. Topics: RPC, time, consensus, CAP theorem.",
+}
+SAMPLE_CALENDAR = {
+    1: "9.15 Lab 1 due\n9.20 Quiz 1\n10.6 Lab 2 due\n10.11 Quiz 2",
+}
+
+
+async def run_pipeline():
+    """Run one full pipeline and return per-stage latencies in seconds"""
+    timings = {}
+
+    started = time.perf_counter()
+    syllabus_agent = make_new_syllabus_agent()
+    analysis = await syllabus_agent.send_message(json.dumps(SAMPLE_SYLLABUS))
+    timings["syllabus"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    plan_agent = make_new_plan_agent()
+    parser = JsonStreamParser()
+    async for _day in plan_agent.stream_json(
+            f"Syllabus Analysis: {analysis}\n\nSchedule: {json.dumps(SAMPLE_CALENDAR)}", parser):
+        timings.setdefault("plan_first_day", time.perf_counter() - started)
+    plan = json.dumps(parser.value) if parser.done else parser.text
+    timings["plan"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    check = check_plan(parser.value) if parser.done else None
+    if check is None or not check.ok:
+        review_agent = make_new_plan_review_agent()
+        await review_agent.send_message(f"Review this study plan.\n\nStudy Plan: {plan}")
+    timings["review"] = time.perf_counter() - started
+
+    timings["total"] = timings["syllabus"] + timings["plan"] + timings["review"]
+    return timings
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def main(runs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def bounded():
+        nonlocal failures
+        async with semaphore:
+            try:
+                return await run_pipeline()
+            except Exception as e:
+                failures += 1
+                print(f"Pipeline failed: {e}")
+                return None
+
+    started = time.perf_counter()
+    results = [r for r in await asyncio.gather(*(bounded() for _ in range(runs))) if r]
+    elapsed = time.perf_counter() - started
+
+    print(f"LLM_MODE={os.environ['LLM_MODE']} runs={runs} concurrency={concurrency} "
+          f"failures={failures} wall={elapsed:.2f}s throughput={len(results) / elapsed:.2f} pipelines/s")
+    if not results:
+        return
+    for stage in ("syllabus", "plan_first_day", "plan", "review", "total"):
+        values = [r[stage] for r in results if stage in r]
+        if not values:
+            continue
+        print(f"{stage:>14}: p50={percentile(values, 50) * 1000:.0f}ms "
+              f"p95={percentile(values, 95) * 1000:.0f}ms "
+              f"mean={statistics.mean(values) * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.concurrency))
@@ -0,0 +1,235 @@
+"""
+Continuation of responses cut off by the output token limit.
+
+ContinuingChatCompletionClient wraps a model client. When a text response ends
+with finish_reason "length", it asks the model to continue from the partial
+output and stitches the pieces into one response, so a long plan costs one
+more short call instead of a wasted generation and a full retry. The
+conversation prefix is unchanged, so continuation calls hit the provider's
+prompt cache.
+"""
+
+import os
+import re
+from typing import Any, AsyncGenerator, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (AssistantMessage, ChatCompletionClient, CreateResult, LLMMessage, ModelInfo,
+                                 RequestUsage, UserMessage)
+
+from prompts.system_prompt import CONTINUE_OUTPUT_PROMPT
+from util import metrics
+
+LLM_CONTINUATIONS = metrics.counter(
+    "llm_continuations_total", "Continuation calls made for responses cut off by the output token limit",
+    ("provider", "model", "agent"))
+
+# Shortest and longest repeated text removed from the start of a continuation
+MIN_OVERLAP = 16
+MAX_OVERLAP = 512
+
+_OPENING_FENCE = re.compile(r"^\s*```(?:json)?[ \t]*\n")
+
+
+def stitch(previous: str, continuation: str) -> str:
+    """Text of a continuation to append to the output it continues
+
+    Models sometimes reopen a code fence or repeat the end of the partial
+    output before continuing; both are dropped.
+
+    Args:
+        previous: The output so far
+        continuation: The text of the continuation response
+
+    Returns:
+        str: The continuation without the repeated part
+    """
+    continuation = _OPENING_FENCE.sub("", continuation, count=1)
+    for size in range(min(len(previous), len(continuation), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+def _is_truncated(result: CreateResult) -> bool:
+    return result.finish_reason == "length" and isinstance(result.content, str)
+
+
+def _add_usage(a: RequestUsage, b: RequestUsage) -> RequestUsage:
+    return RequestUsage(prompt_tokens=a.prompt_tokens + b.prompt_tokens,
+                        completion_tokens=a.completion_tokens + b.completion_tokens)
+
+
+class ContinuingChatCompletionClient(ChatCompletionClient):
+    """Model client wrapper continuing responses cut off by the output token limit
+
+    Args:
+        inner: The client serving completions, usually an InstrumentedChatCompletionClient
+        max_continuations: Continuation calls per response, LLM_MAX_CONTINUATIONS by default
+    """
+
+    def __init__(self, inner: ChatCompletionClient, max_continuations: Optional[int] = None):
+        self._inner = inner
+        self.max_continuations = int(os.getenv("LLM_MAX_CONTINUATIONS", "2")) \
+            if max_continuations is None else max_continuations
+
+    @property
+    def inner(self) -> ChatCompletionClient:
+        return self._inner
+
+    @property
+    def agent_name(self) -> str:
+        return getattr(self._inner, "agent_name", "")
+
+    @agent_name.setter
+    def agent_name(self, name: str):
+        self._inner.agent_name = name
+
+    def _count_continuation(self):
+        LLM_CONTINUATIONS.inc(provider=getattr(self._inner, "provider", "unknown"),
+                              model=getattr(self._inner, "model", ""),
+                              agent=self.agent_name or "unknown")
+
+    @staticmethod
+    def _continuation_messages(messages: Sequence[LLMMessage], output: str) -> List[LLMMessage]:
+        return list(messages) + [
+            AssistantMessage(content=output, source="assistant"),
+            UserMessage(content=CONTINUE_OUTPUT_PROMPT, source="user"),
+        ]
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        result = await self._inner.create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        output, usage = result.content, result.usage
+        continuations = 0
+        while _is_truncated(result) and continuations < self.max_continuations:
+            continuations += 1
+            self._count_continuation()
+            # The partial output is not valid JSON, so the continuation is requested as plain text
+            result = await self._inner.create(
+                self._continuation_messages(messages, output),
+                json_output=False,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+            usage = _add_usage(usage, result.usage)
+            if isinstance(result.content, str):
+                output += stitch(output, result.content)
+
+        if not continuations:
+            return result
+        return CreateResult(finish_reason=result.finish_reason, content=output, usage=usage, cached=False)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        stream = self._inner.create_stream(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        output = ""
+        result = None
+        try:
+            async for chunk in stream:
+                if isinstance(chunk, CreateResult):
+                    result = chunk
+                else:
+                    output += chunk
+                    yield chunk
+        finally:
+            await stream.aclose()
+        if result is None:
+            return
+
+        usage = result.usage
+        continuations = 0
+        while _is_truncated(result) and continuations < self.max_continuations:
+            continuations += 1
+            self._count_continuation()
+            stream = self._inner.create_stream(
+                self._continuation_messages(messages, output),
+                json_output=False,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+            # Hold back the start of the continuation until repeated text can be dropped
+            pending = ""
+            stitched = False
+            try:
+                async for chunk in stream:
+                    if isinstance(chunk, CreateResult):
+                        result = chunk
+                        continue
+                    if stitched:
+                        output += chunk
+                        yield chunk
+                        continue
+                    pending += chunk
+                    if len(pending) >= MAX_OVERLAP:
+                        text = stitch(output, pending)
+                        output += text
+                        stitched = True
+                        if text:
+                            yield text
+            finally:
+                await stream.aclose()
+            if not stitched and pending:
+                text = stitch(output, pending)
+                output += text
+                if text:
+                    yield text
+            usage = _add_usage(usage, result.usage)
+
+        if not continuations:
+            yield result
+        else:
+            yield CreateResult(finish_reason=result.finish_reason, content=output, usage=usage, cached=False)
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> Any:
+        return self._inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
@@ -1,23 +1,25 @@
 from autogen_core.models import UserMessage
 
 from model.chat_receiver import ChatReceiver
-from dotenv import load_dotenv
+from util.env import load_env
 import os
 import asyncio
 import json
-import re
-
-load_dotenv()
 
 
 class DeepseekChatReceiver(ChatReceiver):
+    provider = "deepseek"
+    structured_output = "json_object"
+
     def __init__(self, api_key=None, base_url=None,
                  model="deepseek-chat",
                  system_prompt="",
                  temperature=0.6,
                  use_vision=False,
                  use_function_call=True,
-                 use_json=False):
+                 use_json=False,
+                 json_schema=None):
+        load_env()
         if api_key is None:
             api_key = os.getenv("DEEPSEEK_API_KEY")
         if base_url is None:
@@ -31,7 +33,14 @@ class DeepseekChatReceiver(ChatReceiver):
                          temperature=temperature,
                          use_json=use_json,
                          use_vision=use_vision,
-                         use_function_call=use_function_call)
+                         use_function_call=use_function_call,
+                         json_schema=json_schema)
+
+    def structured_output_mode(self, model_name: str):
+        # deepseek-reasoner does not accept response_format
+        if model_name == "deepseek-reasoner":
+            return None
+        return self.structured_output
 
     def make_message(self, message: str) -> list:
         new_message = [
@@ -48,36 +57,19 @@ class DeepseekChatReceiver(ChatReceiver):
     def handle_message(self, response):
         # Extract the content from the response
         content = response.content
-        
-        # If we're in JSON mode, validate the response is proper JSON
+
+        # In JSON mode, return just the JSON payload, validated against the schema
         if self.use_json_mode:
-            try:
-                # Try to parse the content as JSON to validate it
-                json_content = json.loads(content)
-                # Return the original string (not the parsed object)
-                # to maintain consistency with the expected return type
-                return content
-            except json.JSONDecodeError:
-                # If JSON parsing fails, try to extract JSON from the text
-                # Look for content between curly braces or square brackets
-                json_pattern = r'(\[.*\]|\{.*\})'
-                match = re.search(json_pattern, content, re.DOTALL)
-                if match:
-                    try:
-                        extracted_json = match.group(0)
-                        # Validate it's proper JSON
-                        json.loads(extracted_json)
-                        return extracted_json
-                    except json.JSONDecodeError:
-                        pass
-                # If all attempts fail, return the original content
-                return content
+            return self.extract_json(content)
         return content
 
 
-# Create a default instance with system prompt from the project
-from prompts.system_prompt import STUDY_PLAN_PROMPT
-DeepseekDefault = DeepseekChatReceiver(system_prompt=STUDY_PLAN_PROMPT)
+def __getattr__(name):
+    # The default instance is built on first access, see boundary.llms.registry
+    if name == "DeepseekDefault":
+        from boundary.llms.registry import get_provider
+        return get_provider("deepseek_default")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
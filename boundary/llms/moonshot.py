@@ -1,22 +1,24 @@
 from autogen_core.models import UserMessage
 
 from model.chat_receiver import ChatReceiver
-from dotenv import load_dotenv
+from util.env import load_env
 import os
 import asyncio
 import json
-import re
-
-load_dotenv()
 
 
 class MoonshotChatReceiver(ChatReceiver):
+    provider = "moonshot"
+    structured_output = "json_object"
+
     def __init__(self, api_key = None, base_url = None,
                  system_prompt = "",
                  temperature = 0.6,
                  use_vision = False,
                  use_function_call = True,
-                 use_json = False):
+                 use_json = False,
+                 json_schema = None):
+        load_env()
         if api_key is None:
             api_key = os.getenv("MOONSHOT_API_KEY")
         if base_url is None:
@@ -27,7 +29,8 @@ class MoonshotChatReceiver(ChatReceiver):
         
         super().__init__(api_key,base_url, "moonshot-v1-32k",
                          system_prompt=system_prompt,
-                         temperature= temperature,use_json=use_json,use_vision=use_vision,use_function_call=use_function_call)
+                         temperature= temperature,use_json=use_json,use_vision=use_vision,use_function_call=use_function_call,
+                         json_schema=json_schema)
 
     def make_message(self, message: str) -> list:
         new_message = [
@@ -44,35 +47,19 @@ class MoonshotChatReceiver(ChatReceiver):
     def handle_message(self, response):
         # Extract the content from the response
         content = response.content
-        
-        # If we're in JSON mode, validate the response is proper JSON
+
+        # In JSON mode, return just the JSON payload, validated against the schema
         if self.use_json_mode:
-            try:
-                # Try to parse the content as JSON to validate it
-                json_content = json.loads(content)
-                # Return the original string (not the parsed object)
-                # to maintain consistency with the expected return type
-                return content
-            except json.JSONDecodeError:
-                # If JSON parsing fails, try to extract JSON from the text
-                # Look for content between curly braces or square brackets
-                json_pattern = r'(\[.*\]|\{.*\})'
-                match = re.search(json_pattern, content, re.DOTALL)
-                if match:
-                    try:
-                        extracted_json = match.group(0)
-                        # Validate it's proper JSON
-                        json.loads(extracted_json)
-                        return extracted_json
-                    except json.JSONDecodeError:
-                        pass
-                # If all attempts fail, return the original content
-                return content
+            return self.extract_json(content)
         return content
 
 
-from prompts.system_prompt import STUDY_PLAN_PROMPT
-KimiStaticTesting = MoonshotChatReceiver(system_prompt=STUDY_PLAN_PROMPT)
+def __getattr__(name):
+    # The default instance is built on first access, see boundary.llms.registry
+    if name == "KimiStaticTesting":
+        from boundary.llms.registry import get_provider
+        return get_provider("kimi_static_testing")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Lazy registry of shared LLM providers.
+
+Providers are registered as factories and only built, with their live model
+client, the first time get_provider() asks for them. Importing a provider
+module no longer constructs anything, so worker startup does not pay for
+clients that request handlers never use.
+
+The old module-level defaults (ChatGPTDefault, DeepseekDefault,
+KimiStaticTesting) are still importable from their modules; they resolve
+through this registry on first access.
+"""
+
+import threading
+from typing import Callable, Dict
+
+from model.chat_receiver import ChatReceiver
+
+_factories: Dict[str, Callable[[], ChatReceiver]] = {}
+_instances: Dict[str, ChatReceiver] = {}
+_lock = threading.Lock()
+
+
+def register_provider(name: str, factory: Callable[[], ChatReceiver]):
+    """Register a factory building a shared provider
+
+    Args:
+        name: Name the provider is looked up by
+        factory: Callable returning the ChatReceiver, called on first use only
+    """
+    with _lock:
+        _factories[name] = factory
+        # A re-registered provider is rebuilt on next use
+        _instances.pop(name, None)
+
+
+def get_provider(name: str) -> ChatReceiver:
+    """Get a shared provider, building it on first use
+
+    Args:
+        name: Name the provider was registered under
+
+    Returns:
+        ChatReceiver: The shared provider instance
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            if name not in _factories:
+                raise KeyError(f"No LLM provider registered as '{name}'")
+            instance = _factories[name]()
+            _instances[name] = instance
+        return instance
+
+
+def reset_providers():
+    """Drop every built provider, so the next get_provider() rebuilds from configuration"""
+    with _lock:
+        _instances.clear()
+
+
+def _chatgpt_default():
+    from boundary.llms.chatgpt import ChatGPTReceiver
+    from prompts.system_prompt import STUDY_PLAN_PROMPT
+    return ChatGPTReceiver(system_prompt=STUDY_PLAN_PROMPT)
+
+
+def _deepseek_default():
+    from boundary.llms.deepseek import DeepseekChatReceiver
+    from prompts.system_prompt import STUDY_PLAN_PROMPT
+    return DeepseekChatReceiver(system_prompt=STUDY_PLAN_PROMPT)
+
+
+def _kimi_static_testing():
+    from boundary.llms.moonshot import MoonshotChatReceiver
+    from prompts.system_prompt import STUDY_PLAN_PROMPT
+    return MoonshotChatReceiver(system_prompt=STUDY_PLAN_PROMPT)
+
+
+register_provider("chatgpt_default", _chatgpt_default)
+register_provider("deepseek_default", _deepseek_default)
+register_provider("kimi_static_testing", _kimi_static_testing)
@@ -0,0 +1,355 @@
+"""
+Per-call LLM telemetry.
+
+InstrumentedChatCompletionClient wraps any autogen ChatCompletionClient and, for
+every call, records provider, model, agent name, prompt/completion tokens,
+latency, retries and outcome into the metrics exposed on /metrics.
+
+Retries of transient provider errors happen here (the OpenAI SDK's own retries
+are disabled in ChatReceiver.set_up_client) so that they can be counted.
+
+autogen's CreateResult drops the prompt tokens served from the provider's prefix
+cache, so they are read from the raw response autogen logs as an LLMCallEvent
+while the call is in flight. Streams do not log the raw usage and are not
+covered.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Sequence, Union
+
+import openai
+from autogen_core import EVENT_LOGGER_NAME, CancellationToken
+from autogen_core.logging import LLMCallEvent
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelInfo, RequestUsage
+
+from boundary.llms.offline import SyntheticProviderError
+from util import metrics
+from util.concurrency import ConcurrencyLimiter, RateLimiter
+
+LABELS = ("provider", "model", "agent")
+
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total", "LLM calls by outcome (success, truncated, error, cancelled, stopped)", LABELS + ("outcome",))
+LLM_RETRIES = metrics.counter(
+    "llm_retries_total", "Retried attempts of LLM calls after transient errors", LABELS)
+LLM_PROMPT_TOKENS = metrics.counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the provider", LABELS)
+LLM_COMPLETION_TOKENS = metrics.counter(
+    "llm_completion_tokens_total", "Completion tokens generated by the provider", LABELS)
+LLM_LATENCY = metrics.histogram(
+    "llm_request_latency_seconds", "Wall time of LLM calls including retries", LABELS)
+LLM_COMPLETION_TOKENS_PER_CALL = metrics.histogram(
+    "llm_completion_tokens", "Completion tokens per LLM call", LABELS,
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192))
+LLM_SLOT_WAIT = metrics.histogram(
+    "llm_slot_wait_seconds", "Time LLM calls waited for a concurrency slot and the rate limit of their provider", LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60))
+LLM_CACHED_PROMPT_TOKENS = metrics.counter(
+    "llm_cached_prompt_tokens_total", "Prompt tokens served from the provider's prefix cache", LABELS)
+LLM_PROMPT_CACHE_LATENCY = metrics.histogram(
+    "llm_prompt_cache_latency_seconds",
+    "Wall time of LLM calls by prefix cache hit or miss, to compare the latency of cached prompts", LABELS + ("cache",))
+
+# Errors worth retrying: network failures, rate limits and provider-side 5xx
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    SyntheticProviderError,
+)
+
+
+_slots: Dict[str, ConcurrencyLimiter] = {}
+_slots_lock = threading.Lock()
+
+
+def provider_slots(provider: str) -> ConcurrencyLimiter:
+    """Concurrency slots of a provider, LLM_MAX_CONCURRENT calls at once (0 for no limit)"""
+    with _slots_lock:
+        if provider not in _slots:
+            _slots[provider] = ConcurrencyLimiter(int(os.getenv("LLM_MAX_CONCURRENT", "16")))
+        return _slots[provider]
+
+
+_rates: Dict[str, RateLimiter] = {}
+
+
+def provider_rate(provider: str) -> RateLimiter:
+    """Rate limit of a provider, LLM_MAX_CALLS_PER_MINUTE calls a minute (0 for no limit)"""
+    with _slots_lock:
+        if provider not in _rates:
+            _rates[provider] = RateLimiter(float(os.getenv("LLM_MAX_CALLS_PER_MINUTE", "0")))
+        return _rates[provider]
+
+
+def _outcome(result: CreateResult) -> str:
+    return "truncated" if result.finish_reason == "length" else "success"
+
+
+class _CallUsage:
+    """Raw usage of the call in flight, filled in by _UsageEventHandler"""
+
+    def __init__(self):
+        self.cached_tokens: Optional[int] = None
+
+
+_current_call: contextvars.ContextVar[Optional[_CallUsage]] = contextvars.ContextVar("llm_call_usage", default=None)
+
+
+def cached_tokens_from_usage(usage: Optional[Mapping[str, Any]]) -> int:
+    """Read the cached prompt tokens out of a raw provider usage object
+
+    Args:
+        usage: The "usage" of a chat completion response
+
+    Returns:
+        int: Cached prompt tokens, 0 if the provider did not report any
+    """
+    if not usage:
+        return 0
+    # OpenAI
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens"):
+        return details["cached_tokens"]
+    # DeepSeek
+    if usage.get("prompt_cache_hit_tokens"):
+        return usage["prompt_cache_hit_tokens"]
+    # Moonshot
+    return usage.get("cached_tokens") or 0
+
+
+class _UsageEventHandler(logging.Handler):
+    """Copies the cached token count of each logged LLMCallEvent to the call in flight"""
+
+    def emit(self, record: logging.LogRecord):
+        call = _current_call.get()
+        if call is None or not isinstance(record.msg, LLMCallEvent):
+            return
+        response = record.msg.kwargs.get("response") or {}
+        call.cached_tokens = cached_tokens_from_usage(response.get("usage"))
+
+
+def _install_usage_handler():
+    event_logger = logging.getLogger(EVENT_LOGGER_NAME)
+    if not any(isinstance(h, _UsageEventHandler) for h in event_logger.handlers):
+        event_logger.addHandler(_UsageEventHandler())
+    # Events are only dispatched at INFO. They hold full prompts and responses, so
+    # when only this handler wants them they must not reach the root handlers.
+    if not event_logger.isEnabledFor(logging.INFO):
+        event_logger.setLevel(logging.INFO)
+        event_logger.propagate = False
+
+
+_install_usage_handler()
+
+
+class InstrumentedChatCompletionClient(ChatCompletionClient):
+    """Model client wrapper recording usage, latency, retries and outcome of each call
+
+    Calls also take one of the provider's concurrency slots for their duration,
+    given back as soon as they finish, fail or are cancelled.
+
+    Args:
+        inner: The client actually serving completions
+        provider: Provider label (openai, deepseek, moonshot, ...)
+        model: Model label
+        agent_name: Agent label, updated by ChatReceiver.set_agent_name
+        max_retries: Retries of transient errors before giving up
+        backoff_seconds: Base delay of the exponential backoff between retries
+    """
+
+    def __init__(self, inner: ChatCompletionClient, provider: str, model: str,
+                 agent_name: str = "",
+                 max_retries: Optional[int] = None,
+                 backoff_seconds: float = 0.5):
+        self._inner = inner
+        self.provider = provider
+        self.model = model
+        self.agent_name = agent_name
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2")) if max_retries is None else max_retries
+        self.backoff_seconds = backoff_seconds
+
+    @property
+    def inner(self) -> ChatCompletionClient:
+        return self._inner
+
+    def _labels(self) -> dict:
+        return {"provider": self.provider, "model": self.model, "agent": self.agent_name or "unknown"}
+
+    def _record(self, labels: dict, outcome: str, started: float, result: Optional[CreateResult] = None,
+                cached_tokens: Optional[int] = None):
+        elapsed = time.perf_counter() - started
+        LLM_REQUESTS.inc(outcome=outcome, **labels)
+        LLM_LATENCY.observe(elapsed, **labels)
+        if result is not None:
+            LLM_PROMPT_TOKENS.inc(result.usage.prompt_tokens, **labels)
+            LLM_COMPLETION_TOKENS.inc(result.usage.completion_tokens, **labels)
+            LLM_COMPLETION_TOKENS_PER_CALL.observe(result.usage.completion_tokens, **labels)
+        if cached_tokens is not None:
+            LLM_CACHED_PROMPT_TOKENS.inc(cached_tokens, **labels)
+            LLM_PROMPT_CACHE_LATENCY.observe(elapsed, cache="hit" if cached_tokens else "miss", **labels)
+
+    async def _backoff(self, attempt: int, labels: dict, error: Exception):
+        LLM_RETRIES.inc(**labels)
+        delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+        print(f"LLM call to {self.provider}/{self.model} failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def _acquire_slot(self, labels: dict) -> ConcurrencyLimiter:
+        slots = provider_slots(self.provider)
+        started = time.perf_counter()
+        await slots.acquire()
+        try:
+            await provider_rate(self.provider).wait()
+        except BaseException:
+            slots.release()
+            raise
+        LLM_SLOT_WAIT.observe(time.perf_counter() - started, **labels)
+        return slots
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        labels = self._labels()
+        slots = await self._acquire_slot(labels)
+        try:
+            return await self._create(messages, labels, tools, tool_choice, json_output,
+                                      extra_create_args, cancellation_token)
+        finally:
+            slots.release()
+
+    async def _create(self, messages, labels, tools, tool_choice, json_output,
+                      extra_create_args, cancellation_token) -> CreateResult:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            call = _CallUsage()
+            context_token = _current_call.set(call)
+            try:
+                result = await self._inner.create(
+                    messages,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                )
+            except asyncio.CancelledError:
+                self._record(labels, "cancelled", started)
+                raise
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._record(labels, "error", started)
+                    raise
+                await self._backoff(attempt, labels, e)
+                attempt += 1
+                continue
+            except Exception:
+                self._record(labels, "error", started)
+                raise
+            finally:
+                _current_call.reset(context_token)
+            self._record(labels, _outcome(result), started, result, call.cached_tokens)
+            return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        labels = self._labels()
+        slots = await self._acquire_slot(labels)
+        stream = self._create_stream(messages, labels, tools, tool_choice, json_output,
+                                     extra_create_args, cancellation_token)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            try:
+                # Closing the inner stream first records how it ended
+                await stream.aclose()
+            finally:
+                slots.release()
+
+    async def _create_stream(self, messages, labels, tools, tool_choice, json_output,
+                             extra_create_args, cancellation_token) -> AsyncGenerator[Union[str, CreateResult], None]:
+        started = time.perf_counter()
+        attempt = 0
+        recorded = False
+        while True:
+            yielded = False
+            try:
+                async for chunk in self._inner.create_stream(
+                    messages,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                ):
+                    if isinstance(chunk, CreateResult):
+                        self._record(labels, _outcome(chunk), started, chunk)
+                        recorded = True
+                    yielded = True
+                    yield chunk
+                return
+            except asyncio.CancelledError:
+                if not recorded:
+                    self._record(labels, "cancelled", started)
+                raise
+            except GeneratorExit:
+                # The caller closed the stream early, e.g. once the JSON it waited for was complete
+                if not recorded:
+                    self._record(labels, "stopped", started)
+                raise
+            except TRANSIENT_ERRORS as e:
+                # Once chunks reached the caller a retry would duplicate output
+                if yielded or attempt >= self.max_retries:
+                    self._record(labels, "error", started)
+                    raise
+                await self._backoff(attempt, labels, e)
+                attempt += 1
+            except Exception:
+                self._record(labels, "error", started)
+                raise
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> Any:
+        return self._inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
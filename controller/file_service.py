@@ -1,13 +1,14 @@
 import os
-import json
+import asyncio
 import datetime
 from datetime import timezone
 from pymongo import MongoClient
-from dotenv import load_dotenv
+from util.env import load_env
 import util.file_parser as file_parser
+from util.cache_key import file_digest
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 # MongoDB Connection
 mongo_uri = os.getenv("MONGO_URI")
@@ -15,6 +16,38 @@ client = MongoClient(mongo_uri)
 db = client.buffer_size_db
 users_collection = db.users
 
+def has_uploaded_files(username=None, course_id=None):
+    """Whether both the syllabus and the calendar of a course have been uploaded
+    
+    Args:
+        username (str, optional): Username of the files
+        course_id (str, optional): Course ID of the files
+        
+    Returns:
+        bool: True if both files exist
+    """
+    if not username or not course_id:
+        return False
+    return all(
+        os.path.exists(os.path.join("uploads", f"{file_type}_{username}_{course_id}.pdf"))
+        for file_type in ("syllabus", "calendar")
+    )
+
+def uploaded_file_hash(username=None, course_id=None, file_type="syllabus"):
+    """SHA-256 of an uploaded file, identifying its content in cache keys
+    
+    Args:
+        username (str, optional): Username of the file
+        course_id (str, optional): Course ID of the file
+        file_type (str): syllabus or calendar
+        
+    Returns:
+        str: Hex digest of the file, None if it was not uploaded
+    """
+    if not username or not course_id:
+        return None
+    return file_digest(os.path.join("uploads", f"{file_type}_{username}_{course_id}.pdf"))
+
 async def retrieve_syllabus(username=None, course_id="14194"):
     """Retrieve the syllabus PDF content for a specific user and course
     
@@ -23,23 +56,24 @@ async def retrieve_syllabus(username=None, course_id="14194"):
         course_id (str, optional): Course ID to retrieve syllabus for
         
     Returns:
-        str: JSON string of the syllabus content or error message
+        dict: Syllabus text by page number, or {"error": message}
     """
     # Only use the type_username_course format
     if not username or not course_id:
-        return json.dumps({"error": "Both username and course ID are required to retrieve syllabus."})
+        return {"error": "Both username and course ID are required to retrieve syllabus."}
         
     filename = f"syllabus_{username}_{course_id}.pdf"
     file_path = os.path.join("uploads", filename)
     
     # Check if the file exists
     if not os.path.exists(file_path):
-        return json.dumps({"error": f"No syllabus file found for user '{username}' and course '{course_id}'. Please upload a syllabus first."})
+        return {"error": f"No syllabus file found for user '{username}' and course '{course_id}'. Please upload a syllabus first."}
     
-    pdf_text = file_parser.extract_text_from_pdf(file_path)
+    # Extract on a worker thread, so the event loop keeps serving other pipeline stages
+    pdf_text = await asyncio.to_thread(file_parser.extract_text_from_pdf, file_path)
     if pdf_text == {}:
-        return json.dumps({"error": "Failed to extract text from syllabus file."})
-    return json.dumps(pdf_text)
+        return {"error": "Failed to extract text from syllabus file."}
+    return pdf_text
 
 async def retrieve_calendar(username=None, course_id=None):
     """Retrieve the calendar PDF content for a specific user and course
@@ -49,27 +83,32 @@ async def retrieve_calendar(username=None, course_id=None):
         course_id (str, optional): Course ID to retrieve calendar for
         
     Returns:
-        str: JSON string of the calendar content or error message
+        dict: Calendar text by page number, or {"error": message}
     """
     # Only use the type_username_course format
     if not username or not course_id:
-        return json.dumps({"error": "Both username and course ID are required to retrieve calendar."})
+        return {"error": "Both username and course ID are required to retrieve calendar."}
         
     filename = f"calendar_{username}_{course_id}.pdf"
     file_path = os.path.join("uploads", filename)
     
     # Check if the file exists
     if not os.path.exists(file_path):
-        return json.dumps({"error": f"No calendar file found for user '{username}' and course '{course_id}'. Please upload a calendar first."})
+        return {"error": f"No calendar file found for user '{username}' and course '{course_id}'. Please upload a calendar first."}
     
-    pdf_text = file_parser.extract_text_from_pdf(file_path)
+    # Extract on a worker thread, so the event loop keeps serving other pipeline stages
+    pdf_text = await asyncio.to_thread(file_parser.extract_text_from_pdf, file_path)
     if pdf_text == {}:
-        return json.dumps({"error": "Failed to extract text from calendar file."})
-    return json.dumps(pdf_text)
+        return {"error": "Failed to extract text from calendar file."}
+    return pdf_text
 
 def mark_files_updated(username=None, course_id=None, file_type=None):
     """Mark that syllabus and calendar files have been updated for a specific user and course
     
+    The flags record that the files were uploaded. Cached analyses and
+    schedules do not depend on them: those are keyed by the content of the
+    files (see controller.schedule_service.ScheduleInputs).
+    
     Args:
         username (str, optional): Username to mark update flags for
         course_id (str, optional): Course ID to mark update flags for
@@ -0,0 +1,442 @@
+"""
+Mongo-backed job queue for long running work such as schedule generation.
+
+submit_job() stores a queued job and returns its id right away. Worker threads
+(start_job_workers, or `python -m controller.job_service` as a separate
+process) claim queued jobs atomically, run the handler registered for their
+kind and record each stage the handler reports, so clients can poll the job
+or follow it as server-sent events. A worker that dies stops renewing its
+claim, which then expires and the job is picked up again.
+"""
+
+import asyncio
+import datetime
+import os
+import threading
+import time
+import uuid
+from datetime import timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from util import metrics
+from util.deadline import Deadline
+from util.env import load_env
+
+load_env()
+
+mongo_uri = os.getenv("MONGO_URI")
+client = MongoClient(mongo_uri)
+db = client.buffer_size_db
+jobs_collection = db.jobs
+
+# Worker threads started by `python main.py`, 0 to only run jobs in separate worker processes.
+# A web server importing main:app starts none, so it needs `python -m controller.job_service`
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How long a claim is held without renewal, renewed every third of it while running
+JOB_CLAIM_TTL_SECONDS = int(os.getenv("JOB_CLAIM_TTL_SECONDS", "60"))
+# How often idle workers look for queued jobs
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+# Seconds a job may run before its LLM calls are cancelled
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "600"))
+# Seconds a runnable job may stay unclaimed before a missing worker is reported
+JOB_UNCLAIMED_WARNING_SECONDS = float(os.getenv("JOB_UNCLAIMED_WARNING_SECONDS", str(10 * JOB_POLL_SECONDS)))
+# Claims of a job before it is failed, in case it is what kills its workers
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# How long finished jobs are kept
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 60 * 60)))
+
+FINAL_STATES = ("done", "failed")
+
+JOBS = metrics.counter("jobs_total", "Jobs by kind and final state", ("kind", "state"))
+JOB_QUEUE_WAIT = metrics.histogram(
+    "job_queue_wait_seconds", "Time jobs waited in the queue before a worker claimed them", ("kind",))
+
+# Coroutine functions running each kind of job: handler(params, deadline, progress)
+JobHandler = Callable[[dict, Deadline, Callable[[str], None]], Awaitable[Any]]
+_handlers: Dict[str, JobHandler] = {}
+
+_indexes_created = False
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail the job with a message for the client"""
+
+
+def _now():
+    return datetime.datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # PyMongo returns naive datetimes in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _ensure_indexes():
+    global _indexes_created
+    if not _indexes_created:
+        jobs_collection.create_index("purge_at", expireAfterSeconds=0)
+        jobs_collection.create_index([("state", 1), ("created_at", 1)])
+        jobs_collection.create_index([("state", 1), ("run_after", 1)])
+        # At most one active job per dedup key
+        jobs_collection.create_index(
+            "dedup_key", unique=True,
+            partialFilterExpression={"active": True})
+        _indexes_created = True
+
+
+def register_job_handler(kind: str, handler: JobHandler):
+    """Register the coroutine function running jobs of a kind
+
+    Args:
+        kind: Kind of job, as passed to submit_job
+        handler: Called with the job params, a Deadline and a progress(stage) callback
+    """
+    _handlers[kind] = handler
+
+
+def submit_job(kind: str, params: dict, username: str = None, dedup_key: str = None, delay: float = 0) -> dict:
+    """Queue a job, or return the active job doing the same work
+
+    A job doing the same work that is still queued is rescheduled to run after
+    delay, so repeated submissions with a delay debounce it and a submission
+    without one runs it right away.
+
+    Args:
+        kind: Kind of job, selecting its handler
+        params: Arguments of the handler, must be storable in Mongo
+        username: Owner of the job, the only user allowed to read it
+        dedup_key: Key identifying identical work, defaults to a unique key
+        delay: Seconds before a worker may claim the job
+
+    Returns:
+        dict: The job document
+    """
+    _ensure_indexes()
+    now = _now()
+    run_after = now + datetime.timedelta(seconds=delay)
+    job = {
+        "_id": uuid.uuid4().hex,
+        "kind": kind,
+        "params": params,
+        "username": username,
+        "dedup_key": dedup_key or uuid.uuid4().hex,
+        "active": True,
+        "state": "queued",
+        "stage": "queued",
+        "stages": [{"stage": "queued", "at": now}],
+        "attempts": 0,
+        "run_after": run_after,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        jobs_collection.insert_one(job)
+        _watch_unclaimed(job["_id"], delay)
+        return job
+    except DuplicateKeyError:
+        existing = jobs_collection.find_one({"dedup_key": job["dedup_key"], "active": True})
+        if existing is None:
+            # Finished between the insert and the lookup
+            return submit_job(kind, params, username, dedup_key, delay)
+        if existing.get("state") == "queued":
+            jobs_collection.update_one({"_id": existing["_id"], "state": "queued"}, {"$set": {"run_after": run_after}})
+            existing["run_after"] = run_after
+            _watch_unclaimed(existing["_id"], delay)
+        return existing
+
+
+def _watch_unclaimed(job_id: str, delay: float):
+    """Warn if no worker claims the job soon after it may run, as when no worker process is running"""
+    timer = threading.Timer(delay + JOB_UNCLAIMED_WARNING_SECONDS, _warn_unclaimed, (job_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def _warn_unclaimed(job_id: str):
+    try:
+        # A job rescheduled meanwhile is checked again by the timer of its resubmission
+        job = jobs_collection.find_one({
+            "_id": job_id, "state": "queued",
+            "run_after": {"$lte": _now() - datetime.timedelta(seconds=JOB_UNCLAIMED_WARNING_SECONDS)},
+        }, {"kind": 1})
+    except Exception as e:
+        print(f"Could not check whether job {job_id} was claimed: {e}")
+        return
+    if job is not None:
+        print(f"Warning: job {job_id} ({job['kind']}) is still unclaimed {JOB_UNCLAIMED_WARNING_SECONDS:g}s "
+              f"after it could run, is a job worker running? Workers start with `python main.py` "
+              f"(JOB_WORKERS) or `python -m controller.job_service`")
+
+
+def get_job(job_id: str, username: str = None) -> Optional[dict]:
+    """Get a job, only if it belongs to username when one is given"""
+    query = {"_id": job_id}
+    if username is not None:
+        query["username"] = username
+    return jobs_collection.find_one(query)
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job for the API"""
+    status = {
+        "job_id": job["_id"],
+        "kind": job.get("kind"),
+        "state": job.get("state"),
+        "stage": job.get("stage"),
+        "stages": [{"stage": s["stage"], "at": _as_utc(s["at"]).isoformat()} for s in job.get("stages", [])],
+        "created_at": _as_utc(job["created_at"]).isoformat(),
+        "updated_at": _as_utc(job["updated_at"]).isoformat(),
+    }
+    if job.get("state") == "done":
+        status["result"] = job.get("result")
+    if job.get("state") == "failed":
+        status["error"] = job.get("error")
+    return status
+
+
+def claim_job(worker_id: str, ttl: int = JOB_CLAIM_TTL_SECONDS) -> Optional[dict]:
+    """Claim the oldest queued job that is due, or a running one whose worker stopped renewing it
+
+    Returns:
+        dict: The claimed job, None if there is nothing to run
+    """
+    _ensure_indexes()
+    now = _now()
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"state": "queued", "run_after": {"$lte": now}},
+            # Queued before jobs could be delayed
+            {"state": "queued", "run_after": {"$exists": False}},
+            {"state": "running", "claim_expires_at": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "state": "running",
+                "worker": worker_id,
+                "claimed_at": now,
+                "claim_expires_at": now + datetime.timedelta(seconds=ttl),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renew_claim(job_id: str, worker_id: str, ttl: int = JOB_CLAIM_TTL_SECONDS) -> bool:
+    """Extend the claim of a running job
+
+    Returns:
+        bool: False if the job was claimed by another worker
+    """
+    result = jobs_collection.update_one(
+        {"_id": job_id, "worker": worker_id, "state": "running"},
+        {"$set": {"claim_expires_at": _now() + datetime.timedelta(seconds=ttl)}}
+    )
+    return result.matched_count == 1
+
+
+def report_stage(job_id: str, worker_id: str, stage: str):
+    """Record that a running job entered a stage"""
+    now = _now()
+    jobs_collection.update_one(
+        {"_id": job_id, "worker": worker_id, "state": "running"},
+        {"$set": {"stage": stage, "updated_at": now}, "$push": {"stages": {"stage": stage, "at": now}}}
+    )
+
+
+def finish_job(job: dict, worker_id: str, result: Any = None, error: str = None):
+    """Store the result or error of a job and free its dedup key"""
+    now = _now()
+    state = "failed" if error is not None else "done"
+    update = {
+        "state": state,
+        "stage": state,
+        "active": False,
+        "updated_at": now,
+        "finished_at": now,
+        "purge_at": now + datetime.timedelta(seconds=JOB_RETENTION_SECONDS),
+    }
+    if error is not None:
+        update["error"] = error
+    else:
+        update["result"] = result
+    jobs_collection.update_one(
+        {"_id": job["_id"], "worker": worker_id},
+        {"$set": update, "$push": {"stages": {"stage": state, "at": now}}, "$unset": {"claim_expires_at": ""}}
+    )
+    JOBS.inc(kind=job.get("kind", ""), state=state)
+
+
+async def _keep_claimed(job_id: str, worker_id: str, ttl: int, deadline: Deadline):
+    while True:
+        await asyncio.sleep(ttl / 3)
+        if not await asyncio.to_thread(renew_claim, job_id, worker_id, ttl):
+            print(f"Lost claim of job {job_id}")
+            deadline.cancel("job claimed by another worker")
+            return
+
+
+async def run_job(job: dict, worker_id: str):
+    """Run a claimed job to completion, recording its stages and result"""
+    kind = job.get("kind", "")
+    queued_since = _as_utc(job.get("run_after") or job["created_at"])
+    JOB_QUEUE_WAIT.observe(max((_as_utc(job["claimed_at"]) - queued_since).total_seconds(), 0), kind=kind)
+
+    handler = _handlers.get(kind)
+    if handler is None:
+        finish_job(job, worker_id, error=f"Unknown job kind {kind}")
+        return
+    if job.get("attempts", 1) > JOB_MAX_ATTEMPTS:
+        finish_job(job, worker_id, error=f"Job abandoned after {JOB_MAX_ATTEMPTS} attempts")
+        return
+
+    deadline = Deadline(JOB_TIMEOUT_SECONDS)
+    renewer = asyncio.create_task(_keep_claimed(job["_id"], worker_id, JOB_CLAIM_TTL_SECONDS, deadline))
+    try:
+        result = await deadline.run(handler(
+            job.get("params", {}), deadline, lambda stage: report_stage(job["_id"], worker_id, stage)))
+    except JobFailed as e:
+        finish_job(job, worker_id, error=str(e))
+    except Exception as e:
+        print(f"Job {job['_id']} failed: {e}")
+        finish_job(job, worker_id, error=f"{type(e).__name__}: {e}")
+    else:
+        finish_job(job, worker_id, result=result)
+    finally:
+        renewer.cancel()
+
+
+async def work(worker_id: str, stop: threading.Event = None, poll_seconds: float = JOB_POLL_SECONDS):
+    """Claim and run jobs one at a time until stop is set
+
+    Args:
+        worker_id: Unique identifier of the worker
+        stop: Event ending the loop once set
+        poll_seconds: Seconds between checks of an empty queue
+    """
+    while stop is None or not stop.is_set():
+        try:
+            job = await asyncio.to_thread(claim_job, worker_id)
+        except Exception as e:
+            print(f"Job worker {worker_id} could not claim a job: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(poll_seconds)
+            continue
+        print(f"Job worker {worker_id} running {job['kind']} job {job['_id']}")
+        await run_job(job, worker_id)
+
+
+_workers_lock = threading.Lock()
+_workers_stop: Optional[threading.Event] = None
+
+
+def start_job_workers(count: int = JOB_WORKERS) -> Optional[threading.Event]:
+    """Start worker threads in this process, once
+
+    Every worker runs its own event loop, like Flask does for async views.
+
+    Args:
+        count: Number of worker threads
+
+    Returns:
+        threading.Event: Set it to stop the workers, None if no workers were started
+    """
+    global _workers_stop
+    with _workers_lock:
+        if _workers_stop is not None or count <= 0:
+            return _workers_stop
+        _workers_stop = threading.Event()
+        for i in range(count):
+            worker_id = f"{os.getpid()}-{i}-{uuid.uuid4().hex[:8]}"
+            thread = threading.Thread(
+                target=lambda wid=worker_id: asyncio.run(work(wid, _workers_stop)),
+                name=f"job-worker-{i}", daemon=True)
+            thread.start()
+        print(f"Started {count} job workers")
+        return _workers_stop
+
+
+def wait_for_job(job_id: str, username: str = None, poll_seconds: float = JOB_POLL_SECONDS,
+                 timeout: float = None):
+    """Yield a job each time its stage changes, until it finishes
+
+    Args:
+        job_id: Id of the job
+        username: Owner of the job
+        poll_seconds: Seconds between reads of the job
+        timeout: Seconds to follow the job before giving up, None for no limit
+
+    Returns:
+        Generator yielding the job document, or None on every poll without a change
+    """
+    started = time.monotonic()
+    last = None
+    while timeout is None or time.monotonic() - started < timeout:
+        job = get_job(job_id, username)
+        if job is None:
+            return
+        marker = (job.get("state"), len(job.get("stages", [])))
+        if marker != last:
+            last = marker
+            yield job
+            if job.get("state") in FINAL_STATES:
+                return
+        else:
+            yield None
+        time.sleep(poll_seconds)
+
+
+def wait_for_jobs(job_ids: List[str], username: str = None, poll_seconds: float = JOB_POLL_SECONDS,
+                  timeout: float = None):
+    """Yield each of several jobs once, as soon as it finishes
+
+    All unfinished jobs are read with one query per poll.
+
+    Args:
+        job_ids: Ids of the jobs
+        username: Owner of the jobs
+        poll_seconds: Seconds between reads of the jobs
+        timeout: Seconds to wait before giving up, None for no limit
+
+    Returns:
+        Generator yielding finished job documents, or None on every poll without one
+    """
+    started = time.monotonic()
+    pending = set(job_ids)
+    while pending and (timeout is None or time.monotonic() - started < timeout):
+        query = {"_id": {"$in": list(pending)}}
+        if username is not None:
+            query["username"] = username
+        finished = False
+        found = set()
+        for job in jobs_collection.find(query):
+            found.add(job["_id"])
+            if job.get("state") in FINAL_STATES:
+                pending.discard(job["_id"])
+                finished = True
+                yield job
+        # Jobs removed since they were submitted never finish
+        pending &= found
+        if not finished:
+            yield None
+        if pending:
+            time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    # Standalone worker process: python -m controller.job_service
+    # Run the workers of the imported module, where the schedule job handler registers itself
+    import controller.schedule_service  # noqa: F401
+    from controller import job_service
+
+    stop = job_service.start_job_workers(max(JOB_WORKERS, 1))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop.set()
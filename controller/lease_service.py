@@ -0,0 +1,174 @@
+"""
+Mongo-backed leases coalescing identical work across worker processes and nodes.
+
+The first caller of run_with_lease() for a key takes the lease, does the work and
+stores the result on the lease document. Callers arriving while the lease is
+held poll the document and return the stored result once the holder completes.
+A holder that dies stops renewing its lease, which then expires and is taken
+over by the next waiter.
+"""
+
+import asyncio
+import datetime
+import os
+import uuid
+from datetime import timezone
+from typing import Any, Awaitable, Callable
+
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from util.env import load_env
+
+load_env()
+
+mongo_uri = os.getenv("MONGO_URI")
+client = MongoClient(mongo_uri)
+db = client.buffer_size_db
+leases_collection = db.leases
+
+# How long a lease is held without renewal, renewed every third of it while working
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "300"))
+# How often waiters check the lease
+LEASE_POLL_SECONDS = float(os.getenv("LEASE_POLL_SECONDS", "1"))
+# How long completed results are kept for late waiters
+LEASE_RESULT_RETENTION_SECONDS = 10 * 60
+
+_indexes_created = False
+
+
+def _now():
+    return datetime.datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # PyMongo returns naive datetimes in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _ensure_indexes():
+    global _indexes_created
+    if not _indexes_created:
+        leases_collection.create_index("purge_at", expireAfterSeconds=0)
+        _indexes_created = True
+
+
+def try_acquire_lease(key: str, owner: str, ttl: int = LEASE_TTL_SECONDS) -> bool:
+    """Take the lease of a key if it is free, expired or completed
+
+    Args:
+        key: Key of the lease
+        owner: Unique identifier of the caller
+        ttl: Seconds the lease is held without renewal
+
+    Returns:
+        bool: True if the caller now holds the lease
+    """
+    _ensure_indexes()
+    now = _now()
+    try:
+        leases_collection.update_one(
+            {"_id": key, "expires_at": {"$lt": now}},
+            {
+                "$set": {
+                    "owner": owner,
+                    "state": "running",
+                    "acquired_at": now,
+                    "expires_at": now + datetime.timedelta(seconds=ttl),
+                    "purge_at": now + datetime.timedelta(seconds=ttl + LEASE_RESULT_RETENTION_SECONDS)
+                },
+                "$unset": {"result": "", "completed_at": ""}
+            },
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and has not expired
+        return False
+
+
+def renew_lease(key: str, owner: str, ttl: int = LEASE_TTL_SECONDS) -> bool:
+    """Extend a held lease
+
+    Returns:
+        bool: False if the lease was lost to another owner
+    """
+    now = _now()
+    result = leases_collection.update_one(
+        {"_id": key, "owner": owner, "state": "running"},
+        {"$set": {
+            "expires_at": now + datetime.timedelta(seconds=ttl),
+            "purge_at": now + datetime.timedelta(seconds=ttl + LEASE_RESULT_RETENTION_SECONDS)
+        }}
+    )
+    return result.matched_count == 1
+
+
+def complete_lease(key: str, owner: str, result: Any):
+    """Store the result on a held lease and free it"""
+    now = _now()
+    leases_collection.update_one(
+        {"_id": key, "owner": owner},
+        {"$set": {
+            "state": "done",
+            "result": result,
+            "completed_at": now,
+            "expires_at": now,
+            "purge_at": now + datetime.timedelta(seconds=LEASE_RESULT_RETENTION_SECONDS)
+        }}
+    )
+
+
+def release_lease(key: str, owner: str):
+    """Free a held lease without a result, so a waiter takes it over"""
+    leases_collection.delete_one({"_id": key, "owner": owner})
+
+
+async def _keep_renewed(key: str, owner: str, ttl: int):
+    while True:
+        await asyncio.sleep(ttl / 3)
+        if not renew_lease(key, owner, ttl):
+            print(f"Lost lease {key}")
+            return
+
+
+async def run_with_lease(key: str, fn: Callable[[], Awaitable[Any]],
+                         ttl: int = LEASE_TTL_SECONDS, poll_seconds: float = LEASE_POLL_SECONDS) -> Any:
+    """Run fn under the lease of key, or wait for the current holder's result
+
+    Args:
+        key: Key identifying identical work
+        fn: Coroutine function doing the work, its result must be storable in Mongo
+        ttl: Seconds the lease is held without renewal
+        poll_seconds: Seconds between checks while waiting for another holder
+
+    Returns:
+        The result of fn, either computed here or by the holder we waited for
+    """
+    owner = uuid.uuid4().hex
+    waiting_since = _now()
+
+    while True:
+        if try_acquire_lease(key, owner, ttl):
+            renewer = asyncio.create_task(_keep_renewed(key, owner, ttl))
+            try:
+                result = await fn()
+            except BaseException:
+                release_lease(key, owner)
+                raise
+            finally:
+                renewer.cancel()
+            complete_lease(key, owner, result)
+            return result
+
+        print(f"Waiting for lease {key} held by another worker")
+        while True:
+            await asyncio.sleep(poll_seconds)
+            lease = leases_collection.find_one({"_id": key})
+            if lease is None:
+                # Released after a failure, try to take over
+                break
+            if lease.get("state") == "done" and _as_utc(lease["completed_at"]) >= waiting_since:
+                return lease.get("result")
+            if _as_utc(lease["expires_at"]) < _now():
+                # Completed before we started waiting, or the holder died
+                break
@@ -0,0 +1,301 @@
+"""
+Batch regeneration of stored syllabus analyses and schedules.
+
+Stored analyses and schedules are keyed by the prompts and models they were
+made with (see schedule_service.ScheduleInputs), so after a prompt or model
+change they are only regenerated when each student next asks for them. This
+walks analysis_collection and then calendar_collection with streaming cursors
+and regenerates every course whose stored result is stale, a bounded number at
+a time and at most --per-minute a minute, on top of the LLM_MAX_CONCURRENT and
+LLM_MAX_CALLS_PER_MINUTE limits of each provider.
+
+Progress is checkpointed in regenerate_checkpoints under the run name: the
+_id up to which every entry is finished. Running again with the same name
+resumes after it, and courses finished by both phases are skipped as current.
+
+Usage:
+    python -m controller.regenerate_service --concurrency 4 --per-minute 30
+    python -m controller.regenerate_service --run prompt-v3 --restart --force
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import time
+from datetime import timezone
+
+from pymongo import MongoClient
+from pymongo.errors import CursorNotFound
+from controller import schedule_service as ss
+from util.concurrency import RateLimiter
+from util.deadline import Deadline
+from util.env import load_env
+
+load_env()
+
+mongo_uri = os.getenv("MONGO_URI")
+client = MongoClient(mongo_uri)
+db = client.buffer_size_db
+checkpoints_collection = db.regenerate_checkpoints
+
+# Collections walked, in order, by the name of their schedule_service attribute
+PHASES = ("analysis_collection", "calendar_collection")
+# Seconds one course may take before its LLM calls are cancelled
+REGENERATE_TIMEOUT_SECONDS = float(os.getenv("REGENERATE_TIMEOUT_SECONDS", "600"))
+# Failures kept in the checkpoint and printed in the report
+MAX_REPORTED_FAILURES = 50
+
+
+async def regenerate_course(username, course_id, force=False, deadline=None):
+    """Regenerate what is stale of one course: its schedule, or its analysis without a calendar
+
+    Args:
+        username (str): Username of the course files
+        course_id (str): Course ID of the course files
+        force (bool): Regenerate even when the stored result is current
+        deadline (Deadline, optional): Deadline of the regeneration
+
+    Returns:
+        str: "regenerated", "current" or "missing" (the syllabus was not uploaded)
+
+    Raises:
+        ScheduleError: If the course could not be regenerated
+    """
+    inputs = await asyncio.to_thread(ss.get_schedule_inputs, username, course_id)
+    if not inputs.analysis_key:
+        return "missing"
+    query = {"username": username, "course_id": course_id}
+
+    if inputs.schedule_key:
+        if not force and await asyncio.to_thread(
+                ss.calendar_collection.find_one, dict(query, cache_key=inputs.schedule_key), {"_id": 1}):
+            return "current"
+        # Coalesced with a student asking for the same schedule meanwhile
+        result = await ss.run_schedule_analysis_coalesced(
+            username=username, force_refresh=force, course_id=course_id, deadline=deadline)
+        if isinstance(result, dict) and set(result) == {"error"}:
+            raise ss.ScheduleError(result["error"])
+        return "regenerated"
+
+    if not force and await asyncio.to_thread(
+            ss.analysis_collection.find_one, dict(query, cache_key=inputs.analysis_key), {"_id": 1}):
+        return "current"
+    await ss.analyze_syllabus(username, course_id, inputs.analysis_key, deadline)
+    return "regenerated"
+
+
+class Checkpoint:
+    """Progress of a run, saved after every entry that moves it forward
+
+    Entries finish out of order, so the checkpoint is the _id up to which
+    every entry read from the cursor is finished. read() and finish() are
+    called on the event loop, and only save() of a snapshot runs on a thread.
+
+    Attributes:
+        run (str): Name of the run
+        phase (str): Collection being walked, see PHASES
+        last_id: _id up to which every entry of the phase is finished, None from the start
+        counts (dict): Entries by outcome so far
+        failures (list): {"username", "course_id", "error"} of the latest failed entries
+    """
+
+    def __init__(self, run, doc=None):
+        doc = doc or {}
+        self.run = run
+        self.phase = doc.get("phase", PHASES[0])
+        self.last_id = doc.get("last_id")
+        self.counts = dict(doc.get("counts", {}))
+        self.failures = list(doc.get("failures", []))
+        self.started_at = doc.get("started_at", datetime.datetime.now(timezone.utc))
+        self._in_flight = {}
+
+    @classmethod
+    def load(cls, run, restart=False):
+        if restart:
+            checkpoints_collection.delete_one({"_id": run})
+        return cls(run, checkpoints_collection.find_one({"_id": run}))
+
+    def read(self, entry_id):
+        self._in_flight[entry_id] = False
+
+    def finish(self, entry_id, outcome, failure=None):
+        """Record a finished entry
+
+        Returns:
+            dict: Snapshot to save if the checkpoint moved forward or the entry failed, else None
+        """
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        if failure:
+            self.failures = (self.failures + [failure])[-MAX_REPORTED_FAILURES:]
+        self._in_flight[entry_id] = True
+        advanced = False
+        # Entries were read in _id order, so the oldest unfinished one bounds the checkpoint
+        while self._in_flight:
+            oldest = next(iter(self._in_flight))
+            if not self._in_flight[oldest]:
+                break
+            del self._in_flight[oldest]
+            self.last_id = oldest
+            advanced = True
+        return self.snapshot() if advanced or failure else None
+
+    def next_phase(self):
+        index = PHASES.index(self.phase) + 1
+        self.phase = PHASES[index] if index < len(PHASES) else None
+        self.last_id = None
+        self.save()
+
+    def snapshot(self):
+        return {
+            "phase": self.phase,
+            "last_id": self.last_id,
+            "counts": dict(self.counts),
+            "failures": list(self.failures),
+            "started_at": self.started_at,
+        }
+
+    def save(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        checkpoints_collection.update_one({"_id": self.run}, {"$set": dict(
+            snapshot, updated_at=datetime.datetime.now(timezone.utc))}, upsert=True)
+
+
+def _open_cursor(collection, after, batch_size):
+    query = {"username": {"$ne": None}, "course_id": {"$ne": None}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    return collection.find(query, {"username": 1, "course_id": 1}, sort=[("_id", 1)], batch_size=batch_size)
+
+
+def _next_entry(cursor):
+    return next(cursor, None)
+
+
+class Report:
+    """Throughput and failures of a run, printed as it goes and at the end"""
+
+    def __init__(self, checkpoint):
+        self.checkpoint = checkpoint
+        self.started = time.monotonic()
+        self.processed = 0
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        counts = " ".join(f"{k}={v}" for k, v in sorted(self.checkpoint.counts.items()))
+        return (f"[{self.checkpoint.run}] phase={self.checkpoint.phase} {counts or 'nothing done yet'} "
+                f"this run: {self.processed} in {elapsed:.0f}s ({self.processed / elapsed if elapsed else 0:.2f}/s)")
+
+    async def every(self, seconds):
+        while True:
+            await asyncio.sleep(seconds)
+            print(self.line())
+
+    def final(self):
+        print(self.line())
+        if self.checkpoint.failures:
+            print(f"Latest {len(self.checkpoint.failures)} failure(s):")
+            for failure in self.checkpoint.failures:
+                print(f"  {failure['username']}/{failure['course_id']} ({failure['phase']}): {failure['error']}")
+
+
+async def run(run_name="default", concurrency=4, per_minute=0, force=False, restart=False,
+              batch_size=50, report_seconds=10):
+    """Walk the stored analyses and schedules, regenerating stale courses
+
+    Args:
+        run_name (str): Name the checkpoint is saved under
+        concurrency (int): Courses regenerated at once
+        per_minute (float): Courses started per minute, 0 for no limit
+        force (bool): Regenerate even current courses
+        restart (bool): Drop the checkpoint of the run and start over
+        batch_size (int): Entries fetched per cursor batch
+        report_seconds (float): Seconds between progress lines
+
+    Returns:
+        Checkpoint: The final progress of the run
+    """
+    checkpoint = await asyncio.to_thread(Checkpoint.load, run_name, restart)
+    if checkpoint.phase is None:
+        print(f"Run {run_name} already finished, pass --restart to run it again")
+        return checkpoint
+    if checkpoint.last_id is not None:
+        print(f"Resuming run {run_name} in {checkpoint.phase} after {checkpoint.last_id}")
+
+    report = Report(checkpoint)
+    reporter = asyncio.create_task(report.every(report_seconds))
+    rate = RateLimiter(per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    # Saves run in the order the snapshots were taken, so an older one never overwrites a newer one
+    save_lock = asyncio.Lock()
+
+    async def regenerate(entry, phase):
+        username, course_id = entry["username"], entry["course_id"]
+        failure = None
+        try:
+            deadline = Deadline(REGENERATE_TIMEOUT_SECONDS)
+            outcome = await deadline.run(regenerate_course(username, course_id, force, deadline))
+        except Exception as e:
+            outcome = "failed"
+            failure = {"username": username, "course_id": course_id, "phase": phase, "error": str(e) or repr(e)}
+            print(f"Failed to regenerate {username}/{course_id}: {failure['error']}")
+        finally:
+            semaphore.release()
+        report.processed += 1
+        snapshot = checkpoint.finish(entry["_id"], outcome, failure)
+        if snapshot:
+            async with save_lock:
+                await asyncio.to_thread(checkpoint.save, snapshot)
+
+    try:
+        while checkpoint.phase is not None:
+            phase = checkpoint.phase
+            collection = getattr(ss, phase)
+            cursor = await asyncio.to_thread(_open_cursor, collection, checkpoint.last_id, batch_size)
+            last_read = checkpoint.last_id
+            tasks = set()
+            while True:
+                # Read the next entry only once there is room for it, so the cursor streams
+                await semaphore.acquire()
+                try:
+                    entry = await asyncio.to_thread(_next_entry, cursor)
+                except CursorNotFound:
+                    # The cursor timed out between batches, continue after the last entry read
+                    cursor = await asyncio.to_thread(_open_cursor, collection, last_read, batch_size)
+                    entry = await asyncio.to_thread(_next_entry, cursor)
+                if entry is None:
+                    semaphore.release()
+                    break
+                last_read = entry["_id"]
+                await rate.wait()
+                checkpoint.read(entry["_id"])
+                task = asyncio.create_task(regenerate(entry, phase))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await asyncio.to_thread(checkpoint.next_phase)
+    finally:
+        reporter.cancel()
+        report.final()
+    return checkpoint
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--run", default="default", help="name of the checkpoint to resume or start")
+    parser.add_argument("--restart", action="store_true", help="drop the checkpoint and start over")
+    parser.add_argument("--force", action="store_true", help="regenerate courses whose results are current too")
+    parser.add_argument("--concurrency", type=int, default=4, help="courses regenerated at once")
+    parser.add_argument("--per-minute", type=float, default=0, help="courses started per minute, 0 for no limit")
+    parser.add_argument("--llm-per-minute", type=float, default=None,
+                        help="LLM calls per minute per provider, LLM_MAX_CALLS_PER_MINUTE by default")
+    parser.add_argument("--batch-size", type=int, default=50, help="entries fetched per cursor batch")
+    parser.add_argument("--report-seconds", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args()
+    if args.llm_per_minute is not None:
+        # Read when each provider makes its first call
+        os.environ["LLM_MAX_CALLS_PER_MINUTE"] = str(args.llm_per_minute)
+    result = asyncio.run(run(args.run, args.concurrency, args.per_minute, args.force, args.restart,
+                             args.batch_size, args.report_seconds))
+    raise SystemExit(1 if result.counts.get("failed") else 0)
@@ -4,9 +4,10 @@ import datetime
 import asyncio
 import agent.study_review_agent as study_review_agent
 from pymongo import MongoClient
-from dotenv import load_dotenv
+from util.env import load_env
+from util.deadline import Deadline
 
-load_dotenv()
+load_env()
 
 mongo_uri = os.getenv("MONGO_URI")
 client = MongoClient(mongo_uri)
@@ -59,7 +60,8 @@ async def start_session(username: str, course_id: str, topic: str):
         "question_agent": study_review_agent.make_new_study_question_agent(topic),
         "explanation_count": 0,
         "last_activity": datetime.datetime.now(),
-        "is_active": True
+        "is_active": True,
+        "in_flight": set()  # Deadlines of the agent calls running for this session
     }
     
     # Schedule session cleanup after timeout
@@ -103,11 +105,25 @@ async def save_session_history(session_id: str):
         # Insert the history entries into the database
         db.review_history.insert_many(history_entries)
 
+async def send_to_agent(session_id: str, agent, message: str, deadline: Deadline = None):
+    """Send a message to one of the session's agents, cancelled if the session ends meanwhile"""
+    deadline = deadline or Deadline.from_env()
+    in_flight = sessions[session_id]["in_flight"]
+    in_flight.add(deadline)
+    try:
+        return await agent.send_message(message, deadline=deadline)
+    finally:
+        in_flight.discard(deadline)
+
 async def stop_session(session_id: str, reason="user_request"):
     """Stop the review session and clean up resources"""
     if session_id not in sessions:
         return {"status": "error", "message": "Session not found"}
     
+    # Stop paying for answers nobody will read
+    for deadline in list(sessions[session_id]["in_flight"]):
+        deadline.cancel(f"session ended: {reason}")
+    
     # Save session history to database before removing
     await save_session_history(session_id)
     
@@ -141,7 +157,7 @@ async def get_session(session_id: str):
     
     return sessions[session_id]
 
-async def generate_initial_question(session_id: str):
+async def generate_initial_question(session_id: str, deadline: Deadline = None):
     """Generate the initial question to start the review session"""
     if session_id not in sessions:
         return {"status": "error", "message": "Session not found"}
@@ -154,11 +170,12 @@ async def generate_initial_question(session_id: str):
     
     # Use the question agent to generate an initial question
     question_agent = sessions[session_id]["question_agent"]
-    response = await question_agent.send_message(f"Please generate a question about the topic {topic}")
+    response = await send_to_agent(session_id, question_agent,
+                                   f"Please generate a question about the topic {topic}", deadline)
     
     # Store this as the first message in the review agent's history
     review_agent = sessions[session_id]["review_agent"]
-    await review_agent.send_message(f"I'm having trouble understanding {topic}. {response}")
+    await send_to_agent(session_id, review_agent, f"I'm having trouble understanding {topic}. {response}", deadline)
     
     return {
         "status": "success", 
@@ -166,7 +183,7 @@ async def generate_initial_question(session_id: str):
         "message": f"I'm having trouble understanding {topic}. {response}"
     }
 
-async def review_user_explanation(session_id: str, user_explanation: str):
+async def review_user_explanation(session_id: str, user_explanation: str, deadline: Deadline = None):
     """Process the user's explanation and provide feedback or follow-up questions"""
     if session_id not in sessions:
         return {"status": "error", "message": "Session not found"}
@@ -179,7 +196,7 @@ async def review_user_explanation(session_id: str, user_explanation: str):
     
     # Send the explanation to the agent
     agent = sessions[session_id]["review_agent"]
-    response = await agent.send_message(user_explanation)
+    response = await send_to_agent(session_id, agent, user_explanation, deadline)
     
     # Parse the JSON response from the agent
     try:
@@ -1,21 +1,40 @@
 import os
+import time
 import datetime
 from datetime import timezone
 from pymongo import MongoClient
-from dotenv import load_dotenv
+from util.env import load_env
 
-from agent.syllabus_agent import make_new_syllabus_agent
-from agent.plan_review_agent import make_new_plan_review_agent
+from agent.syllabus_agent import SYLLABUS_MODEL, make_new_syllabus_agent
+from agent.plan_review_agent import PLAN_REVIEW_MODEL, make_new_plan_review_agent
+from boundary.llms.offline import get_llm_mode
 import asyncio
 from boundary import googleCalendar
 import json
-from agent.plan_agent import make_new_plan_agent
+from agent.plan_agent import PLAN_MODEL, make_new_plan_agent
 from util.json_fixer import fix_json
 from util.text_extractor import json_extractor
-from controller.file_service import retrieve_calendar, retrieve_syllabus
+from util.json_stream import JsonStreamParser
+from util.schema_validator import SchemaValidationError, compile_validator
+from prompts import json_schemas, templates
+from controller.file_service import has_uploaded_files, retrieve_calendar, retrieve_syllabus, uploaded_file_hash
+from controller.lease_service import run_with_lease
+from controller.job_service import JobFailed, register_job_handler, submit_job
+from util.singleflight import SingleFlight
+from util.deadline import DeadlineExceeded, RequestCancelled
+from util.document_tools import PagedDocument
+from util.pipeline import Pipeline
+from util.syllabus_merge import merge_syllabus_analyses, split_pages
+from util.plan_validator import LEAD_DAYS, PlanCheck, check_plan, parse_plan_date
+from util.plan_personalize import personalize_plan
+from util.study_scheduler import DEFAULT_MAX_STARTS_PER_DAY, schedule_study_plan
+from util.plan_merge import merge_course_plans
+from util.cache_key import cache_key
+from util.calendar_diff import affected_windows, describe_windows, diff_deliverables, extract_deliverables, in_windows
+from util import metrics
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 # MongoDB Connection
 mongo_uri = os.getenv("MONGO_URI")
@@ -25,10 +44,55 @@ analysis_collection = db.analysis
 calendar_collection = db.calendars
 users_collection = db.users
 courses_collection = db.courses
+plan_templates_collection = db.plan_templates
+preferences_collection = db.preferences
 
 # Abort message, used in agent termination
 ABORT_MESSAGE = "$ABORT"
 
+class ScheduleError(Exception):
+    """A schedule generation step failed, the message is returned to the client"""
+
+# In-flight schedule generations of this process
+schedule_flights = SingleFlight()
+
+# Syllabi with at least this many pages are read by the syllabus agent through tools
+SYLLABUS_TOOLS_MIN_PAGES = int(os.getenv("SYLLABUS_TOOLS_MIN_PAGES", "8"))
+# Syllabi with at least this many pages are analyzed in page groups, concurrently
+# (0 disables chunked analysis)
+SYLLABUS_CHUNK_MIN_PAGES = int(os.getenv("SYLLABUS_CHUNK_MIN_PAGES", "24"))
+SYLLABUS_CHUNK_PAGES = int(os.getenv("SYLLABUS_CHUNK_PAGES", "6"))
+SYLLABUS_CHUNK_CONCURRENCY = int(os.getenv("SYLLABUS_CHUNK_CONCURRENCY", "4"))
+
+# Send every plan to the plan review agent, even when the local validator fixed it
+PLAN_REVIEW_ALWAYS = os.getenv("PLAN_REVIEW_ALWAYS", "false").lower() == "true"
+PLAN_REVIEWS = metrics.counter(
+    "plan_reviews_total", "Study plan reviews by who reviewed the plan", ("path",))
+
+# A re-uploaded calendar only regenerates the days around the deliverables it changed
+PLAN_INCREMENTAL = os.getenv("PLAN_INCREMENTAL", "true").lower() == "true"
+# Days before a changed deliverable that are planned again
+PLAN_REPLAN_LOOKBACK_DAYS = int(os.getenv("PLAN_REPLAN_LOOKBACK_DAYS", "14"))
+# Share of changed deliverables above which the whole plan is generated again
+PLAN_REPLAN_MAX_CHANGE = float(os.getenv("PLAN_REPLAN_MAX_CHANGE", "0.5"))
+# Seconds after the last upload of a course before its schedule is precomputed, 0 disables precomputation
+SCHEDULE_PRECOMPUTE_DELAY_SECONDS = float(os.getenv("SCHEDULE_PRECOMPUTE_DELAY_SECONDS", "10"))
+PRECOMPUTED_SCHEDULES = metrics.counter(
+    "precomputed_schedules_total",
+    "Schedules precomputed after uploads by outcome: computed, stale (files changed while generating), "
+    "joined (requested while precomputing) or served",
+    ("outcome",))
+
+PLAN_GENERATIONS = metrics.counter(
+    "plan_generations_total",
+    "Course plan templates by how much of them was generated: full, incremental, unchanged or template "
+    "(an existing one reused for another student)",
+    ("mode",))
+
+# Student preferences applied to the course plan template, see util.plan_personalize
+DEFAULT_PREFERENCES = {"lead_days": LEAD_DAYS, "max_starts_per_day": None}
+MAX_PREFERRED_LEAD_DAYS = 60
+
 async def get_schedule(username=None, course_id=None):
     """Get the schedule text for a specific user and course
     
@@ -37,235 +101,1059 @@ async def get_schedule(username=None, course_id=None):
         course_id (str, optional): Course ID to get schedule for
         
     Returns:
-        str: The schedule text
+        dict: Calendar text by page number, or {"error": message}
     """
-    schedule_text = await retrieve_calendar(username, course_id)
-    return schedule_text
+    return await retrieve_calendar(username, course_id)
+
+def is_page_dict(data):
+    """Whether data is extracted PDF text keyed by page number"""
+    return isinstance(data, dict) and bool(data) and all(str(k).isdigit() for k in data)
+
+def model_id(model):
+    """Model as part of a cache key, telling synthetic responses apart from real ones"""
+    mode = get_llm_mode()
+    return f"{mode}:{model}" if mode == "synthetic" else model
+
+class ScheduleInputs:
+    """Everything a course's syllabus analysis and schedule are generated from
+
+    Cached analyses and schedules are stored with the cache key of their
+    inputs: the content of the uploaded files, the prompt versions and the
+    models. A cached one is used only when its key matches, so a re-upload,
+    a new prompt or a new model invalidates exactly what it affects.
+
+    The plan itself only depends on the files, so it is generated once as a
+    plan template shared by every student who uploaded the same files. A
+    student's schedule is the template adjusted to their preferences.
+
+    Attributes:
+        syllabus_hash (str): SHA-256 of the uploaded syllabus, None if it is missing
+        calendar_hash (str): SHA-256 of the uploaded calendar, None if it is missing
+        preferences (dict): Preferences of the student, see DEFAULT_PREFERENCES
+        analysis_key (str): Cache key of the syllabus analysis, None without a syllabus
+        schedule_inputs (dict): What the plan template is generated from
+        template_key (str): Cache key of the plan template, None without both files
+        schedule_key (str): Cache key of the student's schedule, None without both files
+    """
+
+    def __init__(self, syllabus_hash=None, calendar_hash=None, preferences=None):
+        self.syllabus_hash = syllabus_hash
+        self.calendar_hash = calendar_hash
+        self.preferences = dict(DEFAULT_PREFERENCES, **(preferences or {}))
+        self.analysis_key = cache_key(
+            "syllabus_analysis",
+            syllabus=syllabus_hash,
+            prompt=templates.syllabus_prompt_version(),
+            model=model_id(SYLLABUS_MODEL)
+        ) if syllabus_hash else None
+        self.schedule_inputs = {
+            "analysis": self.analysis_key,
+            "calendar": calendar_hash,
+            "prompt": templates.plan_prompt_version(),
+            "model": model_id(PLAN_MODEL),
+            "review_model": model_id(PLAN_REVIEW_MODEL),
+        }
+        self.template_key = cache_key("plan_template", **self.schedule_inputs) \
+            if syllabus_hash and calendar_hash else None
+        self.schedule_key = cache_key("schedule", template=self.template_key, preferences=self.preferences) \
+            if self.template_key else None
+
+_indexes_created = False
+
+def _ensure_indexes():
+    global _indexes_created
+    if not _indexes_created:
+        # Cache lookups are single reads of these indexes
+        analysis_collection.create_index([("username", 1), ("course_id", 1), ("cache_key", 1)])
+        calendar_collection.create_index([("username", 1), ("course_id", 1), ("cache_key", 1)])
+        _indexes_created = True
+
+def get_schedule_inputs(username=None, course_id=None):
+    """Hash the uploaded files of a course into the cache keys of its analysis and schedule
 
-def get_user_update_flags(username, course_id=None):
-    """Get user-specific update flags from the database
-    
     Args:
-        username (str): Username to get flags for
-        course_id (str, optional): Course ID to get flags for
-        
+        username (str, optional): Username of the files
+        course_id (str, optional): Course ID of the files
+
     Returns:
-        tuple: (syllabus_updated, calendar_updated) flags for the user
+        ScheduleInputs: The hashes and cache keys
     """
-    if not username:
-        return False, False
-    
-    # Query based on username and course_id if provided
-    query = {"username": username}
-    if course_id:
-        query["course_id"] = course_id
-        
-    user_data = users_collection.find_one(query)
-    if user_data:
-        return (
-            user_data.get("syllabus_updated", False),
-            user_data.get("calendar_updated", False)
+    _ensure_indexes()
+    return ScheduleInputs(
+        uploaded_file_hash(username, course_id, "syllabus"),
+        uploaded_file_hash(username, course_id, "calendar"),
+        get_user_preferences(username)
+    )
+
+def get_user_preferences(username=None):
+    """Get the schedule preferences of a user
+
+    Args:
+        username (str, optional): Username to get preferences for
+
+    Returns:
+        dict: The preferences, DEFAULT_PREFERENCES for those not set
+    """
+    preferences = dict(DEFAULT_PREFERENCES)
+    if username:
+        stored = preferences_collection.find_one({"_id": username}) or {}
+        preferences.update({k: stored[k] for k in DEFAULT_PREFERENCES if k in stored})
+    return preferences
+
+def set_user_preferences(username, preferences):
+    """Update the schedule preferences of a user
+
+    Args:
+        username (str): Username to update preferences for
+        preferences (dict): lead_days (days to start before a due) and/or
+            max_starts_per_day (most assignments to start on one day, None for no limit)
+
+    Returns:
+        dict: All preferences of the user
+
+    Raises:
+        ValueError: If a preference is unknown or invalid
+    """
+    update = {}
+    for name, value in preferences.items():
+        if name not in DEFAULT_PREFERENCES:
+            raise ValueError(f"Unknown preference {name}")
+        if name == "lead_days":
+            if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_PREFERRED_LEAD_DAYS:
+                raise ValueError(f"lead_days must be a whole number of days from 0 to {MAX_PREFERRED_LEAD_DAYS}")
+        elif value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            raise ValueError(f"{name} must be a positive whole number or null")
+        update[name] = value
+    if update:
+        preferences_collection.update_one(
+            {"_id": username},
+            {"$set": dict(update, updated_at=datetime.datetime.now(timezone.utc))},
+            upsert=True
         )
-    
-    return False, False
+    return get_user_preferences(username)
+
+def schedule_key(make_schedule=False, username=None, force_refresh=False, course_id=None):
+    """Key identifying identical schedule generations"""
+    return f"schedule:{username}:{course_id}:{make_schedule}:{force_refresh}"
+
+async def run_schedule_analysis_coalesced(make_schedule=False, username=None, force_refresh=False, course_id=None,
+                                          deadline=None, progress=None):
+    """Run run_schedule_analysis once for concurrent identical requests
+
+    Identical requests in this process share one in-flight call, and the Mongo
+    lease makes requests on other workers wait for it too, instead of running
+    the LLM pipeline again and racing to save the result.
+
+    Args:
+        make_schedule (bool): Whether to generate Google Calendar events
+        username (str): Username for caching results
+        force_refresh (bool): Force regeneration of analysis
+        course_id (str): Course ID for specific course data
+        deadline (Deadline, optional): Deadline of this request, it only stops waiting for the
+            shared call, which runs until every request waiting for it has given up
+        progress (callable, optional): Called with each stage the shared call enters
+
+    Returns:
+        dict: The generated schedule, or {"error": message}
+    """
+    key = schedule_key(make_schedule, username, force_refresh, course_id)
+
+    def generate(shared_deadline):
+        return run_with_lease(key, lambda: run_schedule_analysis(
+            make_schedule=make_schedule,
+            username=username,
+            force_refresh=force_refresh,
+            course_id=course_id,
+            deadline=shared_deadline,
+            progress=progress
+        ))
 
-async def run_schedule_analysis(make_schedule=False, username=None, force_refresh=False, course_id=None):
+    if schedule_flights.in_flight(key):
+        print(f"Joining in-flight schedule generation for user: {username}, course: {course_id}")
+    return await schedule_flights.do(key, generate, deadline)
+
+async def run_schedule_analysis(make_schedule=False, username=None, force_refresh=False, course_id=None,
+                                deadline=None, progress=None):
     """Generate study schedule from academic calendar
     
     Logic flow:
-    1. Check if a calendar/schedule has been generated and not updated
+    1. Check if a schedule has been generated from the same files, prompts, models and preferences
        - If so, use pre-generated schedule and skip generation
-    2. Else, do the generation:
-       - If syllabus has been analyzed and hasn't been updated, use pre-generated analysis
-       - Else, generate a new analysis and save it
-       - Pass the analysis to generate a schedule
-    3. If asked to create Google Calendar API, create it (regardless of pre-gen or not)
+    2. Else, get the plan template of the course files (see get_plan_template)
+    3. Adjust the template to the user's preferences and save it as their schedule
+    4. If asked to create Google Calendar API, create it (regardless of pre-gen or not)
     
     Args:
         make_schedule (bool): Whether to generate Google Calendar events
         username (str): Username for caching results
         force_refresh (bool): Force regeneration of analysis
         course_id (str): Course ID for specific course data
+        deadline (Deadline, optional): Deadline of the request, cancels the LLM calls when it passes or is cancelled
+        progress (callable, optional): Called with each stage entered: extracting,
+            analyzing, planning, reviewing and syncing
         
     Returns:
-        str: The generated schedule analysis
+        dict: The generated schedule with its review, or {"error": message}. It is
+            passed around as an object and only serialized by the route.
     """
-    # Get user-specific update flags
-    user_syllabus_updated, user_calendar_updated = get_user_update_flags(username, course_id)
+    report = progress or (lambda stage: None)
+
+    # Hash the uploaded files into the cache keys of the analysis and schedule
+    inputs = await asyncio.to_thread(get_schedule_inputs, username, course_id)
     
-    # Step 1: Check if a calendar/schedule has been generated and not updated
-    if username and not force_refresh and not user_syllabus_updated and not user_calendar_updated:
+    # Step 1: Check if a schedule has been generated from the same inputs
+    if username and not force_refresh and inputs.schedule_key:
         # Create query based on username and course_id if provided
         query = {"username": username}
         if course_id:
             query["course_id"] = course_id
+        query["cache_key"] = inputs.schedule_key
             
         cached_calendar = calendar_collection.find_one(query)
         if cached_calendar and "schedule" in cached_calendar:
             print(f"Using cached schedule for user: {username}, course: {course_id}")
+            if cached_calendar.get("precomputed_at"):
+                # Count the first time a precomputed schedule is requested
+                calendar_collection.update_one({"_id": cached_calendar["_id"]}, {"$unset": {"precomputed_at": ""}})
+                PRECOMPUTED_SCHEDULES.inc(outcome="served")
             schedule_data = cached_calendar["schedule"]
+            if isinstance(schedule_data, str):
+                # Schedules saved as JSON text by older versions
+                try:
+                    schedule_data = json.loads(schedule_data)
+                except json.JSONDecodeError:
+                    schedule_data = {"schedule": schedule_data}
             
             # If make_schedule is requested, create Google Calendar events
             if make_schedule:
-                # Convert schedule_data to string if it's not already
-                if not isinstance(schedule_data, str):
-                    schedule_data = json.dumps(schedule_data)
+                report("syncing")
                 await make_google_calendar(schedule_data, username, course_id)
                 
             # Return the cached schedule
-            if isinstance(schedule_data, str):
-                return schedule_data
-            return json.dumps(schedule_data)
-    
-    # Step 2: Generate a new analysis and schedule
-    # Check if syllabus has been analyzed and hasn't been updated
+            return schedule_data
+
+    # Step 2: Get the plan template shared by every student with the same files
+    template = await get_plan_template(username, course_id, inputs, force_refresh, deadline, progress)
+    if "error" in template:
+        return {"error": template["error"]}
+
+    # Step 3: Personalize the template without an LLM call
+    combined_result = personalize_schedule(template, inputs.preferences)
+    if username:
+        save_schedule(username, course_id, combined_result, inputs)
+
+    # If make_schedule is requested, create Google Calendar events
+    if make_schedule:
+        report("syncing")
+        await make_google_calendar(combined_result, username, course_id)
+
+    # Return the schedule
+    return combined_result
+
+def personalize_schedule(template, preferences):
+    """Adjust the plan of a plan template to a student's preferences
+
+    Args:
+        template (dict): The plan template, with its schedule and the lead time it was made with
+        preferences (dict): Preferences of the student
+
+    Returns:
+        dict: The schedule with the personalized plan and the template's review
+    """
+    schedule = template["schedule"]
+    plan = schedule.get("plan") if isinstance(schedule, dict) else None
+    personalized = personalize_plan(plan, preferences["lead_days"], preferences["max_starts_per_day"],
+                                    template.get("lead_days", LEAD_DAYS))
+    if personalized is plan:
+        return schedule
+    return dict(schedule, plan=personalized)
+
+async def run_deterministic_schedule(make_schedule=False, username=None, course_id=None, deadline=None):
+    """Compute a study schedule from the syllabus task estimates, without the plan agents
+
+    Starts are placed from the day_needed range of each task of the syllabus
+    analysis before its due date on the calendar, at most max_starts_per_day
+    (see get_user_preferences) on one day. Only the syllabus analysis may
+    need an LLM call, and it is cached like for generated plans. The schedule
+    is not saved, so it does not replace the generated one.
+
+    Args:
+        make_schedule (bool): Whether to generate Google Calendar events
+        username (str): Username of the course files
+        course_id (str): Course ID of the course files
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        dict: The schedule with a summary as its review, or {"error": message}
+    """
+    inputs = await asyncio.to_thread(get_schedule_inputs, username, course_id)
+
     syllabus_data = None
-    if username and not force_refresh and not user_syllabus_updated:
+    if username and inputs.analysis_key:
+        query = {"username": username, "cache_key": inputs.analysis_key}
+        if course_id:
+            query["course_id"] = course_id
+        cached = await asyncio.to_thread(analysis_collection.find_one, query)
+        if cached and "analysis" in cached:
+            syllabus_data = cached["analysis"]
+    try:
+        if syllabus_data is None:
+            syllabus_data = await analyze_syllabus(username, course_id, inputs.analysis_key, deadline)
+        schedule_text = await get_schedule(username, course_id)
+        if isinstance(schedule_text, dict) and "error" in schedule_text:
+            return {"error": schedule_text["error"]}
+        schedule_json = await fix_json(schedule_text, deadline=deadline)
+    except ScheduleError as e:
+        return {"error": str(e)}
+    except ValueError as e:
+        print(f"Error parsing schedule text: {e}")
+        return {"error": "Failed to parse schedule text."}
+
+    started = time.monotonic()
+    scheduled = schedule_study_plan(syllabus_data, extract_deliverables(schedule_json),
+                                    inputs.preferences["max_starts_per_day"])
+    print(f"Scheduled {scheduled.scheduled} assignments for user: {username}, course: {course_id} "
+          f"in {(time.monotonic() - started) * 1000:.1f}ms")
+    result = {"plan": scheduled.plan, "review": scheduled.review()}
+
+    if make_schedule:
+        await make_google_calendar(result, username, course_id)
+    return result
+
+async def get_plan_template(username, course_id, inputs, force_refresh=False, deadline=None, progress=None):
+    """Get the plan template of a course's files, generating it once for every student
+
+    Logic flow:
+    1. Use the stored template of the same files, prompts and models
+    2. Else, if only the calendar changed since the user's last template, regenerate the days it affects
+    3. Else, generate a new analysis and template
+
+    Concurrent generations of the same template, for any user and on any
+    worker, share one run.
+
+    Args:
+        username (str): Username whose files the template is generated from
+        course_id (str): Course ID of the files
+        inputs (ScheduleInputs): Hashes and cache keys of the files
+        force_refresh (bool): Regenerate the analysis and template
+        deadline (Deadline, optional): Deadline of the request
+        progress (callable, optional): Called with each stage entered
+
+    Returns:
+        dict: The template, {"schedule", "calendar_deliverables", "lead_days"}, or {"error": message}
+    """
+    if not force_refresh and inputs.template_key:
+        template = await asyncio.to_thread(plan_templates_collection.find_one, {"_id": inputs.template_key})
+        if template:
+            print(f"Using plan template for user: {username}, course: {course_id}")
+            PLAN_GENERATIONS.inc(mode="template")
+            return template
+
+    async def generate(deadline):
+        if username and not force_refresh and inputs.template_key and PLAN_INCREMENTAL:
+            # A re-uploaded calendar only regenerates the days around the deliverables it changed
+            template = await replan_template(username, course_id, inputs, deadline, progress)
+            if template is not None:
+                return template
+        return await generate_plan_template(username, course_id, inputs, force_refresh, deadline, progress)
+
+    if not inputs.template_key:
+        return await generate(deadline)
+    key = f"plan_template:{inputs.template_key}:{force_refresh}"
+    # Shared by every student with the same files, each waiting under their own deadline
+    return await schedule_flights.do(key, lambda shared_deadline: run_with_lease(
+        key, lambda: generate(shared_deadline)), deadline)
+
+async def generate_plan_template(username, course_id, inputs, force_refresh=False, deadline=None, progress=None):
+    """Generate the analysis and plan template of a course's files
+
+    Logic flow:
+    - If the syllabus has been analyzed with the same prompts and model, use pre-generated analysis
+    - Else, generate a new analysis and save it
+    - Pass the analysis and the calendar to generate a plan, review it and save it as the template
+
+    Args:
+        username (str): Username whose files the template is generated from
+        course_id (str): Course ID of the files
+        inputs (ScheduleInputs): Hashes and cache keys of the files
+        force_refresh (bool): Regenerate the analysis
+        deadline (Deadline, optional): Deadline of the request
+        progress (callable, optional): Called with each stage entered
+
+    Returns:
+        dict: The template, {"schedule", "calendar_deliverables", "lead_days"}, or {"error": message}
+    """
+    report = progress or (lambda stage: None)
+
+    # The stages form a graph, so the calendar is read and parsed while the
+    # syllabus is being analyzed.
+    report("extracting")
+    pipeline = Pipeline("schedule")
+
+    @pipeline.stage("cached_analysis")
+    async def cached_analysis():
+        # Check if the syllabus has been analyzed with the same prompts and model
+        if not username or force_refresh or not inputs.analysis_key:
+            return None
+
         # Create query based on username and course_id if provided
         query = {"username": username}
         if course_id:
             query["course_id"] = course_id
-            
-        cached_analysis = analysis_collection.find_one(query)
-        if cached_analysis and "analysis" in cached_analysis:
+        query["cache_key"] = inputs.analysis_key
+
+        cached = await asyncio.to_thread(analysis_collection.find_one, query)
+        if cached and "analysis" in cached:
             print(f"Using cached syllabus analysis for user: {username}, course: {course_id}")
-            syllabus_data = cached_analysis["analysis"]
-    
-    # If no cached syllabus analysis or it's been updated, generate a new one
-    if syllabus_data is None:
-        # Get syllabus text
-        syllabus_text = await retrieve_syllabus(username, course_id)
-        
+            return cached["analysis"]
+        return None
+
+    @pipeline.stage("syllabus_analysis", deps=["cached_analysis"])
+    async def syllabus_analysis(cached):
+        # If there is no syllabus analysis of the current inputs, generate a new one
+        if cached is not None:
+            return cached
+        report("analyzing")
+        return await analyze_syllabus(username, course_id, inputs.analysis_key, deadline)
+
+    @pipeline.stage("calendar")
+    async def calendar():
+        # Get schedule text, already parsed unless it is an error
+        schedule_text = await get_schedule(username, course_id)
         try:
-            # Parse syllabus text as JSON
-            syllabus_json = await fix_json(syllabus_text)
-            
-            # Generate syllabus analysis using a new agent instance
-            print(f"Generating new syllabus analysis for user: {username}, course: {course_id}")
-            syllabus_agent = make_new_syllabus_agent()
-            syllabus_analysis = await syllabus_agent.send_message(json.dumps(syllabus_json))
-            
-            # Try to parse the analysis as JSON
-            try:
-                syllabus_data = await fix_json(syllabus_analysis)
-            except ValueError as e:
-                print(f"Error parsing syllabus analysis: {e}")
-                return json.dumps({"error": "Failed to parse syllabus analysis."})
-            
-            # Save the analysis to the database if username is provided
-            if username:
-                # Create query based on username and course_id if provided
-                query = {"username": username}
-                if course_id:
-                    query["course_id"] = course_id
-                    
-                # Update or insert the analysis
-                analysis_collection.update_one(
-                    query,
-                    {
-                        "$set": {
-                            "analysis": syllabus_data,
-                            "updated_at": datetime.datetime.now(timezone.utc)
-                        }
-                    },
-                    upsert=True
-                )
-                
-                # Reset the syllabus_updated flag
-                if user_syllabus_updated:
-                    users_collection.update_one(
-                        query,
-                        {"$set": {"syllabus_updated": False}}
-                    )
+            return await fix_json(schedule_text, deadline=deadline)
         except ValueError as e:
-            print(f"Error parsing syllabus text: {e}")
-            return json.dumps({"error": "Failed to parse syllabus text."})
-    
-    # Get schedule text
-    schedule_text = await get_schedule(username, course_id)
-    
-    try:
-        # Parse schedule text as JSON
-        schedule_json = await fix_json(schedule_text)
-        
+            print(f"Error parsing schedule text: {e}")
+            raise ScheduleError("Failed to parse schedule text.")
+
+    @pipeline.stage("plan", deps=["syllabus_analysis", "calendar"])
+    async def plan(syllabus_data, schedule_json):
         # Generate schedule using a new agent instance
         print(f"Generating new schedule for user: {username}, course: {course_id}")
+        report("planning")
         plan_agent = make_new_plan_agent()
-        schedule_prompt = f"Syllabus Analysis: {json.dumps(syllabus_data)}\n\nSchedule: {json.dumps(schedule_json)}"
-        schedule_result = await plan_agent.send_message(schedule_prompt)
-        
-        # Review the generated plan using a new plan review agent instance
-        print(f"Reviewing study plan for user: {username}, course: {course_id}")
-        plan_review_agent = make_new_plan_review_agent()
-        review_prompt = f"Review this study plan and provide feedback on its quality, organization, and effectiveness. Suggest specific improvements if needed.\n\nStudy Plan: {schedule_result}"
-        plan_review = await plan_review_agent.send_message(review_prompt)
-        
-        # Add the review to the schedule result
+        schedule_prompt = templates.PLAN_REQUEST.render(syllabus_analysis=syllabus_data, schedule=schedule_json)
+        return await stream_plan(plan_agent, schedule_prompt, username, course_id, deadline)
+
+    @pipeline.stage("review", deps=["plan"])
+    async def review(schedule_result):
+        report("reviewing")
+        return await review_plan(schedule_result, username, course_id, deadline)
+
+    @pipeline.stage("save", deps=["plan", "review", "calendar"])
+    async def save(schedule_result, plan_review, schedule_json):
+        combined_result = await combine_plan_review(schedule_result, plan_review, username, course_id, deadline)
+
+        # Save the template with the calendar deliverables it was made from, for incremental re-planning
+        template = save_plan_template(inputs, combined_result, extract_deliverables(schedule_json))
+        PLAN_GENERATIONS.inc(mode="full")
+        return template
+
+    try:
+        run = await pipeline.run()
+    except ScheduleError as e:
+        return {"error": str(e)}
+    print(run.report())
+    return run["save"]
+
+async def run_schedule_job(params, deadline, progress):
+    """Job handler generating a schedule in a job worker, see controller.job_service
+
+    Args:
+        params (dict): Arguments of run_schedule_analysis
+        deadline (Deadline): Deadline of the job
+        progress (callable): Records the stage the job entered
+
+    Returns:
+        dict: The generated schedule
+
+    Raises:
+        JobFailed: If the schedule could not be generated
+    """
+    result = await run_schedule_analysis_coalesced(deadline=deadline, progress=progress, **params)
+    if isinstance(result, dict) and set(result) == {"error"}:
+        raise JobFailed(result["error"])
+    return result
+
+register_job_handler("schedule", run_schedule_job)
+
+def submit_schedule_job(make_schedule=False, username=None, force_refresh=False, course_id=None):
+    """Queue a schedule generation, or join the identical one already queued or running
+
+    Returns:
+        dict: The job document
+    """
+    params = {
+        "make_schedule": make_schedule,
+        "username": username,
+        "force_refresh": force_refresh,
+        "course_id": course_id,
+    }
+    job = submit_job("schedule", params, username=username,
+                     dedup_key=schedule_key(make_schedule, username, force_refresh, course_id))
+    if job.get("kind") == "precompute_schedule":
+        PRECOMPUTED_SCHEDULES.inc(outcome="joined")
+    return job
+
+def get_schedule_courses(username, course_ids=None):
+    """Courses of a user to schedule together
+
+    Args:
+        username (str): Username to get courses for
+        course_ids (list, optional): Only these courses, all of the user's by default
+
+    Returns:
+        list: {"course_id", "course_name"} of each course
+    """
+    courses = get_user_courses(username)
+    if course_ids:
+        names = {course["course_id"]: course["course_name"] for course in courses}
+        courses = [{"course_id": c, "course_name": names.get(c, c)} for c in dict.fromkeys(course_ids)]
+    return courses
+
+def merge_course_schedules(username, courses, schedules):
+    """Merge the schedules of a user's courses into one plan, leveled across courses
+
+    Args:
+        username (str): Username whose max_starts_per_day limits the merged plan
+        courses (list): {"course_id", "course_name"} of each course, naming it in the merged plan
+        schedules (dict): Schedule of each course by course ID, courses without a plan are left out
+
+    Returns:
+        dict: {"plan", "busy_days"}, see util.plan_merge.merge_course_plans
+    """
+    plans = {}
+    for course, schedule in schedules.items():
+        plan = schedule.get("plan") if isinstance(schedule, dict) else None
+        if isinstance(plan, list):
+            plans[course] = plan
+    max_starts = get_user_preferences(username)["max_starts_per_day"] or DEFAULT_MAX_STARTS_PER_DAY
+    names = {course["course_id"]: course["course_name"] for course in courses}
+    return merge_course_plans(plans, max_starts, names)
+
+async def run_course_schedules(username, courses, force_refresh=False, deadline=None):
+    """Generate or fetch the schedules of several courses concurrently
+
+    Args:
+        username (str): Username of the courses
+        courses (list): {"course_id", "course_name"} of each course, see get_schedule_courses
+        force_refresh (bool): Force regeneration of the analyses
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        Async generator yielding (course, schedule) as each course's schedule is ready,
+        the schedule being {"error": message} when it could not be generated.
+        Closing it cancels the courses still running.
+
+    Raises:
+        DeadlineExceeded, RequestCancelled: If the request timed out or was cancelled,
+            which stops every course
+    """
+    async def run(course):
         try:
-            schedule_data = await fix_json(schedule_result)
-            review_data = await fix_json(plan_review)
-            
-            # Check if the review contains a fixed plan
-            if isinstance(review_data, dict) and "fixed_plan" in review_data:
-                # Use the fixed plan if available
-                fixed_plan = review_data.get("fixed_plan")
-                if fixed_plan:
-                    print(f"Using fixed plan for user: {username}, course: {course_id}")
-                    schedule_data = fixed_plan
-            
-            # Create a combined result with both the plan and its review
-            combined_result = {
-                "plan": schedule_data,
-                "review": review_data.get("review", review_data) if isinstance(review_data, dict) else review_data
-            }
-            
+            schedule = await run_schedule_analysis_coalesced(
+                username=username,
+                force_refresh=force_refresh,
+                course_id=course["course_id"],
+                deadline=deadline
+            )
+        except (DeadlineExceeded, RequestCancelled):
+            raise
+        except Exception as e:
+            # One course failing does not fail the others
+            print(f"Error generating schedule for user: {username}, course: {course['course_id']}: {str(e)}")
+            schedule = {"error": str(e) or repr(e)}
+        return course, schedule
+
+    tasks = [asyncio.create_task(run(course)) for course in courses]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Retrieves what the unfinished courses raised, a deadline shared with the request
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_precompute_job(params, deadline, progress):
+    """Job handler generating a schedule ahead of its first request, see precompute_schedule
+
+    If the files are uploaded again while the schedule is generated, the
+    result is stale: it is stored under the cache key of the old files, so the
+    next request generates the schedule of the new ones.
+
+    Args:
+        params (dict): username and course_id
+        deadline (Deadline): Deadline of the job
+        progress (callable): Records the stage the job entered
+
+    Returns:
+        dict: The generated schedule
+
+    Raises:
+        JobFailed: If the schedule could not be generated
+    """
+    username, course_id = params["username"], params["course_id"]
+    query = {"username": username, "course_id": course_id}
+    before = await asyncio.to_thread(users_collection.find_one, query) or {}
+
+    result = await run_schedule_job({"username": username, "course_id": course_id}, deadline, progress)
+
+    after = await asyncio.to_thread(users_collection.find_one, query) or {}
+    if after.get("flags_updated_at") != before.get("flags_updated_at"):
+        print(f"Files changed while precomputing the schedule for user: {username}, course: {course_id}")
+        PRECOMPUTED_SCHEDULES.inc(outcome="stale")
+        return result
+
+    calendar_collection.update_one(query, {"$set": {"precomputed_at": datetime.datetime.now(timezone.utc)}})
+    PRECOMPUTED_SCHEDULES.inc(outcome="computed")
+    return result
+
+register_job_handler("precompute_schedule", run_precompute_job)
+
+def precompute_schedule(username, course_id):
+    """Queue generation of a course's schedule once both of its files are uploaded
+
+    Users almost always request the schedule right after uploading, so it is
+    generated in the background and stored like any other. The job starts
+    SCHEDULE_PRECOMPUTE_DELAY_SECONDS after the last upload: every upload in
+    the meantime pushes it back. A GET /schedule in the meantime joins it,
+    since it shares the job's dedup key, and starts it right away.
+
+    Args:
+        username (str): Username of the uploaded files
+        course_id (str): Course ID of the uploaded files
+
+    Returns:
+        dict: The job document, None if nothing was queued
+    """
+    if not SCHEDULE_PRECOMPUTE_DELAY_SECONDS or not has_uploaded_files(username, course_id):
+        return None
+    print(f"Precomputing schedule for user: {username}, course: {course_id} "
+          f"in {SCHEDULE_PRECOMPUTE_DELAY_SECONDS:g}s")
+    return submit_job("precompute_schedule", {"username": username, "course_id": course_id},
+                      username=username, dedup_key=schedule_key(False, username, False, course_id),
+                      delay=SCHEDULE_PRECOMPUTE_DELAY_SECONDS)
+
+async def combine_plan_review(schedule_result, plan_review, username=None, course_id=None, deadline=None):
+    """Combine a generated plan with its review, using the plan the review fixed if there is one
+
+    Args:
+        schedule_result (list or str): The plan, or the raw model output
+        plan_review (dict or str): The result of review_plan
+        username (str, optional): Username the plan is for, for logging
+        course_id (str, optional): Course ID the plan is for, for logging
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        dict: {"plan", "review"}
+
+    Raises:
+        ScheduleError: If the plan or its review could not be parsed
+    """
+    try:
+        review_data = await fix_json(plan_review, deadline=deadline)
+    except ValueError as e:
+        print(f"Error parsing schedule result or review: {e}")
+        raise ScheduleError("Failed to parse schedule result or review.")
+
+    # Use the fixed plan if the review contains one
+    fixed_plan = review_data.get("fixed_plan") if isinstance(review_data, dict) else None
+    if fixed_plan:
+        print(f"Using fixed plan for user: {username}, course: {course_id}")
+        schedule_data = fixed_plan
+    else:
+        try:
+            schedule_data = await fix_json(schedule_result, deadline=deadline)
         except ValueError as e:
             print(f"Error parsing schedule result or review: {e}")
-            return json.dumps({"error": "Failed to parse schedule result or review."})
-        
-        # Save the schedule to the database if username is provided
-        if username:
-            # Create query based on username and course_id if provided
-            query = {"username": username}
-            if course_id:
-                query["course_id"] = course_id
-                
-            # Update or insert the schedule
-            calendar_collection.update_one(
-                query,
-                {
-                    "$set": {
-                        "schedule": combined_result,
-                        "updated_at": datetime.datetime.now(timezone.utc)
-                    }
-                },
-                upsert=True
-            )
-            
-            # Reset the calendar_updated flag
-            if user_calendar_updated:
-                users_collection.update_one(
-                    query,
-                    {"$set": {"calendar_updated": False}}
-                )
-        
-        # If make_schedule is requested, create Google Calendar events
-        if make_schedule:
-            await make_google_calendar(json.dumps(combined_result), username, course_id)
-        
-        # Return the schedule
-        if isinstance(combined_result, str):
-            return combined_result
-        return json.dumps(combined_result)
+            raise ScheduleError("Failed to parse schedule result or review.")
+
+    # Create a combined result with both the plan and its review
+    return {
+        "plan": schedule_data,
+        "review": review_data.get("review", review_data) if isinstance(review_data, dict) else review_data
+    }
+
+def save_plan_template(inputs, combined_result, deliverables):
+    """Save a plan template, shared by every student with the same files
+
+    Args:
+        inputs (ScheduleInputs): Files, prompts and models the plan was generated from
+        combined_result (dict): The plan with its review
+        deliverables (list): Calendar deliverables the plan was made from, see util.calendar_diff
+
+    Returns:
+        dict: The template
+    """
+    template = {
+        "schedule": combined_result,
+        "calendar_deliverables": deliverables,
+        # Lead time the validator gave the plan, personalize_schedule adjusts it
+        "lead_days": LEAD_DAYS,
+    }
+    if inputs.template_key:
+        plan_templates_collection.update_one(
+            {"_id": inputs.template_key},
+            {"$set": dict(template, inputs=inputs.schedule_inputs,
+                          updated_at=datetime.datetime.now(timezone.utc))},
+            upsert=True
+        )
+    return template
+
+def save_schedule(username, course_id, combined_result, inputs):
+    """Save a user's schedule, replacing the draft saved while streaming
+
+    Args:
+        username (str): Username to save the schedule for
+        course_id (str): Course ID of the schedule
+        combined_result (dict): The personalized plan with its review
+        inputs (ScheduleInputs): Files, prompts, models and preferences the schedule was made from
+    """
+    # Create query based on username and course_id if provided
+    query = {"username": username}
+    if course_id:
+        query["course_id"] = course_id
+
+    calendar_collection.update_one(
+        query,
+        {
+            "$set": {
+                "schedule": combined_result,
+                "cache_key": inputs.schedule_key,
+                "template_key": inputs.template_key,
+                "preferences": inputs.preferences,
+                "prompt_version": templates.plan_prompt_version(),
+                "updated_at": datetime.datetime.now(timezone.utc)
+            },
+            # Set again by run_precompute_job when this schedule was precomputed
+            "$unset": {"draft_plan": "", "precomputed_at": "", "calendar_deliverables": "", "inputs": ""}
+        },
+        upsert=True
+    )
+
+async def replan_template(username, course_id, inputs, deadline=None, progress=None):
+    """Regenerate only the days of the user's last plan template affected by a re-uploaded calendar
+
+    The deliverables of the new calendar are compared with the ones the
+    template of the user's stored schedule was made from. The days up to PLAN_REPLAN_LOOKBACK_DAYS before each
+    changed deliverable are planned again, from only the deliverables that
+    matter to them; every other day of the template is kept. The merged
+    plan is checked like a new one and saved as the template of the new files.
+
+    Args:
+        username (str): Username of the stored schedule
+        course_id (str): Course ID of the stored schedule
+        inputs (ScheduleInputs): What the new template is generated from
+        deadline (Deadline, optional): Deadline of the request
+        progress (callable, optional): Called with each stage entered
+
+    Returns:
+        dict: The new template, or None if the whole plan has to be generated:
+            no stored template from the same syllabus, prompts and models, no
+            deliverables, or more than PLAN_REPLAN_MAX_CHANGE of them changed
+    """
+    report = progress or (lambda stage: None)
+    query = {"username": username}
+    if course_id:
+        query["course_id"] = course_id
+
+    cached_calendar = await asyncio.to_thread(calendar_collection.find_one, query)
+    if not cached_calendar or not cached_calendar.get("template_key"):
+        return None
+    previous = await asyncio.to_thread(plan_templates_collection.find_one, {"_id": cached_calendar["template_key"]})
+    if not previous or "calendar_deliverables" not in previous:
+        return None
+    # Only the calendar may differ
+    stored_inputs = dict(previous.get("inputs") or {}, calendar=inputs.calendar_hash)
+    if stored_inputs != inputs.schedule_inputs:
+        return None
+    schedule = previous.get("schedule")
+    plan = schedule.get("plan") if isinstance(schedule, dict) else None
+    if not isinstance(plan, list) or not plan or not isinstance(plan[0], dict):
+        return None
+    first = parse_plan_date(plan[0].get("date"))
+    if first is None:
+        return None
+
+    report("extracting")
+    pages = await get_schedule(username, course_id)
+    deliverables = extract_deliverables(pages) if is_page_dict(pages) else []
+    if not deliverables:
+        return None
+    diff = diff_deliverables(previous["calendar_deliverables"], deliverables)
+
+    if not diff.changed:
+        print(f"Calendar deliverables unchanged for user: {username}, course: {course_id}, keeping the stored plan")
+        PLAN_GENERATIONS.inc(mode="unchanged")
+        return save_plan_template(inputs, schedule, deliverables)
+    if diff.change_ratio > PLAN_REPLAN_MAX_CHANGE:
+        print(f"{len(diff.changed)} calendar deliverables changed for user: {username}, course: {course_id}, "
+              f"generating the whole plan")
+        return None
+
+    cached_analysis = await asyncio.to_thread(
+        analysis_collection.find_one, dict(query, cache_key=inputs.analysis_key))
+    if not cached_analysis or "analysis" not in cached_analysis:
+        return None
+
+    windows = affected_windows(diff.changed_dates(first), PLAN_REPLAN_LOOKBACK_DAYS)
+    # Work on deliverables up to the lookback after a window may be planned within it
+    lookback = datetime.timedelta(days=PLAN_REPLAN_LOOKBACK_DAYS)
+    relevant = [d for d in deliverables
+                if in_windows(parse_plan_date(d["date"], first), [(a, b + lookback) for a, b in windows])]
+    kept = [day for day in plan
+            if not isinstance(day, dict) or not in_windows(parse_plan_date(day.get("date"), first), windows)]
+
+    report("planning")
+    print(f"Regenerating {len(windows)} date range(s) of the plan for user: {username}, course: {course_id}, "
+          f"{len(diff.changed)} deliverable(s) changed")
+    plan_agent = make_new_plan_agent()
+    schedule_prompt = templates.PLAN_WINDOW_REQUEST.render(
+        syllabus_analysis=cached_analysis["analysis"], schedule=relevant, windows=describe_windows(windows))
+    window_result = await plan_agent.send_message(schedule_prompt, deadline=deadline)
+    try:
+        window_plan = await fix_json(window_result, deadline=deadline)
     except ValueError as e:
-        print(f"Error parsing schedule text: {e}")
-        return json.dumps({"error": "Failed to parse schedule text."})
+        print(f"Error parsing regenerated plan days: {e}")
+        return None
+    if not isinstance(window_plan, list):
+        return None
+
+    new_days = []
+    for day in window_plan:
+        try:
+            if not isinstance(day, dict):
+                raise SchemaValidationError("day is not an object")
+            validate_plan_day(day)
+        except SchemaValidationError as e:
+            print(f"Skipping invalid plan day {day}: {e}")
+            continue
+        # Days outside the windows are already planned
+        if in_windows(parse_plan_date(day["date"], first), windows):
+            new_days.append(day)
+
+    merged = sorted(kept + new_days,
+                    key=lambda day: (isinstance(day, dict) and parse_plan_date(day.get("date"), first)) or first)
+
+    report("reviewing")
+    plan_review = await review_plan(merged, username, course_id, deadline)
+    try:
+        combined_result = await combine_plan_review(merged, plan_review, username, course_id, deadline)
+    except ScheduleError:
+        return None
+    template = save_plan_template(inputs, combined_result, deliverables)
+    PLAN_GENERATIONS.inc(mode="incremental")
+    print(f"Kept {len(kept)} of {len(plan)} plan days, regenerated {len(new_days)}")
+    return template
+
+async def review_plan(schedule_result, username=None, course_id=None, deadline=None):
+    """Check a generated plan, calling the plan review agent only when needed
+
+    util.plan_validator checks and fixes the plan locally. The review agent (a
+    reasoning model, the slowest call of the pipeline) only runs when the plan
+    cannot be parsed or has problems the validator cannot fix, or when
+    PLAN_REVIEW_ALWAYS is set.
+
+    Args:
+        schedule_result (list or str): The plan, or the raw model output if it could not be parsed
+        username (str, optional): Username the plan is for, for logging
+        course_id (str, optional): Course ID the plan is for, for logging
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        dict or str: The review with its fixed plan, parsed when checked locally
+    """
+    try:
+        plan_data = await fix_json(schedule_result, deadline=deadline)
+        check = check_plan(plan_data)
+    except ValueError as e:
+        check = PlanCheck(schedule_result)
+        check.unfixable.append(f"The plan is not valid JSON: {e}")
+
+    if check.ok and not PLAN_REVIEW_ALWAYS:
+        PLAN_REVIEWS.inc(path="validator")
+        print(f"Study plan checked locally for user: {username}, course: {course_id}, "
+              f"{len(check.issues)} issue(s) fixed")
+        return {"review": check.review(), "fixed_plan": check.plan}
+
+    # Review the generated plan using a new plan review agent instance
+    PLAN_REVIEWS.inc(path="agent")
+    print(f"Reviewing study plan for user: {username}, course: {course_id}")
+    plan_review_agent = make_new_plan_review_agent()
+    review_prompt = templates.PLAN_REVIEW_REQUEST.render(
+        plan=check.plan, issues=" ".join(check.unfixable) or "none")
+    return await plan_review_agent.send_message(review_prompt, deadline=deadline)
+
+async def analyze_syllabus(username, course_id, analysis_key=None, deadline=None):
+    """Generate and save a new syllabus analysis
+
+    Args:
+        username (str): Username to save the analysis for
+        course_id (str): Course ID of the syllabus
+        analysis_key (str, optional): Cache key of the analysis, see ScheduleInputs
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        dict: The syllabus analysis
+
+    Raises:
+        ScheduleError: If the syllabus or its analysis could not be parsed
+    """
+    # Get syllabus text
+    syllabus_text = await retrieve_syllabus(username, course_id)
+
+    try:
+        # Parse syllabus text as JSON
+        syllabus_json = await fix_json(syllabus_text, deadline=deadline)
+    except ValueError as e:
+        print(f"Error parsing syllabus text: {e}")
+        raise ScheduleError("Failed to parse syllabus text.")
+
+    # Generate syllabus analysis using a new agent instance. Very long syllabi
+    # are analyzed in page groups concurrently, long ones are read through
+    # retrieval tools rather than pasted into the prompt.
+    print(f"Generating new syllabus analysis for user: {username}, course: {course_id}")
+    page_count = len(syllabus_json) if is_page_dict(syllabus_json) else 0
+    if SYLLABUS_CHUNK_MIN_PAGES and page_count >= SYLLABUS_CHUNK_MIN_PAGES:
+        syllabus_data = await analyze_syllabus_chunks(syllabus_json, deadline)
+    else:
+        if page_count >= SYLLABUS_TOOLS_MIN_PAGES:
+            syllabus_agent = make_new_syllabus_agent(PagedDocument(syllabus_json))
+            syllabus_analysis = await syllabus_agent.send_message(
+                f"Analyze the syllabus ({page_count} pages).", deadline=deadline)
+        else:
+            syllabus_agent = make_new_syllabus_agent()
+            syllabus_analysis = await syllabus_agent.send_message(json.dumps(syllabus_json), deadline=deadline)
+
+        # Try to parse the analysis as JSON
+        try:
+            syllabus_data = await fix_json(syllabus_analysis, deadline=deadline)
+        except ValueError as e:
+            print(f"Error parsing syllabus analysis: {e}")
+            raise ScheduleError("Failed to parse syllabus analysis.")
+
+    # Save the analysis to the database if username is provided
+    if username:
+        # Create query based on username and course_id if provided
+        query = {"username": username}
+        if course_id:
+            query["course_id"] = course_id
+
+        # Update or insert the analysis
+        analysis_collection.update_one(
+            query,
+            {
+                "$set": {
+                    "analysis": syllabus_data,
+                    "cache_key": analysis_key,
+                    "prompt_version": templates.syllabus_prompt_version(),
+                    "updated_at": datetime.datetime.now(timezone.utc)
+                }
+            },
+            upsert=True
+        )
+    return syllabus_data
+
+async def analyze_syllabus_chunks(pages, deadline=None):
+    """Analyze a syllabus in groups of pages concurrently and merge the analyses
+
+    Every group of SYLLABUS_CHUNK_PAGES pages is analyzed by its own syllabus
+    agent, at most SYLLABUS_CHUNK_CONCURRENCY at a time, and the analyses are
+    merged deterministically in page order.
+
+    Args:
+        pages (dict): Syllabus text by page number
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        dict: The merged syllabus analysis
+
+    Raises:
+        ScheduleError: If no page group could be analyzed
+    """
+    chunks = split_pages(pages, SYLLABUS_CHUNK_PAGES)
+    semaphore = asyncio.Semaphore(SYLLABUS_CHUNK_CONCURRENCY)
+
+    async def analyze_chunk(chunk):
+        numbers = list(chunk)
+        message = (f"Pages {numbers[0]} to {numbers[-1]} of a {len(pages)} page syllabus. "
+                   f"Analyze only these pages.\n\n{json.dumps(chunk)}")
+        async with semaphore:
+            syllabus_analysis = await make_new_syllabus_agent().send_message(message, deadline=deadline)
+        try:
+            return await fix_json(syllabus_analysis, deadline=deadline)
+        except ValueError as e:
+            print(f"Error parsing analysis of syllabus pages {numbers[0]}-{numbers[-1]}: {e}")
+            return None
+
+    print(f"Analyzing {len(pages)} syllabus pages in {len(chunks)} chunks")
+    analyses = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+    if not any(isinstance(analysis, dict) for analysis in analyses):
+        raise ScheduleError("Failed to parse syllabus analysis.")
+    return merge_syllabus_analyses(analyses)
+
+async def stream_plan(plan_agent, schedule_prompt, username=None, course_id=None, deadline=None):
+    """Generate the study plan, handling each day as soon as the model finishes writing it
+
+    Every completed day is validated and appended to a draft plan in the database
+    while the model is still writing the following days. Generation stops once
+    the plan array is closed.
+
+    Args:
+        plan_agent (Agent): The plan agent
+        schedule_prompt (str): The prompt holding the syllabus analysis and schedule
+        username (str, optional): Username to save the draft plan for
+        course_id (str, optional): Course ID to save the draft plan for
+        deadline (Deadline, optional): Deadline of the request
+
+    Returns:
+        list or str: The parsed plan, or the raw model output if it was not a complete JSON value
+    """
+    query = None
+    if username:
+        query = {"username": username}
+        if course_id:
+            query["course_id"] = course_id
+        calendar_collection.update_one(query, {"$set": {"draft_plan": []}}, upsert=True)
+
+    parser = JsonStreamParser()
+    async for day in plan_agent.stream_json(schedule_prompt, parser, deadline=deadline):
+        try:
+            validate_plan_day(day)
+        except SchemaValidationError as e:
+            print(f"Skipping invalid plan day {day}: {e}")
+            continue
+        if query:
+            calendar_collection.update_one(query, {"$push": {"draft_plan": day}})
+
+    if parser.errors:
+        # Malformed JSON mid-stream, the whole output was still read for fix_json to repair
+        print(f"Error parsing streamed plan: {'; '.join(parser.errors)}")
+    if parser.done:
+        return parser.value
+    return parser.text
+
+
+def validate_plan_day(day):
+    """Validate a single study plan day against its JSON Schema
+
+    Args:
+        day: The parsed plan day
+
+    Raises:
+        SchemaValidationError: If the day does not match the schema
+    """
+    validator = compile_validator(json_schemas.STUDY_PLAN_DAY_SCHEMA)
+    if validator is not None:
+        validator(day)
+
 
-async def make_google_calendar(plan: str, username=None, course_id=None):
+async def make_google_calendar(plan, username=None, course_id=None):
     """Create Google Calendar events from a study plan
     
     Args:
-        plan (str): The study plan to create events from
+        plan (dict or str): The schedule with its plan, or its JSON text
         username (str, optional): Username to associate events with
         course_id (str, optional): Course ID to associate events with
         
@@ -4,7 +4,7 @@ import json
 from flask_cors import CORS
 from pymongo import MongoClient
 from bson import ObjectId
-from dotenv import load_dotenv
+from util.env import load_env
 import bcrypt
 
 # Custom JSON encoder for MongoDB ObjectId
@@ -18,9 +18,11 @@ class MongoJSONEncoder(json.JSONEncoder):
 from routes.schedule_routes import schedule_bp
 from routes.file_routes import file_bp
 from routes.review_routes import review_bp
+from routes.metrics_routes import metrics_bp
+from controller.job_service import start_job_workers
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 # Setup secrets directory
 SECRETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'secrets')
@@ -59,6 +61,7 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.register_blueprint(schedule_bp)
 app.register_blueprint(file_bp)
 app.register_blueprint(review_bp)
+app.register_blueprint(metrics_bp)
 
 # Course routes
 @app.route("/courses", methods=["GET"])
@@ -288,4 +291,7 @@ def register():
         return flask.jsonify({"error": f"Registration failed: {str(e)}"}), 500
 
 if __name__ == "__main__":
+    # Run queued schedule jobs in this process (JOB_WORKERS=0 leaves them to `python -m controller.job_service`).
+    # Started here rather than on import, so importing the app does not start threads.
+    start_job_workers()
     app.run(port=2817)
\ No newline at end of file
@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import os
 from typing import Sequence
 
@@ -7,34 +8,43 @@ from autogen_agentchat.messages import ChatMessage
 
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.agents import AssistantAgent, BaseChatAgent
-from dotenv import load_dotenv
 
 from model.chat_receiver import ChatReceiver
-from boundary.llms.moonshot import KimiStaticTesting
+from model.memory import MemoryPolicy, SummarizingChatCompletionContext
 
 from autogen_core import CancellationToken
+from autogen_core.models import SystemMessage, UserMessage
 
+from util.deadline import Deadline
+from util.json_stream import JsonStreamParser, iter_json_items
 
-load_dotenv()
 
 class Agent:
     def __init__(self, chatReceiver: ChatReceiver, name = "",
-                 tools = []):
+                 tools = [], memory: MemoryPolicy = None,
+                 max_tool_iterations = 1):
         self.chatReceiver = chatReceiver
+        self.chatReceiver.set_agent_name(name)
+        # Without a memory policy the whole conversation is sent on every turn
+        self.model_context = SummarizingChatCompletionContext(memory) if memory else None
         self.agent = AssistantAgent(
                     name=name,
                     model_client=self.chatReceiver.client,
                     tools=tools,
                     system_message=self.chatReceiver.system_prompt,
+                    model_context=self.model_context,
+                    # With tools, keep calling them until the model answers, and make
+                    # it answer from the results if it runs out of iterations
+                    max_tool_iterations=max_tool_iterations,
+                    reflect_on_tool_use=bool(tools),
                 )
-        self.messages = []  # Store message history
+        self.messages = []  # Store message history, the full transcript whatever the memory policy
 
-    async def send_message(self, message, is_debug = False):
+    async def send_message(self, message, is_debug = False, deadline: Deadline = None):
         print("Loading...")
-        response = await self.agent.run(
-            task=message,
-            cancellation_token=CancellationToken(),
-        )
+        with deadline.token() if deadline else contextlib.nullcontext(CancellationToken()) as token:
+            run = self.agent.run(task=message, cancellation_token=token)
+            response = await (deadline.run(run) if deadline else run)
         if is_debug:
             print(response.messages[-1].models_usage)
             print(response.stop_reason)
@@ -42,10 +52,69 @@ class Agent:
         # Store all messages from the response
         self.messages.extend(response.messages)
 
-        return response.messages[-1].content
+        content = response.messages[-1].content
+        # Agents with a JSON Schema return just the (validated) JSON payload
+        if self.chatReceiver.json_schema:
+            content = self.chatReceiver.extract_json(content)
+        return content
+
+
+class Completion:
+    """Single-shot completion calling the model client directly
+
+    For stateless agents answering one message at a time: no agent runtime, no
+    message history and no tool loop. Conversations that need history use Agent.
+    """
+
+    def __init__(self, chatReceiver: ChatReceiver, name=""):
+        self.chatReceiver = chatReceiver
+        self.chatReceiver.set_agent_name(name)
+        self.name = name
+        self._system_message = SystemMessage(content=self.chatReceiver.system_prompt)
+
+    def _make_messages(self, message):
+        return [self._system_message, UserMessage(content=message, source="user")]
+
+    async def send_message(self, message, is_debug = False, deadline: Deadline = None):
+        print("Loading...")
+        with deadline.token() if deadline else contextlib.nullcontext() as token:
+            create = self.chatReceiver.client.create(self._make_messages(message), cancellation_token=token)
+            result = await (deadline.run(create) if deadline else create)
+        if is_debug:
+            print(result.usage)
+            print(result.finish_reason)
+
+        content = result.content
+        # Agents with a JSON Schema return just the (validated) JSON payload
+        if self.chatReceiver.json_schema:
+            content = self.chatReceiver.extract_json(content)
+        return content
+
+    async def stream_json(self, message, parser: JsonStreamParser = None, deadline: Deadline = None):
+        """Send a single message and yield the elements of the JSON array answer as they complete
+
+        Generation stops as soon as the top-level value is complete.
+
+        Args:
+            message: The message to send
+            parser: Parser to use, pass one in to read parser.value or parser.text afterwards
+            deadline: Deadline of the request, checked as items arrive
+
+        Returns:
+            AsyncGenerator yielding each completed array element
+        """
+        print("Loading...")
+        parser = parser or JsonStreamParser()
+        with deadline.token() if deadline else contextlib.nullcontext() as token:
+            stream = self.chatReceiver.client.create_stream(self._make_messages(message), cancellation_token=token)
+            async for item in iter_json_items(stream, parser):
+                if deadline:
+                    deadline.check()
+                yield item
 
 
 if __name__ == '__main__':
+    from boundary.llms.moonshot import KimiStaticTesting
     myAgent = Agent(KimiStaticTesting)
     while True:
         userInput = input()
@@ -1,10 +1,22 @@
 from abc import ABC, abstractmethod
-import requests
-from openai import OpenAI
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_core.models import UserMessage
 
+from util import metrics
+from util.schema_validator import compile_validator, SchemaValidationError
+from util.text_extractor import find_json_payload
+
+SCHEMA_VALIDATIONS = metrics.counter(
+    "llm_schema_validation_total",
+    "Local JSON Schema validation of JSON agent responses (valid, invalid, unparseable)",
+    ("provider", "model", "agent", "result"))
+
+
 class ChatReceiver(ABC):
+    # Provider label used in telemetry, set by each provider subclass
+    provider = "unknown"
+    # Provider-side structured output: "json_schema", "json_object" or None
+    structured_output = None
 
     def __init__(self,api_key,base_url,
                  model,
@@ -12,8 +24,12 @@ class ChatReceiver(ABC):
                  temperature = 0.6,
                  use_vision=False,
                  use_function_call=True,
-                 use_json=False
+                 use_json=False,
+                 json_schema=None
                  ):
+        # Set before set_up_client, which requests structured output from the schema
+        self.json_schema = json_schema
+        self.json_validator = compile_validator(json_schema) if json_schema else None
 
         self.set_up_client(api_key, base_url,
                            model_name = model,
@@ -30,8 +46,14 @@ class ChatReceiver(ABC):
                       use_function_call = True,
                       use_json = False,
                         ):
+        # Imported here, boundary.llms.offline subclasses ChatReceiver
+        from boundary.llms.continuation import ContinuingChatCompletionClient
+        from boundary.llms.offline import offline_client_for
+        from boundary.llms.telemetry import InstrumentedChatCompletionClient
 
-        self.client = OpenAIChatCompletionClient(
+        # LLM_MODE decides whether this is the live client, a recorder
+        # wrapping it, or an offline replay/synthetic client
+        client = offline_client_for(model_name, lambda: OpenAIChatCompletionClient(
             model=model_name,
             api_key= api_key,
             base_url= base_url,
@@ -40,8 +62,82 @@ class ChatReceiver(ABC):
                 "function_calling": use_function_call,
                 "json_output": use_json,
             },
-            max_tokens=8192
-        )
+            max_tokens=8192,
+            # Retries are done (and counted) by InstrumentedChatCompletionClient
+            max_retries=0,
+            **self.structured_output_args(model_name, use_json)
+        ))
+        self.model_name = model_name
+        # Responses cut off at max_tokens are continued rather than lost,
+        # each continuation call being recorded like any other
+        self.client = ContinuingChatCompletionClient(
+            InstrumentedChatCompletionClient(client, provider=self.provider, model=model_name))
+
+    def set_agent_name(self, name: str):
+        """Label the telemetry of this receiver's calls with the owning agent's name"""
+        self.client.agent_name = name
+
+    def structured_output_mode(self, model_name: str):
+        """Get the structured output mode the provider supports for a model"""
+        return self.structured_output
+
+    def structured_output_args(self, model_name: str, use_json: bool) -> dict:
+        """Build the client arguments requesting provider-side structured output
+
+        Args:
+            model_name: Model the client is built for
+            use_json: Whether the agent answers in JSON
+
+        Returns:
+            dict: {"response_format": ...} or {} when the provider can't enforce the output
+        """
+        mode = self.structured_output_mode(model_name)
+        if not use_json or not self.json_schema or mode is None:
+            return {}
+
+        if mode == "json_schema":
+            return {"response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": self.json_schema.get("title", "response"),
+                    "schema": self.json_schema,
+                    "strict": False,
+                },
+            }}
+
+        # JSON object mode only guarantees a top-level object
+        if mode == "json_object" and self.json_schema.get("type") == "object":
+            return {"response_format": {"type": "json_object"}}
+        return {}
+
+    def extract_json(self, content):
+        """Extract the JSON payload of a response and validate it against json_schema
+
+        Args:
+            content (str): Raw response content
+
+        Returns:
+            str: The JSON text if one was found, otherwise the original content
+        """
+        if not isinstance(content, str):
+            return content
+
+        labels = {"provider": self.provider, "model": getattr(self, "model_name", ""),
+                  "agent": self.client.agent_name or "unknown"}
+        value, payload = find_json_payload(content)
+        if payload is None:
+            SCHEMA_VALIDATIONS.inc(result="unparseable", **labels)
+            return content
+
+        if self.json_validator is not None:
+            try:
+                self.json_validator(value)
+                SCHEMA_VALIDATIONS.inc(result="valid", **labels)
+            except SchemaValidationError as e:
+                # Callers still repair or reject the payload, so only record it here
+                SCHEMA_VALIDATIONS.inc(result="invalid", **labels)
+                print(f"Response of {labels['agent']} does not match its schema: {e}")
+        return payload
 
     # def get_model_param(self,key):
     #     return self.model_params[key]
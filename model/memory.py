@@ -0,0 +1,164 @@
+"""
+Bounded conversation memory for Agent.
+
+SummarizingChatCompletionContext shows the model only the last few turns of a
+conversation plus a running summary of everything older, so the prompt stays
+about the same size however long a session runs. Turns leaving the window are
+folded into the summary by a background thread, never while a user waits.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import FunctionExecutionResultMessage, LLMMessage, SystemMessage, UserMessage
+
+# Summaries run on their own threads (each with its own event loop), as request
+# event loops are gone once the response is sent
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class MemoryPolicy:
+    """How much of a conversation an Agent keeps in its prompt
+
+    Args:
+        window_turns: Recent turns (a user message and the replies to it) sent verbatim, fewer
+            than the turns of a review session (its opening and up to 3 explanations)
+        summarize: Whether turns leaving the window are summarized, or just dropped
+        summary_model: Model writing the summaries
+    """
+
+    def __init__(self, window_turns: int = 2, summarize: bool = True, summary_model: str = "gpt-4o-mini"):
+        if window_turns <= 0:
+            raise ValueError("window_turns must be greater than 0")
+        self.window_turns = window_turns
+        self.summarize = summarize
+        self.summary_model = summary_model
+
+    @classmethod
+    def from_env(cls):
+        """Policy configured by MEMORY_WINDOW_TURNS, MEMORY_SUMMARIZE and MEMORY_SUMMARY_MODEL"""
+        return cls(
+            window_turns=int(os.getenv("MEMORY_WINDOW_TURNS", "2")),
+            summarize=os.getenv("MEMORY_SUMMARIZE", "true").lower() == "true",
+            summary_model=os.getenv("MEMORY_SUMMARY_MODEL", "gpt-4o-mini"),
+        )
+
+
+def _turn_starts(messages: List[LLMMessage]) -> List[int]:
+    return [i for i, m in enumerate(messages) if isinstance(m, UserMessage)]
+
+
+def _render(messages: List[LLMMessage]) -> str:
+    lines = []
+    for m in messages:
+        if isinstance(m, FunctionExecutionResultMessage):
+            continue
+        source = getattr(m, "source", "system")
+        lines.append(f"{source}: {m.content}")
+    return "\n".join(lines)
+
+
+async def summarize_conversation(summary: str, messages: List[LLMMessage], model: str) -> str:
+    """Fold turns into a running conversation summary
+
+    Args:
+        summary: The summary so far, may be empty
+        messages: Turns to add to it
+        model: Model writing the summary
+
+    Returns:
+        str: The new summary
+    """
+    from boundary.llms.chatgpt import ChatGPTReceiver
+    from model.agent import Completion
+    from prompts.system_prompt import CONVERSATION_SUMMARY_PROMPT
+
+    summarizer = Completion(
+        ChatGPTReceiver(model=model, system_prompt=CONVERSATION_SUMMARY_PROMPT),
+        name="memory_summarizer"
+    )
+    return await summarizer.send_message(
+        f"Summary so far: {summary or '(none)'}\n\nNew turns:\n{_render(messages)}")
+
+
+class SummarizingChatCompletionContext(ChatCompletionContext):
+    """Model context holding a window of recent turns and a summary of older ones
+
+    Args:
+        policy: The memory policy to apply
+    """
+
+    def __init__(self, policy: MemoryPolicy, initial_messages: List[LLMMessage] | None = None):
+        super().__init__(initial_messages)
+        self.policy = policy
+        self.summary = ""
+        self._lock = threading.Lock()
+        self._summarizing = False
+        # Bumped by clear(), so a summary started before it is discarded
+        self._generation = 0
+
+    async def add_message(self, message: LLMMessage) -> None:
+        with self._lock:
+            self._messages.append(message)
+        if isinstance(message, UserMessage):
+            self._compact()
+
+    async def get_messages(self) -> List[LLMMessage]:
+        with self._lock:
+            starts = _turn_starts(self._messages)
+            first = starts[-self.policy.window_turns] if len(starts) >= self.policy.window_turns else 0
+            messages = list(self._messages[first:])
+            summary = self.summary
+        if summary:
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        return messages
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._messages = []
+            self.summary = ""
+            self._generation += 1
+
+    def _overflow(self) -> int:
+        """Number of leading messages before the window"""
+        starts = _turn_starts(self._messages)
+        if len(starts) <= self.policy.window_turns:
+            return 0
+        return starts[-self.policy.window_turns]
+
+    def _compact(self):
+        """Move turns that left the window out of the context, into the summary if enabled"""
+        with self._lock:
+            count = self._overflow()
+            if count == 0 or self._summarizing:
+                return
+            if not self.policy.summarize:
+                del self._messages[:count]
+                return
+            self._summarizing = True
+            evicted = list(self._messages[:count])
+            summary = self.summary
+            generation = self._generation
+
+        _summary_executor.submit(self._summarize, summary, evicted, generation)
+
+    def _summarize(self, summary: str, evicted: List[LLMMessage], generation: int):
+        new_summary: Optional[str] = None
+        try:
+            new_summary = asyncio.run(summarize_conversation(summary, evicted, self.policy.summary_model))
+        except Exception as e:
+            print(f"Error summarizing conversation, keeping the turns to summarize on the next compaction: {e}")
+
+        with self._lock:
+            self._summarizing = False
+            if generation != self._generation or not new_summary:
+                return
+            # Only messages were appended meanwhile, so the evicted ones are still the prefix
+            del self._messages[:len(evicted)]
+            self.summary = new_summary
+        # Catch up with turns that left the window while this summary ran
+        self._compact()
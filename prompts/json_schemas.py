@@ -0,0 +1,78 @@
+"""
+JSON Schemas of the structured outputs our JSON agents produce.
+
+Passed to ChatReceiver as json_schema: providers that support structured output
+are asked to follow the schema, and every response is validated locally against it.
+The "title" of each schema is used as the schema name sent to the provider.
+"""
+
+SYLLABUS_ANALYSIS_SCHEMA = {
+    "title": "syllabus_analysis",
+    "type": "object",
+    "properties": {
+        "tasks": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "properties": {
+                    "difficulty": {"type": "string"},
+                    "day_needed": {
+                        "type": "array",
+                        "items": {"type": "number"},
+                        "minItems": 2,
+                        "maxItems": 2
+                    }
+                },
+                "required": ["difficulty", "day_needed"]
+            }
+        },
+        "topic": {"type": "array", "items": {"type": "string"}},
+        "contains_schedule": {"type": "boolean"},
+        "thought": {"type": "string"}
+    },
+    "required": ["tasks", "topic", "contains_schedule"]
+}
+
+STUDY_PLAN_DAY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": {"type": "string"},
+        "dues": {"type": "array", "items": {"type": "string"}},
+        "start": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["date", "dues", "start"]
+}
+
+STUDY_PLAN_SCHEMA = {
+    "title": "study_plan",
+    "type": "array",
+    "items": STUDY_PLAN_DAY_SCHEMA
+}
+
+PLAN_REVIEW_SCHEMA = {
+    "title": "plan_review",
+    "type": "object",
+    "properties": {
+        "review": {"type": ["string", "object"]},
+        "fixed_plan": {
+            "anyOf": [
+                {"type": "array", "items": STUDY_PLAN_DAY_SCHEMA},
+                {"type": "null"}
+            ]
+        }
+    },
+    "required": ["review", "fixed_plan"]
+}
+
+STUDY_REVIEW_SCHEMA = {
+    "title": "study_review",
+    "type": "object",
+    "properties": {
+        "thought": {"type": "string"},
+        "evaluation": {"type": "string", "enum": ["Good", "Needs Improvement", "Off Topic"]},
+        "next_steps": {"type": "string"},
+        "continue_conversation": {"type": "boolean"},
+        "response": {"type": "string"}
+    },
+    "required": ["evaluation", "continue_conversation", "response"]
+}
@@ -22,6 +22,22 @@ Respond with a JSON object. Be concise.
 {"tasks":{"Lab":{"difficulty":"Hard","day_needed":[7,14]},"Quiz":{"difficulty":"Easy","day_needed":[2,5]}},"contains_schedule":false,"topic":["Distributed Systems","Asynchronous programming"],"thought":"For this distributed systems course, I recommend starting labs immediately upon assignment release, dedicating 2-3 weeks of consistent work per lab. Begin with requirements analysis (1-2 days), move to design (3-7 days), implementation (7-14 days), and reserve the last 2-3 days before deadline for testing and documentation. This timeline acknowledges the complexity of distributed systems implementation and the significant weight of labs (75% of your grade). For quizzes (25% of grade), since they're available online for multiple days, start preparing at least 3-4 days before the quiz closing date, reviewing lecture materials and class discussions thoroughly to ensure comprehension of technical concepts."}
 """
 
+SYLLABUS_ANALYSIS_TOOLS_PROMPT = """
+You are a professional study tutor. Based on the syllabus, generate a detailed syllabus analysis report.
+The syllabus is not included in the message. Read it with your tools, fetching only what you need:
+- list_pages: outline of the pages, start here
+- find: search for a term such as "grading", "assignment", "exam" or "schedule"
+- get_page: full text of one page
+Once you have enough information, stop calling tools and answer.
+YOUR RESPONSE MUST BE VALID, PARSEABLE JSON WITH NO ADDITIONAL TEXT BEFORE OR AFTER THE JSON.
+"tasks": Tasks to be completed in the course. Estimate how long it needs to be completed in a range. 
+"topic": Analyze the topics covered in the course. 
+"contains_schedule": Whether the syllabus contains a schedule.
+Respond with a JSON object. Be concise.
+# Output Example
+{"tasks":{"Lab":{"difficulty":"Hard","day_needed":[7,14]},"Quiz":{"difficulty":"Easy","day_needed":[2,5]}},"contains_schedule":false,"topic":["Distributed Systems","Asynchronous programming"],"thought":"Labs carry 75% of the grade and take two to three weeks each, so start them as soon as they are released. Quizzes stay open for several days; prepare three to four days before they close."}
+"""
+
 JSON_FIX_PROMPT = """
 Here is a json with wrong syntax. Fix it.
 YOUR RESPONSE MUST BE VALID, PARSEABLE JSON WITH NO ADDITIONAL TEXT BEFORE OR AFTER THE JSON.
@@ -45,3 +61,15 @@ Return a JSON object with two fields:
 1. "review": Your assessment of the original plan
 2. "fixed_plan": The corrected plan (or the original if no fixes were needed)
 """
+
+CONVERSATION_SUMMARY_PROMPT = """
+You maintain the running summary of a study review conversation between a user and a tutor.
+Given the summary so far and the new turns, return an updated summary in at most 120 words.
+Keep what the user understood, what they got wrong, and the questions already asked. Drop greetings and repetition.
+RESPOND WITH THE SUMMARY ONLY.
+"""
+
+CONTINUE_OUTPUT_PROMPT = """
+Your previous response was cut off by the output length limit.
+Continue exactly where it stopped, starting with the next character. Do not repeat anything already written and do not add any text before or after.
+"""
@@ -0,0 +1,147 @@
+"""
+Versioned prompt templates laid out for provider-side prefix caching.
+
+OpenAI, DeepSeek and Moonshot reuse the longest prompt prefix they have recently
+seen, which is billed cheaper and served faster. A prefix only matches up to the
+first differing byte, so every template is static first and dynamic last: fixed
+instructions and examples open the prompt and per-request data is appended at
+the end. Structured values are serialized deterministically, so the same data
+always renders to the same bytes.
+
+Bump a template's version whenever its text changes. The version is stored with
+the results generated from it.
+"""
+
+import json
+
+
+def to_prompt_json(value) -> str:
+    """Serialize a value for a prompt with stable key order and spacing"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+class PromptTemplate:
+    """A prompt made of a static prefix and a dynamic suffix
+
+    Args:
+        name: Name of the template
+        version: Version of the template, bumped on every text change
+        static: Text shared by every rendering, never formatted
+        dynamic: str.format template of the per-request suffix
+    """
+
+    def __init__(self, name: str, version: int, static: str, dynamic: str = ""):
+        self.name = name
+        self.version = version
+        self.static = static
+        self.dynamic = dynamic
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render(self, **values) -> str:
+        """Render the template
+
+        Args:
+            **values: Values of the dynamic fields, non-string values are serialized as JSON
+
+        Returns:
+            str: The static prefix followed by the formatted dynamic suffix
+        """
+        values = {k: v if isinstance(v, str) else to_prompt_json(v) for k, v in values.items()}
+        return self.static + self.dynamic.format(**values)
+
+
+STUDY_REVIEW_EXAMPLE_OUTPUT = {
+    "thought": "The user explained the eigenvalues and eigenvectors of a matrix. They fully understand the concept by articulating the purpose of eigenvalues and eigenvectors, and how they are used in linear algebra. They listed their properties and corresponding formulas. I believe they have a good understanding of the topic.",
+    "evaluation": "Good",
+    "next_steps": "The user can improve their understanding of the eigenvalues and eigenvectors of a matrix by practicing more problems.",
+    "continue_conversation": True,
+    "response": "Thank you for your explanation. You are such a smart cookie. Can you then give me an example of how to use the eigenvalues and eigenvectors of a matrix?"
+}
+
+STUDY_REVIEW_SYSTEM = PromptTemplate(
+    name="study_review_system",
+    version=2,
+    static=f"""You are a study review agent of the topic given at the end of these instructions. You are nice, friendly, and helpful.
+You need to ask the user to explain the topic in their own words, you then need to evaluate their understanding of the topic.
+Give a score between ["Good", "Needs Improvement", "Off Topic"] based on the user's understanding of the topic. And provide a response to the user based on their understanding of the topic.
+# Example Output
+{json.dumps(STUDY_REVIEW_EXAMPLE_OUTPUT)}
+""",
+    dynamic="""# Topic
+{topic}
+"""
+)
+
+STUDY_QUESTION_SYSTEM = PromptTemplate(
+    name="study_question_system",
+    version=2,
+    static="""You are a study review agent of the topic given at the end of these instructions. You are nice, friendly, and helpful.
+Pretend that you don't understand the topic. Generate a question that will help you understand the topic.
+DIRECTLY RESPOND WITH THE QUESTION.
+""",
+    dynamic="""# Topic
+{topic}
+"""
+)
+
+# User turn of the plan agent, after system_prompt.STUDY_PLAN_PROMPT. The syllabus
+# analysis changes less often than the calendar, so it goes first.
+PLAN_REQUEST = PromptTemplate(
+    name="plan_request",
+    version=2,
+    static="",
+    dynamic="Syllabus Analysis: {syllabus_analysis}\n\nSchedule: {schedule}"
+)
+
+# User turn of the plan agent when a re-uploaded calendar only changed some
+# deliverables: the same prefix as PLAN_REQUEST, with the changed date ranges last.
+PLAN_WINDOW_REQUEST = PromptTemplate(
+    name="plan_window_request",
+    version=1,
+    static="",
+    dynamic="Syllabus Analysis: {syllabus_analysis}\n\nSchedule: {schedule}\n\n"
+            "The rest of the plan is already made. Only plan the days within these date ranges: {windows}"
+)
+
+# User turn of the plan review agent, after system_prompt.PLAN_REVIEW_PROMPT. The
+# agent only runs for plans util.plan_validator could not fix, given its findings.
+PLAN_REVIEW_REQUEST = PromptTemplate(
+    name="plan_review_request",
+    version=2,
+    static="Review this study plan and provide feedback on its quality, organization, and effectiveness. Suggest specific improvements if needed.\n\n",
+    dynamic="Study Plan: {plan}\n\nProblems found: {issues}"
+)
+
+# Versions of the system prompts that are plain constants
+SYLLABUS_SYSTEM_VERSION = "syllabus_system@v1"
+SYLLABUS_TOOLS_SYSTEM_VERSION = "syllabus_tools_system@v1"
+STUDY_PLAN_SYSTEM_VERSION = "study_plan_system@v1"
+PLAN_REVIEW_SYSTEM_VERSION = "plan_review_system@v1"
+# Version of the rules of util.plan_validator, which fixes most plans without the review agent
+PLAN_VALIDATOR_VERSION = "plan_validator@v1"
+# Version of util.syllabus_merge, which merges the analyses of long syllabi
+SYLLABUS_MERGE_VERSION = "syllabus_merge@v1"
+
+
+def syllabus_prompt_version() -> str:
+    """Version of every prompt a syllabus analysis depends on"""
+    return "+".join([
+        SYLLABUS_SYSTEM_VERSION,
+        SYLLABUS_TOOLS_SYSTEM_VERSION,
+        SYLLABUS_MERGE_VERSION,
+    ])
+
+
+def plan_prompt_version() -> str:
+    """Version of every prompt a generated study plan depends on"""
+    return "+".join([
+        STUDY_PLAN_SYSTEM_VERSION,
+        PLAN_REQUEST.id,
+        PLAN_WINDOW_REQUEST.id,
+        PLAN_REVIEW_SYSTEM_VERSION,
+        PLAN_REVIEW_REQUEST.id,
+        PLAN_VALIDATOR_VERSION,
+    ])
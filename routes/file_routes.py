@@ -2,8 +2,8 @@ import flask
 from flask import request, jsonify
 import os
 from werkzeug.utils import secure_filename
-from controller.file_service import mark_files_updated
-from controller.schedule_service import get_user_courses, add_user_course
+from controller.file_service import mark_files_updated, users_collection
+from controller.schedule_service import get_user_courses, add_user_course, precompute_schedule
 
 # Blueprint for file routes
 file_bp = flask.Blueprint('file', __name__)
@@ -77,6 +77,13 @@ async def upload_pdf():
             else:
                 return jsonify({"error": f"Invalid file type for {item}"}), 400
         
+        # Generate the schedule in the background once both files are there
+        if username != "anonymous":
+            try:
+                precompute_schedule(username, course_id)
+            except Exception as e:
+                print(f"Error queueing schedule precomputation: {str(e)}")
+        
         return jsonify({"message": "File uploaded successfully"}), 200
     except Exception as e:
         print(f"Error saving file: {str(e)}")
@@ -97,21 +104,6 @@ def get_upload_file():
     if not username:
         return jsonify({"error": "Username is required"}), 400
     
-    # MongoDB Connection
-    from pymongo import MongoClient
-    import os
-    from dotenv import load_dotenv
-    
-    # Load environment variables
-    load_dotenv()
-    
-    # MongoDB Connection
-    mongo_uri = os.getenv("MONGO_URI")
-    client = MongoClient(mongo_uri)
-    db = client.buffer_size_db
-    users_collection = db.users
-    courses_collection = db.courses
-    
     # If course_id is provided, check files for that specific course
     if course_id:
         # Query based on username and course_id
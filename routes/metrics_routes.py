@@ -0,0 +1,14 @@
+import flask
+from util.metrics import render_prometheus
+
+# Blueprint for metrics routes
+metrics_bp = flask.Blueprint('metrics', __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Expose LLM usage and latency metrics in the Prometheus text format
+
+    Returns:
+        Plain text response with counters and histograms of this worker process
+    """
+    return flask.Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -1,6 +1,7 @@
 import flask
 from flask import request, jsonify
 import controller.review_service as review_service
+from util.deadline import DeadlineExceeded, RequestCancelled, run_request
 
 # Blueprint for review routes
 review_bp = flask.Blueprint('review', __name__)
@@ -77,13 +78,22 @@ async def start_review_session():
         session_id = await review_service.start_session(username, course_id, topic)
         
         # Generate the initial question
-        question_response = await review_service.generate_initial_question(session_id)
+        question_response = await run_request(
+            lambda deadline: review_service.generate_initial_question(session_id, deadline=deadline),
+            request.environ
+        )
         
         return jsonify({
             "session_id": session_id,
             "topic": topic,
             "initial_question": question_response
         }), 200
+    except DeadlineExceeded as e:
+        print(f"Starting review session timed out: {str(e)}")
+        return jsonify({"error": f"Starting review session timed out: {str(e)}"}), 504
+    except RequestCancelled as e:
+        print(f"Starting review session cancelled: {str(e)}")
+        return jsonify({"error": str(e)}), 499
     except Exception as e:
         print(f"Error starting review session: {str(e)}")
         import traceback
@@ -123,9 +133,18 @@ async def submit_explanation(session_id):
         print(f"POST /review/session/{session_id}/explain - username: {username}")
         
         # Process the user's explanation
-        response = await review_service.review_user_explanation(session_id, explanation)
+        response = await run_request(
+            lambda deadline: review_service.review_user_explanation(session_id, explanation, deadline=deadline),
+            request.environ
+        )
         
         return jsonify(response), 200
+    except DeadlineExceeded as e:
+        print(f"Processing explanation timed out: {str(e)}")
+        return jsonify({"error": f"Processing explanation timed out: {str(e)}"}), 504
+    except RequestCancelled as e:
+        print(f"Processing explanation cancelled: {str(e)}")
+        return jsonify({"error": str(e)}), 499
     except Exception as e:
         print(f"Error processing explanation: {str(e)}")
         import traceback
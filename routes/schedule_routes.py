@@ -1,8 +1,20 @@
+import os
+import time
 import flask
 from flask import request, jsonify
 import asyncio
-import json
-from controller.schedule_service import run_schedule_analysis, get_user_courses, add_user_course, delete_user_course
+import contextlib
+from controller.schedule_service import get_schedule_courses, merge_course_schedules, run_course_schedules, run_deterministic_schedule, run_schedule_analysis_coalesced, submit_schedule_job, get_user_courses, add_user_course, delete_user_course, get_user_preferences, set_user_preferences
+from controller.job_service import FINAL_STATES, JOB_POLL_SECONDS, get_job, job_status, wait_for_job, wait_for_jobs
+from util.deadline import DeadlineExceeded, RequestCancelled, run_request
+from util.http_json import json_response, sse_event
+
+# Generate schedules within the GET /schedule request instead of as jobs
+SCHEDULE_SYNC = os.getenv("SCHEDULE_SYNC", "false").lower() == "true"
+# Seconds between keep-alive comments on idle job event streams, so proxies keep them open
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+# Seconds a job event stream stays open before the client has to reconnect
+JOB_EVENTS_TIMEOUT_SECONDS = 15 * 60
 
 # Blueprint for schedule routes
 schedule_bp = flask.Blueprint('schedule', __name__)
@@ -11,13 +23,21 @@ schedule_bp = flask.Blueprint('schedule', __name__)
 async def get_schedule():
     """Get the study schedule for a course
     
+    Unless sync is set, the schedule is generated by a job worker: the response
+    is 202 Accepted with the job to poll at GET /schedule/jobs/{job_id} or
+    follow at GET /schedule/jobs/{job_id}/events.
+
     Query parameters:
         make_schedule (bool): Whether to generate Google Calendar events
         force_refresh (bool): Force regeneration of analysis
         course_id (str): Course ID for specific course data
+        sync (bool): Generate the schedule within this request, the default when SCHEDULE_SYNC is set
+        mode (str): "llm" (default) for the plan agents, or "deterministic" to compute the
+            plan from the syllabus task estimates within this request, in milliseconds
+            once the syllabus is analyzed
         
     Returns:
-        JSON response with the generated schedule
+        JSON response with the generated schedule, or with the job generating it
     """
     try:
         # Get user information from headers
@@ -30,28 +50,250 @@ async def get_schedule():
         force_refresh = request.args.get('force_refresh', 'false').lower() == 'true'
         course_id = request.args.get('course_id')
         
-        print(f"GET /schedule - username: {username}, course_id: {course_id}, make_schedule: {make_schedule}, force_refresh: {force_refresh}")
+        sync = request.args.get('sync', str(SCHEDULE_SYNC)).lower() == 'true'
+        mode = request.args.get('mode', 'llm').lower()
+        if mode not in ('llm', 'deterministic'):
+            return jsonify({"error": f"Unknown schedule mode {mode}, expected llm or deterministic"}), 400
+        
+        print(f"GET /schedule - username: {username}, course_id: {course_id}, make_schedule: {make_schedule}, force_refresh: {force_refresh}, sync: {sync}, mode: {mode}")
+        
+        if mode == 'deterministic':
+            # No plan agents involved, so there is nothing to queue
+            schedule_data = await run_request(
+                lambda deadline: run_deterministic_schedule(
+                    make_schedule=make_schedule,
+                    username=username,
+                    course_id=course_id,
+                    deadline=deadline
+                ),
+                request.environ
+            )
+            return json_response(schedule_data, 200)
+        
+        if not sync:
+            job = submit_schedule_job(
+                make_schedule=make_schedule,
+                username=username,
+                force_refresh=force_refresh,
+                course_id=course_id
+            )
+            response = json_response({
+                "job_id": job["_id"],
+                "state": job["state"],
+                "status_url": f"/schedule/jobs/{job['_id']}",
+                "events_url": f"/schedule/jobs/{job['_id']}/events",
+            }, 202)
+            response.headers["Location"] = f"/schedule/jobs/{job['_id']}"
+            return response
         
-        # Run schedule analysis
-        schedule_data = await run_schedule_analysis(
-            make_schedule=make_schedule,
-            username=username,
-            force_refresh=force_refresh,
-            course_id=course_id
+        # Run schedule analysis, sharing the result with identical requests in flight.
+        # The LLM calls are cancelled on timeout or when the client disconnects.
+        schedule_data = await run_request(
+            lambda deadline: run_schedule_analysis_coalesced(
+                make_schedule=make_schedule,
+                username=username,
+                force_refresh=force_refresh,
+                course_id=course_id,
+                deadline=deadline
+            ),
+            request.environ
         )
         
-        # Try to parse schedule_data as JSON
-        try:
-            schedule_json = json.loads(schedule_data)
-            return jsonify(schedule_json), 200
-        except json.JSONDecodeError:
-            return jsonify({"schedule": schedule_data}), 200
+        # The schedule is serialized once, here
+        return json_response(schedule_data, 200)
+    except DeadlineExceeded as e:
+        print(f"Schedule generation timed out: {str(e)}")
+        return jsonify({"error": f"Schedule generation timed out: {str(e)}"}), 504
+    except RequestCancelled as e:
+        print(f"Schedule generation cancelled: {str(e)}")
+        return jsonify({"error": str(e)}), 499
     except Exception as e:
         print(f"Error generating schedule: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"Failed to generate schedule: {str(e)}"}), 500
 
+@schedule_bp.route("/schedule/jobs/<job_id>", methods=["GET"])
+def get_schedule_job(job_id):
+    """Get the state of a schedule job, with the schedule once it is done
+    
+    Returns:
+        JSON response with the job state, stage history and result or error
+    """
+    try:
+        username = request.headers.get('x-application-username')
+        job = get_job(job_id, username)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return json_response(job_status(job), 200)
+    except Exception as e:
+        print(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({"error": f"Failed to get job: {str(e)}"}), 500
+
+@schedule_bp.route("/schedule/jobs/<job_id>/events", methods=["GET"])
+def get_schedule_job_events(job_id):
+    """Follow a schedule job as server-sent events
+    
+    Sends a "progress" event with the job state whenever it enters a stage,
+    then a "done" or "failed" event with the result or error and closes.
+    
+    Returns:
+        text/event-stream response
+    """
+    username = request.headers.get('x-application-username')
+    if get_job(job_id, username) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        last_sent = time.monotonic()
+        for job in wait_for_job(job_id, username, JOB_POLL_SECONDS, JOB_EVENTS_TIMEOUT_SECONDS):
+            if job is None:
+                if time.monotonic() - last_sent >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            status = job_status(job)
+            last_sent = time.monotonic()
+            yield sse_event(status["state"] if status["state"] in FINAL_STATES else "progress", status)
+
+    response = flask.Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@schedule_bp.route("/schedule/all", methods=["GET"])
+async def get_all_schedules():
+    """Get the study schedules of all of the user's courses, merged into one plan
+    
+    The courses are generated or fetched concurrently. Unless sync is set, the
+    response is a text/event-stream: a "course" event with each course's
+    schedule or error as soon as it is ready, then a "merged" event with the
+    plan of all courses, leveled so that at most max_starts_per_day
+    assignments start on one day where their due dates allow it.
+    
+    Query parameters:
+        course_id (str, repeated): Courses to schedule, all of the user's by default
+        force_refresh (bool): Force regeneration of analysis
+        sync (bool): Generate the schedules within this request and answer with one JSON
+            object, the default when SCHEDULE_SYNC is set
+    
+    Returns:
+        Event stream of course and merged events, or JSON response with
+        "courses" (the schedule of each course by course ID) and "merged"
+    """
+    try:
+        username = request.headers.get('x-application-username')
+        if not username:
+            return jsonify({"error": "Username is required"}), 400
+        
+        force_refresh = request.args.get('force_refresh', 'false').lower() == 'true'
+        sync = request.args.get('sync', str(SCHEDULE_SYNC)).lower() == 'true'
+        courses = get_schedule_courses(username, request.args.getlist('course_id'))
+        
+        print(f"GET /schedule/all - username: {username}, courses: {[c['course_id'] for c in courses]}, force_refresh: {force_refresh}, sync: {sync}")
+        
+        if not courses:
+            return jsonify({"error": "No courses to schedule"}), 404
+        
+        if sync:
+            async def run_all(deadline):
+                # Closed on the way out, so a failure cancels the courses still running
+                async with contextlib.aclosing(run_course_schedules(username, courses, force_refresh, deadline)) as results:
+                    return [result async for result in results]
+            
+            results = await run_request(run_all, request.environ)
+            schedules = {course["course_id"]: schedule for course, schedule in results}
+            merged = merge_course_schedules(username, courses, schedules)
+            return json_response({"courses": schedules, "merged": merged}, 200)
+        
+        # Every course is a schedule job, run concurrently by the job workers
+        jobs = {}
+        for course in courses:
+            job = submit_schedule_job(username=username, force_refresh=force_refresh, course_id=course["course_id"])
+            jobs[job["_id"]] = course
+    except DeadlineExceeded as e:
+        print(f"Schedule generation timed out: {str(e)}")
+        return jsonify({"error": f"Schedule generation timed out: {str(e)}"}), 504
+    except RequestCancelled as e:
+        print(f"Schedule generation cancelled: {str(e)}")
+        return jsonify({"error": str(e)}), 499
+    except Exception as e:
+        print(f"Error generating schedules: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to generate schedules: {str(e)}"}), 500
+    
+    def events():
+        schedules = {}
+        last_sent = time.monotonic()
+        for job in wait_for_jobs(list(jobs), username, JOB_POLL_SECONDS, JOB_EVENTS_TIMEOUT_SECONDS):
+            if job is None:
+                if time.monotonic() - last_sent >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            course = jobs[job["_id"]]
+            schedule = job.get("result") if job.get("state") == "done" else {"error": job.get("error")}
+            schedules[course["course_id"]] = schedule
+            last_sent = time.monotonic()
+            yield sse_event("course", dict(course, job_id=job["_id"], schedule=schedule))
+        yield sse_event("merged", merge_course_schedules(username, courses, schedules))
+    
+    response = flask.Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@schedule_bp.route("/schedule/preferences", methods=["GET"])
+def get_schedule_preferences():
+    """Get the schedule preferences of the authenticated user
+    
+    Returns:
+        JSON response with lead_days and max_starts_per_day
+    """
+    try:
+        username = request.headers.get('x-application-username')
+        if not username:
+            return jsonify({"error": "Username is required"}), 400
+        return jsonify({"preferences": get_user_preferences(username)}), 200
+    except Exception as e:
+        print(f"Error getting preferences: {str(e)}")
+        return jsonify({"error": f"Failed to get preferences: {str(e)}"}), 500
+
+@schedule_bp.route("/schedule/preferences", methods=["PUT"])
+def update_schedule_preferences():
+    """Update the schedule preferences of the authenticated user
+    
+    Schedules are the course plan template adjusted to these preferences, so
+    the next GET /schedule applies them without generating a new plan.
+    
+    Request body may contain:
+    - lead_days: Days to start an assignment before it is due
+    - max_starts_per_day: Most assignments to start on one day, null for no limit
+    
+    Returns:
+        JSON response with all preferences of the user
+    """
+    try:
+        username = request.headers.get('x-application-username')
+        if not username:
+            return jsonify({"error": "Username is required"}), 400
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "A JSON object of preferences is required"}), 400
+        
+        try:
+            preferences = set_user_preferences(username, data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"preferences": preferences}), 200
+    except Exception as e:
+        print(f"Error updating preferences: {str(e)}")
+        return jsonify({"error": f"Failed to update preferences: {str(e)}"}), 500
+
 @schedule_bp.route("/courses", methods=["GET"])
 def get_courses():
     """Get all courses for the authenticated user
@@ -162,5 +404,7 @@ def delete_course(course_name):
 @schedule_bp.route("/courses", methods=["OPTIONS"])
 @schedule_bp.route("/courses/<course_name>", methods=["OPTIONS"])
 @schedule_bp.route("/schedule", methods=["OPTIONS"])
+@schedule_bp.route("/schedule/all", methods=["OPTIONS"])
+@schedule_bp.route("/schedule/preferences", methods=["OPTIONS"])
 def handle_options(course_name=None):
     return "", 204
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import unittest
+
+from util.json_repair import repair_json
+from util.json_stream import JsonStreamParser, iter_json_items
+
+PLAN = ('```json\n[{"date": "9.1", "dues": [], "start": ["HW1"]},\n'
+        '{"date": "9.5", "dues": ["Quiz"], "start": [],},\n'
+        '{"date": "9.8", "dues": ["HW1"], "start": []}]\n```')
+
+
+class ChunkStream:
+    """Async stream of text chunks that records whether it was read to the end or closed"""
+
+    def __init__(self, text, size=7):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.read = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read == len(self.chunks):
+            raise StopAsyncIteration
+        self.read += 1
+        return self.chunks[self.read - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+async def collect(stream, parser):
+    return [item async for item in iter_json_items(stream, parser)]
+
+
+class JsonStreamParserTest(unittest.TestCase):
+    def test_valid_array_yields_every_element(self):
+        parser = JsonStreamParser()
+        items = asyncio.run(collect(ChunkStream(PLAN.replace("[],}", "[]}")), parser))
+        self.assertEqual([day["date"] for day in items], ["9.1", "9.5", "9.8"])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.value, items)
+
+    def test_malformed_middle_day_keeps_reading(self):
+        parser = JsonStreamParser()
+        stream = ChunkStream(PLAN)
+        items = asyncio.run(collect(stream, parser))
+
+        self.assertEqual([day["date"] for day in items], ["9.1", "9.8"])
+        # The malformed day, then the top-level array holding it
+        self.assertEqual(len(parser.errors), 2)
+        self.assertTrue(parser.closed)
+        self.assertFalse(parser.done)
+        self.assertIsNone(parser.value)
+        # The whole plan was read, so repairing the text recovers every day
+        self.assertIn('"9.8"', parser.text)
+        self.assertEqual(len(json.loads(repair_json(parser.text))), 3)
+
+    def test_days_completed_with_a_malformed_one_in_the_same_chunk_are_kept(self):
+        parser = JsonStreamParser()
+        items = parser.feed(PLAN)
+        self.assertEqual([day["date"] for day in items], ["9.1", "9.8"])
+
+    def test_stream_is_closed_once_the_array_closes(self):
+        stream = ChunkStream(PLAN.replace("[],}", "[]}") + "\nMore text the model kept writing.", size=5)
+        asyncio.run(collect(stream, JsonStreamParser()))
+        self.assertTrue(stream.closed)
+        self.assertLess(stream.read, len(stream.chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from autogen_core.models import AssistantMessage, SystemMessage, UserMessage
+
+from model import memory
+from model.memory import MemoryPolicy, SummarizingChatCompletionContext
+
+
+async def fake_summary(summary, messages, model):
+    return " ".join(filter(None, [summary] + [m.content for m in messages if isinstance(m, UserMessage)]))
+
+
+class SummarizingContextTest(unittest.TestCase):
+
+    def wait_for_summaries(self, context):
+        for _ in range(100):
+            with context._lock:
+                if not context._summarizing:
+                    return
+            time.sleep(0.01)
+        self.fail("summary did not finish")
+
+    def test_turns_leaving_the_window_are_summarized(self):
+        context = SummarizingChatCompletionContext(MemoryPolicy(window_turns=2))
+
+        async def converse():
+            for i in range(5):
+                await context.add_message(UserMessage(content=f"turn {i}", source="user"))
+                await context.add_message(AssistantMessage(content=f"reply {i}", source="assistant"))
+                self.wait_for_summaries(context)
+            return await context.get_messages()
+
+        with mock.patch.object(memory, "summarize_conversation", fake_summary):
+            messages = asyncio.run(converse())
+
+        self.assertIsInstance(messages[0], SystemMessage)
+        self.assertIn("turn 0 turn 1 turn 2", messages[0].content)
+        self.assertEqual([m.content for m in messages[1:]], ["turn 3", "reply 3", "turn 4", "reply 4"])
+        self.assertEqual(len(context._messages), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+import unittest
+
+from util.plan_merge import merge_course_plans
+
+
+class MergeCoursePlansTest(unittest.TestCase):
+
+    def test_courses_with_the_same_name_are_both_kept(self):
+        plan = [{"date": "9.3", "dues": [], "start": ["HW 1"]}, {"date": "9.8", "dues": ["HW 1"], "start": []}]
+        merged = merge_course_plans({"15-213": plan, "18-213": plan, "15-440": plan}, 1,
+                                    {"15-213": "Systems", "18-213": "Systems", "15-440": "Distributed"})
+        dues = [due for day in merged["plan"] for due in day["dues"]]
+        self.assertEqual(sorted(dues), ["HW 1 (Distributed)", "HW 1 (Systems, 15-213)", "HW 1 (Systems, 18-213)"])
+        starts = [start for day in merged["plan"] for start in day["start"]]
+        self.assertEqual(len(starts), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import json
+import unittest
+
+from util.json_repair import repair_json
+from util.text_extractor import find_json_payload
+
+
+class FindJsonPayloadTest(unittest.TestCase):
+
+    def test_json_in_prose_and_fence(self):
+        text = 'Here is the plan:\n```json\n[{"date": "9.1", "dues": [], "start": []}]\n```\nGood luck [!]'
+        value, payload = find_json_payload(text)
+        self.assertEqual(value, [{"date": "9.1", "dues": [], "start": []}])
+        self.assertEqual(json.loads(payload), value)
+
+    def test_malformed_outer_object_is_not_shortened(self):
+        text = ('{"tasks": {"hw1": {"difficulty": "Hard", "day_needed": [2, 5]}}, '
+                '"contains_schedule": true,}')
+        # The inner {"hw1": ...} decodes, but it is a fragment of the analysis
+        self.assertEqual(find_json_payload(text), (None, None))
+        self.assertEqual(json.loads(repair_json(text)), {
+            "tasks": {"hw1": {"difficulty": "Hard", "day_needed": [2, 5]}}, "contains_schedule": True})
+
+    def test_malformed_outer_array_is_not_shortened(self):
+        text = '[{"date": "9.1", "dues": [], "start": []}, {"date": "9.2", "dues": [], "start": []},]'
+        self.assertEqual(find_json_payload(text), (None, None))
+        self.assertEqual(len(json.loads(repair_json(text))), 2)
+
+    def test_no_json(self):
+        self.assertEqual(find_json_payload("No plan today."), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Content-addressed cache keys.
+
+A cached artifact (a syllabus analysis, a study plan) is valid exactly as long
+as everything it was generated from is unchanged: the uploaded files, the
+prompt versions and the models. cache_key() hashes all of them into one key,
+so a lookup is a single indexed read and a new prompt or model misses only the
+entries generated with the old one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+_BLOCK_SIZE = 1 << 20
+
+# Digests of files by path, with the (mtime, size) they were computed for
+_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_digests_lock = threading.Lock()
+
+
+def cache_key(kind: str, **inputs) -> str:
+    """Key of an artifact of a kind generated from inputs
+
+    Args:
+        kind: Kind of artifact, e.g. "syllabus_analysis"
+        **inputs: JSON-compatible values the artifact depends on
+
+    Returns:
+        str: "kind:sha256", the same for the same inputs in any order
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file's content, recomputed only when the file changes
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        str: Hex digest, None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    with _digests_lock:
+        _digests[path] = (version, digest.hexdigest())
+    return digest.hexdigest()
@@ -0,0 +1,150 @@
+"""
+Deliverables of a course calendar and what changed between two uploads.
+
+extract_deliverables() reads every calendar line carrying a date ("9/15",
+"9.15" or "Sep 15") as a deliverable. diff_deliverables() compares the
+deliverables of a re-uploaded calendar with the ones the stored plan was made
+from, and affected_windows() turns the changed dates into the date ranges of
+the plan that have to be generated again. The rest of the plan is kept.
+"""
+
+import datetime
+import re
+from typing import Dict, List, Optional, Tuple
+
+from util.plan_validator import format_plan_date, parse_plan_date
+
+_MONTHS = {name: i + 1 for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+
+_NUMERIC_DATE = re.compile(r"(?<![\d.])(\d{1,2})\s*[./]\s*(\d{1,2})(?:[./]\d{2,4})?(?![\d.])(?!\s*(?:%|pts?\b|points?\b))",
+                           re.IGNORECASE)
+_NAMED_DATE = re.compile(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b",
+                         re.IGNORECASE)
+_SEPARATORS = re.compile(r"^[\s|:,;\-–]+|[\s|:,;\-–]+$")
+_EMPTY_CELLS = re.compile(r"\|(\s*\|)+")
+_SPACES = re.compile(r"\s+")
+
+Window = Tuple[datetime.date, datetime.date]
+
+
+def _line_deliverable(line: str) -> Optional[dict]:
+    for pattern in (_NUMERIC_DATE, _NAMED_DATE):
+        match = pattern.search(line)
+        if not match:
+            continue
+        month = _MONTHS[match.group(1)[:3].lower()] if pattern is _NAMED_DATE else int(match.group(1))
+        date = parse_plan_date(f"{month}.{int(match.group(2))}")
+        if date is None:
+            continue
+        text = _SPACES.sub(" ", line[:match.start()] + " " + line[match.end():])
+        text = _SEPARATORS.sub("", _EMPTY_CELLS.sub("|", text))
+        if text:
+            return {"date": format_plan_date(date), "text": text}
+    return None
+
+
+def extract_deliverables(pages) -> List[dict]:
+    """Read the dated lines of a calendar
+
+    Args:
+        pages: Calendar text by page number, as extracted from the PDF
+
+    Returns:
+        list: {"date": "m.d", "text"} deliverables in calendar order, without duplicates
+    """
+    if not isinstance(pages, dict):
+        return []
+    deliverables = []
+    seen = set()
+    for number in sorted(pages, key=lambda k: int(k) if str(k).isdigit() else 0):
+        text = pages[number]
+        if not isinstance(text, str):
+            continue
+        for line in text.splitlines():
+            deliverable = _line_deliverable(line)
+            if deliverable is None:
+                continue
+            key = _key(deliverable)
+            if key not in seen:
+                seen.add(key)
+                deliverables.append(deliverable)
+    return deliverables
+
+
+def _key(deliverable: dict) -> Tuple[str, str]:
+    return deliverable["date"], deliverable["text"].lower()
+
+
+class CalendarDiff:
+    """Deliverables added and removed by a calendar re-upload
+
+    A deliverable whose date or text changed is both removed and added.
+
+    Attributes:
+        added: Deliverables only in the new calendar
+        removed: Deliverables only in the old calendar
+        total: Deliverables in the larger of the two calendars
+    """
+
+    def __init__(self, added: List[dict], removed: List[dict], total: int):
+        self.added = added
+        self.removed = removed
+        self.total = total
+
+    @property
+    def changed(self) -> List[dict]:
+        return self.removed + self.added
+
+    @property
+    def change_ratio(self) -> float:
+        """Changed deliverables per deliverable, 1.0 when both calendars are empty"""
+        return len(self.changed) / self.total if self.total else 1.0
+
+    def changed_dates(self, first: Optional[datetime.date] = None) -> List[datetime.date]:
+        """Dates of the changed deliverables, placed after first like plan dates"""
+        return sorted({parse_plan_date(d["date"], first) for d in self.changed})
+
+
+def diff_deliverables(old: List[dict], new: List[dict]) -> CalendarDiff:
+    """Compare the deliverables of two calendars, ignoring order and case"""
+    old_keys = {_key(d) for d in old}
+    new_keys = {_key(d) for d in new}
+    return CalendarDiff(
+        added=[d for d in new if _key(d) not in old_keys],
+        removed=[d for d in old if _key(d) not in new_keys],
+        total=max(len(old), len(new)),
+    )
+
+
+def affected_windows(dates: List[datetime.date], lookback_days: int) -> List[Window]:
+    """Date ranges of the plan affected by deliverables changed on dates
+
+    Work on a deliverable is planned up to lookback_days before it, so the
+    window of each date starts that many days earlier. Overlapping windows
+    are merged.
+
+    Args:
+        dates: Dates of the changed deliverables
+        lookback_days: Days before a deliverable its work may be planned
+
+    Returns:
+        list: Sorted, disjoint (first, last) date ranges, both ends included
+    """
+    windows: List[Window] = []
+    for date in sorted(dates):
+        start = date - datetime.timedelta(days=lookback_days)
+        if windows and start <= windows[-1][1] + datetime.timedelta(days=1):
+            windows[-1] = (windows[-1][0], max(windows[-1][1], date))
+        else:
+            windows.append((start, date))
+    return windows
+
+
+def in_windows(date: Optional[datetime.date], windows: List[Window]) -> bool:
+    return date is not None and any(first <= date <= last for first, last in windows)
+
+
+def describe_windows(windows: List[Window]) -> List[Dict[str, str]]:
+    """Windows as {"from", "to"} "m.d" dates, for a prompt"""
+    return [{"from": format_plan_date(first), "to": format_plan_date(last)} for first, last in windows]
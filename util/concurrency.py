@@ -0,0 +1,103 @@
+"""
+Concurrency and rate limits shared by every event loop of the process.
+
+Flask serves each async view on its own event loop, so asyncio.Semaphore cannot
+bound work across requests. ConcurrencyLimiter hands slots over between loops
+with call_soon_threadsafe, and a caller cancelled while waiting or working gives
+its slot back at once. RateLimiter spaces calls out evenly, reserving each
+caller's turn under a thread lock so that it holds across loops too.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+from typing import Deque, Tuple
+
+
+class ConcurrencyLimiter:
+    """Bounds how many callers hold a slot at once, across threads and event loops
+
+    Args:
+        limit: Number of slots, 0 or less for no limit
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = collections.deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.limit <= 0 or self.active < self.limit:
+                self.active += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed to us while we were being cancelled, pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    # The slot moves to the waiter, active stays the same
+                    loop.call_soon_threadsafe(_grant, future)
+                    return
+                except RuntimeError:
+                    # The waiter's loop is gone
+                    continue
+            self.active -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def _grant(future: asyncio.Future):
+    # A waiter cancelled after being dequeued releases the slot itself
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Lets at most per_minute callers through per minute, evenly spaced
+
+    Args:
+        per_minute: Calls per minute, 0 or less for no limit
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        """Wait for the caller's turn"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            turn = max(now, self._next)
+            self._next = turn + self.interval
+        if turn > now:
+            await asyncio.sleep(turn - now)
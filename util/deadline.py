@@ -0,0 +1,212 @@
+"""
+Request deadlines and cancellation.
+
+A Deadline is created per HTTP request (or review turn) and passed down to every
+agent call it makes. It is cancelled when the request times out, the client
+disconnects or its review session ends, and then cancels whatever LLM call is
+in flight instead of letting it run to completion.
+
+Flask serves every async view on its own event loop, and a Deadline may be
+cancelled from another request's thread (e.g. stop_session), so cancellation is
+always handed to the owning loop with call_soon_threadsafe.
+"""
+
+import asyncio
+import contextlib
+import os
+import socket
+import threading
+import time
+from typing import Awaitable, Callable, Iterator, List, Optional
+
+from autogen_core import CancellationToken
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work runs past its deadline"""
+
+
+class RequestCancelled(Exception):
+    """Raised when work is cancelled before its deadline, e.g. on client disconnect"""
+
+
+class Deadline:
+    """Deadline and cancellation signal shared by all the work of one request
+
+    Args:
+        timeout: Seconds from now until the deadline, None for no time limit
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @classmethod
+    def from_env(cls, default: float = 300):
+        """Deadline of REQUEST_TIMEOUT_SECONDS from now"""
+        return cls(float(os.getenv("REQUEST_TIMEOUT_SECONDS", str(default))))
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, None if there is no time limit"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel all work running under this deadline, from any thread"""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def check(self):
+        """Raise if the work should not start or continue"""
+        if self.cancelled:
+            raise RequestCancelled(f"Request cancelled: {self.reason}")
+        if self.expired:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def _on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Register a callback run on cancellation, returning a function unregistering it"""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @contextlib.contextmanager
+    def token(self) -> Iterator[CancellationToken]:
+        """CancellationToken for an autogen call on the running loop, cancelled with this deadline
+
+        Use it as a context manager around the call: on exit the token is
+        detached from the deadline and its timer is cancelled, so a long-lived
+        deadline does not keep the tokens of finished calls.
+        """
+        loop = asyncio.get_running_loop()
+        token = CancellationToken()
+        unregister = self._on_cancel(lambda: _call_soon(loop, token.cancel))
+        remaining = self.remaining()
+        timer = loop.call_later(remaining, token.cancel) if remaining is not None else None
+        try:
+            yield token
+        finally:
+            unregister()
+            if timer is not None:
+                timer.cancel()
+
+    async def run(self, coro):
+        """Await a coroutine, cancelling it when this deadline passes or is cancelled
+
+        Args:
+            coro: The coroutine to run
+
+        Returns:
+            The result of the coroutine
+
+        Raises:
+            DeadlineExceeded: If the deadline passed first
+            RequestCancelled: If the deadline was cancelled first
+        """
+        try:
+            self.check()
+        except Exception:
+            coro.close()
+            raise
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(coro)
+        unregister = self._on_cancel(lambda: _call_soon(loop, task.cancel))
+        try:
+            return await asyncio.wait_for(task, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        except asyncio.CancelledError:
+            if self.cancelled:
+                raise RequestCancelled(f"Request cancelled: {self.reason}") from None
+            if self.expired:
+                # A token() of this deadline timed out the call first
+                raise DeadlineExceeded("Request deadline exceeded") from None
+            raise
+        finally:
+            unregister()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # The loop already finished, nothing left to cancel on it
+        pass
+
+
+def _client_socket(environ: dict) -> Optional[socket.socket]:
+    # Exposed by the Werkzeug development server and by gunicorn workers
+    return environ.get("werkzeug.socket") or environ.get("gunicorn.socket")
+
+
+async def watch_disconnect(deadline: Deadline, environ: dict, interval: float = 0.5):
+    """Cancel a deadline once the client of a request closes its connection
+
+    Only works on servers exposing the client socket in the WSGI environ;
+    elsewhere it returns immediately and only the timeout applies.
+
+    Args:
+        deadline: Deadline of the request
+        environ: WSGI environ of the request
+        interval: Seconds between checks
+    """
+    sock = _client_socket(environ)
+    flags = socket.MSG_PEEK | getattr(socket, "MSG_DONTWAIT", 0)
+    if sock is None or not getattr(socket, "MSG_DONTWAIT", 0):
+        return
+
+    while not deadline.cancelled:
+        await asyncio.sleep(interval)
+        try:
+            # An orderly shutdown reads as zero bytes; pipelined data means still connected
+            if sock.recv(1, flags) == b"":
+                deadline.cancel("client disconnected")
+        except BlockingIOError:
+            pass
+        except OSError:
+            deadline.cancel("client disconnected")
+
+
+async def run_request(fn: Callable[[Deadline], Awaitable], environ: dict, timeout: Optional[float] = None):
+    """Run the work of an HTTP request under its own deadline
+
+    The deadline is cancelled when it passes or when the client disconnects.
+
+    Args:
+        fn: Coroutine function taking the Deadline and doing the work
+        environ: WSGI environ of the request
+        timeout: Seconds allowed, defaults to REQUEST_TIMEOUT_SECONDS
+
+    Returns:
+        The result of fn
+    """
+    deadline = Deadline(timeout) if timeout else Deadline.from_env()
+    watcher = asyncio.create_task(watch_disconnect(deadline, environ))
+    try:
+        return await deadline.run(fn(deadline))
+    finally:
+        watcher.cancel()
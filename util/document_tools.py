@@ -0,0 +1,83 @@
+"""
+Retrieval tools giving an agent lazy access to an extracted document.
+
+Instead of pasting a whole syllabus into the prompt, the agent gets list_pages,
+get_page and find, and fetches only the pages it needs.
+"""
+
+import re
+from typing import Any, Callable, Dict, List
+
+# Characters of context shown around each find() match
+SNIPPET_RADIUS = 120
+# Matches returned by a single find() call
+MAX_MATCHES = 20
+
+
+class PagedDocument:
+    """Extracted text of a document, page by page
+
+    Args:
+        pages: Page text by page number, as returned by file_parser.extract_text_from_pdf
+    """
+
+    def __init__(self, pages: Dict[Any, str]):
+        # Page numbers come back as strings once the text went through JSON
+        self.pages = {int(n): text or "" for n, text in pages.items()}
+
+    def __len__(self):
+        return len(self.pages)
+
+    def list_pages(self) -> List[dict]:
+        """Page numbers with their first line and length"""
+        outline = []
+        for n in sorted(self.pages):
+            text = self.pages[n].strip()
+            first_line = text.splitlines()[0][:80] if text else ""
+            outline.append({"page": n, "first_line": first_line, "chars": len(text)})
+        return outline
+
+    def get_page(self, n: int) -> str:
+        """Full text of a page"""
+        if n not in self.pages:
+            return f"Page {n} does not exist, pages are {min(self.pages)} to {max(self.pages)}"
+        return self.pages[n]
+
+    def find(self, term: str) -> List[dict]:
+        """Case-insensitive matches of a term, with the page and surrounding text of each"""
+        matches = []
+        pattern = re.compile(re.escape(term), re.IGNORECASE)
+        for n in sorted(self.pages):
+            text = self.pages[n]
+            for match in pattern.finditer(text):
+                start = max(0, match.start() - SNIPPET_RADIUS)
+                end = min(len(text), match.end() + SNIPPET_RADIUS)
+                matches.append({"page": n, "snippet": text[start:end]})
+                if len(matches) >= MAX_MATCHES:
+                    return matches
+        return matches
+
+
+def make_document_tools(document: PagedDocument) -> List[Callable]:
+    """Build the retrieval tools of a document, to pass to Agent as tools
+
+    Args:
+        document: The document the tools read from
+
+    Returns:
+        list: The list_pages, get_page and find tool functions
+    """
+
+    async def list_pages() -> List[dict]:
+        """List the pages of the syllabus with the first line and length of each. Start here."""
+        return document.list_pages()
+
+    async def get_page(n: int) -> str:
+        """Get the full text of page n of the syllabus."""
+        return document.get_page(n)
+
+    async def find(term: str) -> List[dict]:
+        """Search the syllabus for a term (case-insensitive). Returns the page and surrounding text of each match."""
+        return document.find(term)
+
+    return [list_pages, get_page, find]
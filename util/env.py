@@ -0,0 +1,22 @@
+import threading
+
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """Load the .env file into os.environ once per process
+
+    Every module used to call load_dotenv() at import time (and one route on
+    every request), re-reading and re-parsing the file each time. Call this
+    instead; only the first call touches the file.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
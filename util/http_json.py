@@ -0,0 +1,56 @@
+"""
+JSON responses serialized once, at the HTTP boundary.
+
+Services return native dicts and lists; routes turn them into a response with
+json_response(). orjson is used when installed, the standard library otherwise.
+"""
+
+import json
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """Serialize data to JSON bytes
+
+    Args:
+        data: JSON-compatible value; dict keys that are not strings and values
+            such as datetimes are converted to strings
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(data, status: int = 200) -> Response:
+    """Build a JSON response, serializing data exactly once
+
+    Args:
+        data: JSON-compatible value to send
+        status: HTTP status code
+
+    Returns:
+        Response: The response with an application/json body
+    """
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+
+def sse_event(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload
+
+    Args:
+        event: Event name
+        data: JSON-compatible payload
+
+    Returns:
+        str: The event, ready to write to a text/event-stream response
+    """
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
@@ -1,51 +1,83 @@
 import json
 import re
 from agent.json_agent import make_new_json_agent
+from util import metrics
+from util.json_repair import repair_json
 from util.text_extractor import json_extractor
 
+JSON_FIX_PATHS = metrics.counter(
+    "json_fix_total", "fix_json calls by the path that produced the result", ("path",))
 
-async def fix_json(json_str):
+
+async def fix_json(json_str, deadline=None):
     """
     Attempts to fix invalid JSON by:
     1. First trying to parse it directly
     2. If that fails, trying to use json_extractor to extract JSON from code blocks or text
     3. If that fails, trying to extract JSON using regex
-    4. If that fails, sending it to the json_agent for repair
-    
+    4. If that fails, repairing it locally with repair_json
+    5. If that fails, sending it to the json_agent for repair
+
     Args:
         json_str (str): The potentially invalid JSON string
-        
+        deadline (Deadline, optional): Deadline of the request, applied to the json_agent call
+
     Returns:
         dict or list: The parsed JSON object
     """
     # If it's already a dict or list, return it directly
     if isinstance(json_str, (dict, list)):
+        JSON_FIX_PATHS.inc(path="native")
         return json_str
-    
-    json_agent = make_new_json_agent()
+
+    if not isinstance(json_str, (str, bytes)):
+        JSON_FIX_PATHS.inc(path="failed")
+        raise ValueError(f"Could not parse or fix JSON: expected text, got {type(json_str).__name__}")
 
     # First try to parse directly
     try:
-        return json.loads(json_str)
+        result = json.loads(json_str)
+        JSON_FIX_PATHS.inc(path="direct")
+        return result
     except (json.JSONDecodeError, TypeError):
-        # Try to extract JSON using json_extractor
-        try:
-            return json_extractor(json_str)
-        except ValueError:
-            # Try to extract JSON using regex
-            try:
-                json_pattern = r'(\[.*\]|\{.*\})'
-                match = re.search(json_pattern, json_str, re.DOTALL)
-                if match:
-                    extracted_json = match.group(0)
-                    return json.loads(extracted_json)
-            except (json.JSONDecodeError, AttributeError, TypeError):
-                pass
-            
-            # If all else fails, use the json_agent to fix it
-            try:
-                fixed_json_str = await json_agent.send_message(json_str)
-                return json.loads(fixed_json_str)
-            except (json.JSONDecodeError, AttributeError, TypeError) as e:
-                # If even the json_agent can't fix it, raise the error
-                raise ValueError(f"Could not parse or fix JSON: {str(e)}")
+        pass
+
+    # Try to extract JSON using json_extractor
+    try:
+        result = json_extractor(json_str)
+        JSON_FIX_PATHS.inc(path="extracted")
+        return result
+    except (ValueError, TypeError):
+        pass
+
+    # Try to extract JSON using regex
+    try:
+        json_pattern = r'(\[.*\]|\{.*\})'
+        match = re.search(json_pattern, json_str, re.DOTALL)
+        # A match after the first bracket is a fragment of truncated JSON, leave that to the repair
+        if match and not re.search(r'[\[{]', json_str[:match.start()]):
+            result = json.loads(match.group(0))
+            JSON_FIX_PATHS.inc(path="extracted")
+            return result
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        pass
+
+    # Repair common model mistakes locally
+    try:
+        result = json.loads(repair_json(json_str))
+        JSON_FIX_PATHS.inc(path="repaired")
+        return result
+    except (json.JSONDecodeError, ValueError):
+        pass
+
+    # If all else fails, use the json_agent to fix it
+    try:
+        json_agent = make_new_json_agent()
+        fixed_json_str = await json_agent.send_message(json_str, deadline=deadline)
+        result = json.loads(fixed_json_str)
+        JSON_FIX_PATHS.inc(path="agent")
+        return result
+    except (json.JSONDecodeError, AttributeError, TypeError) as e:
+        # If even the json_agent can't fix it, raise the error
+        JSON_FIX_PATHS.inc(path="failed")
+        raise ValueError(f"Could not parse or fix JSON: {str(e)}")
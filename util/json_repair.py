@@ -0,0 +1,223 @@
+"""
+Tolerant local repair of malformed JSON written by LLMs.
+
+repair_json() rewrites the usual model mistakes into valid JSON without a
+model round trip:
+
+- code fences and prose around the JSON
+- trailing, doubled and missing commas
+- single-quoted strings and unescaped quotes inside strings
+- unquoted keys and bare word values
+- Python literals (True, False, None) and NaN/Infinity
+- // # and /* */ comments
+- raw newlines and tabs inside strings
+- output cut off mid-string or before the closing brackets
+
+It is deterministic: the same input always gives the same output.
+"""
+
+import json
+import re
+from typing import List
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*([\s\S]*?)(?:```|$)")
+_NUMBER = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_WORD = re.compile(r"[A-Za-z_$][\w$\-]*")
+_BARE_VALUE = re.compile(r"[^,}\]\n]*")
+# What may follow the comma after a value in an object: the next key, a closer or nothing
+_NEXT_KEY = re.compile(r"""\s*(?:$|[}\]]|"[^"\n]*"\s*:|'[^'\n]*'\s*:|[A-Za-z_$][\w$\-]*\s*:)""")
+
+LITERALS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "null", "Infinity": "null", "undefined": "null",
+}
+
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class _Repairer:
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.out: List[str] = []
+        # Closing brackets of the open containers
+        self.stack: List[str] = []
+
+    def run(self) -> str:
+        text = self.text
+        while self.pos < len(text):
+            c = text[self.pos]
+            if c.isspace():
+                self.pos += 1
+            elif c == "/" and text.startswith("//", self.pos) or c == "#":
+                end = text.find("\n", self.pos)
+                self.pos = len(text) if end == -1 else end
+            elif c == "/" and text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.pos = len(text) if end == -1 else end + 2
+            elif c in "{[":
+                self._value_start()
+                self.out.append(c)
+                self.stack.append("}" if c == "{" else "]")
+                self.pos += 1
+            elif c in "}]":
+                self.pos += 1
+                if c in self.stack:
+                    while self.stack[-1] != c:
+                        self._close()
+                    self._close()
+                    if not self.stack:
+                        break
+            elif c == ":":
+                if self.out and self.out[-1] not in "{[,:":
+                    self.out.append(":")
+                self.pos += 1
+            elif c == ",":
+                if self.out and self.out[-1] not in "{[,:":
+                    self.out.append(",")
+                self.pos += 1
+            elif c in "\"'":
+                self._value_start()
+                self.out.append(self._string(c))
+            elif c in "+-." or c.isdigit():
+                self._number()
+            elif c.isalpha() or c in "_$":
+                self._word()
+            else:
+                self.pos += 1
+
+        # Truncated output: drop what cannot be completed and close the rest
+        while self.stack:
+            self._close()
+        return "".join(self.out)
+
+    def _value_start(self):
+        """Insert the comma a model left out between two values"""
+        if self.stack and self.out and self.out[-1] not in "{[,:":
+            self.out.append(",")
+
+    def _close(self):
+        while self.out and self.out[-1] == ",":
+            self.out.pop()
+        if self.out and self.out[-1] == ":":
+            self.out.append("null")
+        elif self.stack[-1] == "}" and self.out and self.out[-1].startswith('"') and \
+                len(self.out) >= 2 and self.out[-2] in "{,":
+            # A key without a value
+            self.out.pop()
+            while self.out and self.out[-1] == ",":
+                self.out.pop()
+        self.out.append(self.stack.pop())
+
+    def _is_string_end(self, end: int) -> bool:
+        """Whether the quote at end closes the string or is a quote inside it"""
+        text = self.text
+        i = end + 1
+        newline = False
+        while i < len(text) and text[i].isspace():
+            newline = newline or text[i] == "\n"
+            i += 1
+        if i >= len(text) or newline or text[i] in ":}]/#":
+            return True
+        if text[i] != ",":
+            return False
+        # In an object, a comma only ends the value if the next key follows, e.g. not in
+        # "He said "stop", then left"
+        return not self.stack or self.stack[-1] != "}" or _NEXT_KEY.match(text, i + 1) is not None
+
+    def _string(self, quote: str) -> str:
+        text = self.text
+        chars = []
+        i = self.pos + 1
+        while i < len(text):
+            c = text[i]
+            if c == "\\" and i + 1 < len(text):
+                escaped = text[i + 1]
+                if escaped == "'":
+                    chars.append("'")
+                elif escaped in "\"\\/bfnrtu":
+                    chars.append(c + escaped)
+                else:
+                    chars.append("\\\\" + escaped)
+                i += 2
+                continue
+            if c == quote and self._is_string_end(i):
+                i += 1
+                break
+            if c == '"':
+                chars.append('\\"')
+            elif c in _STRING_ESCAPES:
+                chars.append(_STRING_ESCAPES[c])
+            elif c < " ":
+                chars.append(f"\\u{ord(c):04x}")
+            else:
+                chars.append(c)
+            i += 1
+        self.pos = i
+        return '"' + "".join(chars) + '"'
+
+    def _number(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if not match:
+            self.pos += 1
+            return
+        self.pos = match.end()
+        number = match.group(0).lstrip("+")
+        try:
+            value = float(number)
+        except ValueError:
+            return
+        self._value_start()
+        if re.fullmatch(r"-?\d+", number):
+            self.out.append(str(int(number)))
+        else:
+            self.out.append(json.dumps(value))
+
+    def _word(self):
+        text = self.text
+        match = _WORD.match(text, self.pos)
+        word = match.group(0)
+        after = match.end()
+        while after < len(text) and text[after] in " \t":
+            after += 1
+        self._value_start()
+        if self.stack and self.stack[-1] == "}" and text.startswith(":", after):
+            self.out.append(json.dumps(word))
+            self.pos = match.end()
+        elif word in LITERALS:
+            self.out.append(LITERALS[word])
+            self.pos = match.end()
+        else:
+            # Unquoted string value, up to the next separator
+            bare = _BARE_VALUE.match(text, self.pos)
+            self.out.append(json.dumps(bare.group(0).strip()))
+            self.pos = bare.end()
+
+
+def repair_json(text: str) -> str:
+    """Rewrite malformed JSON written by a model into valid JSON text
+
+    Args:
+        text: Model output containing a JSON object or array
+
+    Returns:
+        str: Compact JSON text of the first object or array in text
+
+    Raises:
+        ValueError: If text contains no object or array
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"Cannot repair JSON from {type(text).__name__}")
+
+    fence = _FENCE.search(text)
+    if fence and re.search(r"[{\[]", fence.group(1)):
+        text = fence.group(1)
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object or array found")
+
+    repairer = _Repairer(text[min(starts):])
+    return repairer.run()
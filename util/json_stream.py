@@ -0,0 +1,134 @@
+"""
+Incremental JSON parsing of streamed LLM output.
+
+JsonStreamParser is fed the completion chunk by chunk and hands back every
+element of the top-level array as soon as its closing bracket arrives, so a
+study plan can be processed day by day while the model is still writing. Once
+the top-level value closes the rest of the stream can be dropped.
+
+An element that is not valid JSON is recorded in errors and skipped, so one
+malformed day does not stop the stream: the full text is still read and can be
+repaired as a whole.
+"""
+
+import json
+from typing import Any, AsyncGenerator, AsyncIterable, List, Optional
+
+
+class JsonStreamParser:
+    """Incremental parser emitting the completed elements of a top-level JSON array
+
+    Text before the first '[' or '{' (e.g. a ```json fence) is skipped. Only
+    object and array elements are emitted; a top-level object is not split and
+    is only available as value once complete.
+
+    Attributes:
+        text: Everything fed so far
+        value: The top-level value, once it is closed and valid JSON
+        closed: Whether the top-level value is closed, so the rest of the stream can be dropped
+        done: Whether the top-level value is closed and valid JSON
+        errors: Why each malformed element, or the top-level value, could not be parsed
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.value: Any = None
+        self.closed = False
+        self.done = False
+        self.errors: List[str] = []
+        self._start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._depth = 0
+        self._top_is_array = False
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume the next chunk of the stream
+
+        Args:
+            chunk: Text of the next streamed chunk
+
+        Returns:
+            list: Valid elements of the top-level array completed by this chunk
+        """
+        if self.closed:
+            return []
+
+        items = []
+        offset = len(self.text)
+        self.text += chunk
+
+        for i in range(offset, len(self.text)):
+            c = self.text[i]
+
+            if self._start is None:
+                if c in "[{":
+                    self._start = i
+                    self._depth = 1
+                    self._top_is_array = c == "["
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+
+            if c == '"':
+                self._in_string = True
+            elif c in "[{":
+                if self._depth == 1 and self._top_is_array:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._item_start is not None:
+                    try:
+                        items.append(json.loads(self.text[self._item_start:i + 1]))
+                    except ValueError as e:
+                        self.errors.append(f"Element at {self._item_start}: {e}")
+                    self._item_start = None
+                elif self._depth == 0:
+                    self.closed = True
+                    try:
+                        self.value = json.loads(self.text[self._start:i + 1])
+                        self.done = not self.errors
+                    except ValueError as e:
+                        self.errors.append(f"Top-level value: {e}")
+                    break
+
+        return items
+
+
+async def iter_json_items(stream: AsyncIterable, parser: Optional[JsonStreamParser] = None) -> AsyncGenerator[Any, None]:
+    """Yield the elements of a streamed top-level JSON array as they complete
+
+    Non-text chunks (such as the final CreateResult of a model client stream)
+    are ignored. The stream is closed, which stops generation, as soon as the
+    top-level value is closed. Malformed elements are skipped, see
+    JsonStreamParser.errors.
+
+    Args:
+        stream: Async iterable of text chunks
+        parser: Parser to use, pass one in to read parser.value or parser.text afterwards
+
+    Returns:
+        AsyncGenerator yielding each completed element
+    """
+    parser = parser or JsonStreamParser()
+    try:
+        async for chunk in stream:
+            if not isinstance(chunk, str):
+                continue
+            for item in parser.feed(chunk):
+                yield item
+            if parser.closed:
+                break
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
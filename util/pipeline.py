@@ -0,0 +1,141 @@
+"""
+Async stage graphs.
+
+A Pipeline is a set of async stages with dependencies. Running it starts every
+stage as soon as the stages it depends on are done, so independent stages run
+concurrently, and records when each stage started and how long it took.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from util import metrics
+
+STAGE_LATENCY = metrics.histogram(
+    "pipeline_stage_seconds", "Wall time of pipeline stages", ("pipeline", "stage"))
+
+
+class StageTiming:
+    """When a stage ran, in seconds from the start of the pipeline run"""
+
+    def __init__(self, start: float, end: float):
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"StageTiming(start={self.start:.3f}, duration={self.duration:.3f})"
+
+
+class PipelineRun:
+    """Results and timings of one pipeline run"""
+
+    def __init__(self, pipeline: "Pipeline", results: Dict[str, Any], timings: Dict[str, StageTiming]):
+        self.pipeline = pipeline
+        self.results = results
+        self.timings = timings
+
+    def __getitem__(self, stage: str):
+        return self.results[stage]
+
+    @property
+    def total(self) -> float:
+        return max((t.end for t in self.timings.values()), default=0.0)
+
+    def critical_path(self) -> List[str]:
+        """Stages on the longest dependency chain, the ones worth making faster"""
+        if not self.timings:
+            return []
+        path = [max(self.timings, key=lambda name: self.timings[name].end)]
+        while True:
+            deps = [d for d in self.pipeline.deps[path[-1]] if d in self.timings]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda name: self.timings[name].end))
+        return list(reversed(path))
+
+    def report(self) -> str:
+        """One line summary of the stage timings"""
+        stages = ", ".join(
+            f"{name} {t.duration * 1000:.0f}ms@{t.start * 1000:.0f}ms"
+            for name, t in sorted(self.timings.items(), key=lambda item: item[1].start))
+        return f"{self.pipeline.name}: {self.total * 1000:.0f}ms [{stages}] critical path: {' > '.join(self.critical_path())}"
+
+
+class Pipeline:
+    """Graph of async stages
+
+    Args:
+        name: Name of the pipeline, used in metrics and reports
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.deps: Dict[str, Sequence[str]] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], deps: Sequence[str] = ()):
+        """Add a stage
+
+        Stages can only depend on stages added before them, so the graph has no cycles.
+
+        Args:
+            name: Name of the stage
+            fn: Coroutine function called with the results of deps, in order
+            deps: Names of the stages this one needs
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already exists")
+        missing = [d for d in deps if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages {missing}")
+        self.stages[name] = fn
+        self.deps[name] = tuple(deps)
+
+    def stage(self, name: str, deps: Sequence[str] = ()):
+        """Decorator form of add()"""
+        def register(fn):
+            self.add(name, fn, deps)
+            return fn
+        return register
+
+    async def run(self) -> PipelineRun:
+        """Run every stage, each as soon as its dependencies are done
+
+        Returns:
+            PipelineRun: Results and timings of the stages
+
+        Raises:
+            Exception: The first error raised by a stage, after cancelling the others
+        """
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, StageTiming] = {}
+
+        async def run_stage(name: str):
+            inputs = await asyncio.gather(*(tasks[d] for d in self.deps[name]))
+            stage_started = time.perf_counter()
+            try:
+                return await self.stages[name](*inputs)
+            finally:
+                ended = time.perf_counter()
+                timings[name] = StageTiming(stage_started - started, ended - started)
+                STAGE_LATENCY.observe(ended - stage_started, pipeline=self.name, stage=name)
+
+        for name in self.stages:
+            tasks[name] = asyncio.ensure_future(run_stage(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            # Let the cancelled stages unwind before reporting the error
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return PipelineRun(self, {name: task.result() for name, task in tasks.items()}, timings)
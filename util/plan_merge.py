@@ -0,0 +1,74 @@
+"""
+One study plan across all of a student's courses.
+
+Each course is planned on its own, so starts of different courses pile up on
+the same days. merge_course_plans() puts the plans of all courses on one
+calendar, naming every due and start after its course, and levels the starts
+with util.plan_personalize: starts beyond the daily limit move to the nearest
+day with room within their own assignment's window. Dues never move.
+"""
+
+import datetime
+from collections import Counter
+from typing import Dict, List, Optional
+
+from util.plan_personalize import personalize_plan
+from util.plan_validator import LEAD_DAYS, format_plan_date, parse_plan_date
+
+
+def course_task(name, course: str) -> str:
+    """Name of a due or start in the merged plan, e.g. "Lab 1 (15-213)"
+
+    The course goes last, so "Start Lab 1 (15-213)" still matches its due.
+    """
+    return f"{name} ({course})"
+
+
+def course_labels(names: Dict[str, str]) -> Dict[str, str]:
+    """Label of each course in the merged plan, its name unless another course has the same one
+
+    Args:
+        names: Name of each course by course ID
+
+    Returns:
+        dict: The label of each course by course ID, "name, course ID" for names used twice
+    """
+    counts = Counter(names.values())
+    return {course_id: name if counts[name] == 1 else f"{name}, {course_id}" for course_id, name in names.items()}
+
+
+def merge_course_plans(plans: Dict[str, list], max_starts_per_day: int,
+                       names: Optional[Dict[str, str]] = None) -> dict:
+    """Merge the plans of several courses into one leveled plan
+
+    Args:
+        plans: Plan of each course, a list of {"date", "dues", "start"} days, by course ID
+        max_starts_per_day: Most starts across all courses on one day
+        names: Name of each course by course ID, the course ID by default
+
+    Returns:
+        dict: {"plan": the merged plan, "busy_days": "m.d" dates still above
+            max_starts_per_day because no start there could move}
+    """
+    labels = course_labels({course_id: (names or {}).get(course_id) or course_id for course_id in plans})
+    days: Dict[datetime.date, dict] = {}
+    for course_id, plan in plans.items():
+        course = labels[course_id]
+        if not isinstance(plan, list) or not plan:
+            continue
+        # Plans are in order, so the first date places later ones after a new year
+        first = parse_plan_date(plan[0].get("date")) if isinstance(plan[0], dict) else None
+        for day in plan:
+            date = parse_plan_date(day.get("date"), first) if isinstance(day, dict) else None
+            if date is None:
+                print(f"Skipping undated plan day of course {course}: {day}")
+                continue
+            merged = days.setdefault(date, {"date": format_plan_date(date), "dues": [], "start": []})
+            merged["dues"].extend(course_task(name, course) for name in day.get("dues", []))
+            merged["start"].extend(course_task(name, course) for name in day.get("start", []))
+
+    merged_plan: List[dict] = [days[date] for date in sorted(days)]
+    leveled = personalize_plan(merged_plan, LEAD_DAYS, max_starts_per_day, LEAD_DAYS)
+    busy_days = [day["date"] for day in leveled if len(day["start"]) > max_starts_per_day]
+    return {"plan": leveled, "busy_days": busy_days}
+
@@ -0,0 +1,119 @@
+"""
+Deterministic per-user adjustment of a shared study plan.
+
+A course's plan template is generated once, with the default lead time of
+util.plan_validator. personalize_plan() turns it into one student's plan
+without an LLM call: every start moves by the difference between the
+student's preferred lead time and the default, and starts beyond the
+student's daily limit move to the nearest day with room, earlier ones first.
+Dues never move, and a start never moves past its due or before the previous
+due of the same assignment.
+"""
+
+import datetime
+from typing import Dict, List, Optional
+
+from util.plan_validator import LEAD_DAYS, format_plan_date, parse_plan_date, task_key
+
+
+class _Start:
+    def __init__(self, name, date: datetime.date, earliest: datetime.date, latest: Optional[datetime.date]):
+        self.name = name
+        self.date = date
+        self.earliest = earliest
+        self.latest = latest
+
+
+def personalize_plan(plan, lead_days: int = LEAD_DAYS, max_starts_per_day: Optional[int] = None,
+                     template_lead_days: int = LEAD_DAYS):
+    """Adjust a plan template to a student's preferences
+
+    Args:
+        plan: The template, a list of {"date", "dues", "start"} days
+        lead_days: Days before a due the student wants to start
+        max_starts_per_day: Most starts the student wants on one day, None for no limit
+        template_lead_days: Lead time the template was made with
+
+    Returns:
+        list: The personalized plan, or plan itself when there is nothing to
+            change or its dates cannot be read
+    """
+    if lead_days == template_lead_days and not max_starts_per_day:
+        return plan
+    if not isinstance(plan, list) or not plan or not all(isinstance(day, dict) for day in plan):
+        return plan
+    first = parse_plan_date(plan[0].get("date"))
+    dates = [parse_plan_date(day.get("date"), first) for day in plan]
+    if first is None or None in dates:
+        return plan
+    first = min(dates)
+
+    dues: Dict[str, List[datetime.date]] = {}
+    for day, date in zip(plan, dates):
+        for due in day.get("dues", []):
+            dues.setdefault(task_key(due), []).append(date)
+    for key in dues:
+        dues[key].sort()
+
+    shift = datetime.timedelta(days=lead_days - template_lead_days)
+    starts: List[_Start] = []
+    for day, date in zip(plan, dates):
+        for name in day.get("start", []):
+            due_dates = dues.get(task_key(name), [])
+            # The start belongs to the first due of the same name on or after it
+            latest = next((d for d in due_dates if d >= date), None)
+            previous = [d for d in due_dates if d < date]
+            earliest = max(first, previous[-1] + datetime.timedelta(days=1)) if previous else first
+            start = _Start(name, date, earliest, latest)
+            start.date = min(max(date - shift, earliest), latest or date - shift)
+            starts.append(start)
+
+    if max_starts_per_day:
+        _level(starts, max_starts_per_day)
+
+    days: Dict[datetime.date, dict] = {}
+    for day, date in zip(plan, dates):
+        days.setdefault(date, {"date": format_plan_date(date), "dues": [], "start": []})
+        days[date]["dues"].extend(day.get("dues", []))
+    for start in starts:
+        days.setdefault(start.date, {"date": format_plan_date(start.date), "dues": [], "start": []})
+        days[start.date]["start"].append(start.name)
+    return [days[date] for date in sorted(days) if days[date]["dues"] or days[date]["start"]]
+
+
+def _level(starts: List[_Start], cap: int):
+    """Move starts beyond cap on a day to the nearest day with room
+
+    Earlier days are tried first, so moved assignments get more time, then
+    later days before the due.
+    """
+    by_date: Dict[datetime.date, List[_Start]] = {}
+    for start in starts:
+        by_date.setdefault(start.date, []).append(start)
+    one_day = datetime.timedelta(days=1)
+    # Latest days first, so moved starts are counted where they land
+    for date in sorted(by_date, reverse=True):
+        crowded = by_date[date]
+        # Starts that can move furthest go first
+        crowded.sort(key=lambda s: s.earliest)
+        i = 0
+        while len(crowded) > cap and i < len(crowded):
+            start = crowded[i]
+            target = _room(by_date, cap, date - one_day, start.earliest, -one_day)
+            if target is None and start.latest is not None:
+                target = _room(by_date, cap, date + one_day, start.latest - one_day, one_day)
+            if target is None:
+                i += 1
+                continue
+            crowded.pop(i)
+            start.date = target
+            by_date.setdefault(target, []).append(start)
+
+
+def _room(by_date, cap: int, date: datetime.date, bound: datetime.date, step: datetime.timedelta):
+    """Nearest day from date towards bound, included, with fewer than cap starts"""
+    while (date >= bound) if step.days < 0 else (date <= bound):
+        if len(by_date.get(date, [])) < cap:
+            return date
+        date += step
+    return None
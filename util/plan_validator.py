@@ -0,0 +1,200 @@
+"""
+Deterministic study plan validator and fixer.
+
+check_plan() verifies what the plan review agent used to be asked to verify:
+every day matches prompts.json_schemas.STUDY_PLAN_DAY_SCHEMA with an "m.d"
+date, and every due has a start at least LEAD_DAYS days earlier. Missing or
+late starts are fixed by starting the assignment LEAD_DAYS before its due
+date. Only problems it cannot fix, such as days without a readable date, are
+left for the review agent.
+"""
+
+import datetime
+import os
+import re
+from typing import Dict, List, Optional
+
+from prompts import json_schemas
+from util.schema_validator import SchemaValidationError, compile_validator
+
+# Days an assignment must be started before it is due
+LEAD_DAYS = int(os.getenv("PLAN_LEAD_DAYS", "3"))
+
+# Plans do not carry a year; dates far before the first day of the plan are in the next year
+_BASE_YEAR = 2000
+_ROLLOVER_DAYS = 183
+
+_DATE = re.compile(r"^\s*(\d{1,2})\s*[./-]\s*(\d{1,2})\s*$")
+_START_PREFIX = re.compile(r"^(start|begin|work on)\s*:?\s+", re.IGNORECASE)
+
+
+def parse_plan_date(value: str, first: Optional[datetime.date] = None) -> Optional[datetime.date]:
+    """Parse an "m.d" plan date
+
+    Args:
+        value: The date as written in the plan
+        first: First date of the plan, to place dates after a new year
+
+    Returns:
+        date: The date, or None if value is not an "m.d" date
+    """
+    match = _DATE.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    month, day = int(match.group(1)), int(match.group(2))
+    try:
+        date = datetime.date(_BASE_YEAR, month, day)
+    except ValueError:
+        return None
+    if first is not None and (first - date).days > _ROLLOVER_DAYS:
+        # Feb 29 does not exist in the next year, use Feb 28
+        date = datetime.date(_BASE_YEAR + 1, month, min(day, 28) if month == 2 else day)
+    return date
+
+
+def format_plan_date(date: datetime.date) -> str:
+    return f"{date.month}.{date.day}"
+
+
+def task_key(name) -> str:
+    """Name of a due or start, normalized to match one with the other"""
+    return _START_PREFIX.sub("", str(name).strip()).strip().lower()
+
+
+class PlanCheck:
+    """Result of check_plan()
+
+    Attributes:
+        plan: The fixed plan, or the original one when it could not be fixed
+        issues: Problems found in the original plan
+        fixes: Changes made to fix them
+        shortened: Assignments due too soon after the first day of the plan to start lead_days before
+        unfixable: Problems left for the review agent
+    """
+
+    def __init__(self, plan, lead_days: int = LEAD_DAYS):
+        self.plan = plan
+        self.lead_days = lead_days
+        self.issues: List[str] = []
+        self.fixes: List[str] = []
+        self.shortened: List[str] = []
+        self.unfixable: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        """Whether the fixed plan meets every requirement"""
+        return not self.unfixable
+
+    def review(self) -> str:
+        """Review of the plan, in place of the review agent's"""
+        if not self.issues:
+            return f"The plan is valid: every due assignment starts at least {self.lead_days} days before it is due."
+        review = []
+        if self.fixes:
+            review.append(f"Fixed {len(self.fixes)} issue(s): " + " ".join(self.fixes))
+        if self.shortened:
+            review.append(f"Less than {self.lead_days} days to prepare: " + " ".join(self.shortened))
+        return " ".join(review)
+
+
+def _check_day(day):
+    """Check the shape of a plan day when no JSON Schema library is installed"""
+    if not isinstance(day, dict):
+        raise SchemaValidationError("day is not an object")
+    for key in json_schemas.STUDY_PLAN_DAY_SCHEMA["required"]:
+        if key not in day:
+            raise SchemaValidationError(f"'{key}' is a required property")
+    if not isinstance(day["date"], str):
+        raise SchemaValidationError("date is not a string")
+    for key in ("dues", "start"):
+        if not isinstance(day[key], list) or not all(isinstance(name, str) for name in day[key]):
+            raise SchemaValidationError(f"{key} is not a list of strings")
+
+
+def check_plan(plan, lead_days: int = LEAD_DAYS) -> PlanCheck:
+    """Validate a study plan and fix the starts of its assignments
+
+    Args:
+        plan: The parsed study plan, a list of {"date", "dues", "start"} days
+        lead_days: Days each assignment must start before it is due
+
+    Returns:
+        PlanCheck: The fixed plan and what was found and changed
+    """
+    check = PlanCheck(plan, lead_days)
+    if not isinstance(plan, list) or not plan:
+        check.unfixable.append("The plan is not a non-empty list of days.")
+        return check
+
+    validator = compile_validator(json_schemas.STUDY_PLAN_DAY_SCHEMA)
+    for i, day in enumerate(plan):
+        try:
+            if validator is not None:
+                validator(day)
+            else:
+                _check_day(day)
+        except SchemaValidationError as e:
+            check.unfixable.append(f"Day {i + 1} is malformed: {e}")
+            continue
+        if parse_plan_date(day["date"]) is None:
+            check.unfixable.append(f"Day {i + 1} has date {day['date']!r}, not a m.d date.")
+    if check.unfixable:
+        check.issues.extend(check.unfixable)
+        return check
+
+    days = [dict(day, dues=list(day["dues"]), start=list(day["start"])) for day in plan]
+    first = parse_plan_date(days[0]["date"])
+    dates = [parse_plan_date(day["date"], first) for day in days]
+    first = min(dates)
+    by_date: Dict[datetime.date, dict] = {}
+    for day, date in zip(days, dates):
+        by_date.setdefault(date, day)
+
+    # Dues of the same name (e.g. weekly readings) are each started after the previous one is due
+    previous_due: Dict[str, datetime.date] = {}
+    dues = sorted(((date, due) for day, date in zip(days, dates) for due in day["dues"]), key=lambda d: d[0])
+    added_days = False
+
+    for due_date, due in dues:
+        key = task_key(due)
+        after = previous_due.get(key)
+        if after == due_date:
+            continue
+        previous_due[key] = due_date
+        target = max(first, due_date - datetime.timedelta(days=lead_days))
+        if target > due_date - datetime.timedelta(days=lead_days):
+            # Nothing earlier than the first day of the plan to start on
+            shortened = (f"{due} (due {format_plan_date(due_date)}) can start at most "
+                         f"{(due_date - target).days} day(s) before, on the first day of the plan.")
+            check.issues.append(shortened)
+            check.shortened.append(shortened)
+
+        starts = [
+            (date, day, name) for day, date in zip(days, dates) for name in day["start"]
+            if task_key(name) == key and date <= due_date and (after is None or date > after)
+        ]
+        if any(date <= target for date, _day, _name in starts):
+            continue
+
+        if starts:
+            latest = max(date for date, _day, _name in starts)
+            check.issues.append(f"{due} starts on {format_plan_date(latest)}, less than {lead_days} days before "
+                                f"it is due on {format_plan_date(due_date)}.")
+            for _date, day, name in starts:
+                day["start"].remove(name)
+        else:
+            check.issues.append(f"{due} (due {format_plan_date(due_date)}) has no start date.")
+
+        if target not in by_date:
+            new_day = {"date": format_plan_date(target), "dues": [], "start": []}
+            days.append(new_day)
+            dates.append(target)
+            by_date[target] = new_day
+            added_days = True
+        by_date[target]["start"].append(due)
+        check.fixes.append(f"{due} now starts on {format_plan_date(target)}.")
+
+    if added_days:
+        days = [day for _date, day in sorted(zip(dates, days), key=lambda d: d[0])]
+    check.plan = days
+    return check
@@ -0,0 +1,67 @@
+"""
+Compiled JSON Schema validation with optional dependencies.
+
+Uses fastjsonschema (schemas compiled to Python code, listed in
+requirements.txt), falls back to jsonschema, and disables validation when
+neither is available.
+"""
+
+import functools
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+
+class SchemaValidationError(ValueError):
+    """Raised when a document does not match its JSON Schema"""
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(schema_json: str) -> Optional[Callable[[Any], None]]:
+    schema = json.loads(schema_json)
+
+    if fastjsonschema is not None:
+        compiled = fastjsonschema.compile(schema)
+
+        def validate(data):
+            try:
+                compiled(data)
+            except fastjsonschema.JsonSchemaException as e:
+                raise SchemaValidationError(str(e))
+        return validate
+
+    if jsonschema is not None:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator = validator_class(schema)
+
+        def validate(data):
+            error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+            if error is not None:
+                raise SchemaValidationError(error.message)
+        return validate
+
+    return None
+
+
+def compile_validator(schema: dict) -> Optional[Callable[[Any], None]]:
+    """Compile a JSON Schema into a validator function
+
+    Validators are cached, so agents sharing a schema share the compiled code.
+
+    Args:
+        schema: The JSON Schema to compile
+
+    Returns:
+        Callable raising SchemaValidationError on invalid data, or None if no
+        validation library is installed
+    """
+    return _compile(json.dumps(schema, sort_keys=True))
@@ -0,0 +1,95 @@
+"""
+In-process request coalescing.
+
+Concurrent calls with the same key share the result of the first one instead of
+each doing the work. Flask runs every async view in its own event loop, which is
+closed when the view returns, so the shared work runs on a thread of its own and
+its result is a concurrent.futures.Future that any loop can await.
+
+The shared work runs under its own Deadline, not the one of the caller that
+started it. Every caller waits under its own deadline only, and the shared
+deadline is cancelled once every caller has given up, so the work lasts as long
+as the caller willing to wait longest.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from util.deadline import Deadline
+
+
+class _Flight:
+    """A shared call in flight and the callers waiting for it"""
+
+    def __init__(self):
+        self.future = concurrent.futures.Future()
+        # Running futures cannot be cancelled, so a caller giving up leaves it alone
+        self.future.set_running_or_notify_cancel()
+        self.deadline = Deadline()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Flight] = {}
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[Deadline], Awaitable[Any]], deadline: Optional[Deadline] = None) -> Any:
+        """Run fn, unless a call with the same key is in flight, then await its result
+
+        Args:
+            key: Key identifying identical calls
+            fn: Coroutine function doing the work, called with the Deadline of the shared call
+            deadline: Deadline of this caller, it stops waiting when it passes or is cancelled
+
+        Returns:
+            The result of fn, shared by every caller that joined while it ran
+
+        Raises:
+            DeadlineExceeded, RequestCancelled: If this caller's deadline passed or was cancelled first
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._calls[key] = flight
+            flight.waiters += 1
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, fn), name=f"singleflight-{key}",
+                             daemon=True).start()
+
+        async def wait():
+            return await asyncio.wrap_future(flight.future)
+
+        try:
+            return await (deadline.run(wait()) if deadline else wait())
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = flight.waiters == 0 and not flight.future.done()
+                if abandoned and self._calls.get(key) is flight:
+                    # Later callers start a new call rather than join a cancelled one
+                    del self._calls[key]
+            if abandoned:
+                flight.deadline.cancel(f"every caller of shared call {key} gave up")
+
+    def _run(self, key: str, flight: _Flight, fn: Callable[[Deadline], Awaitable[Any]]):
+        try:
+            result = asyncio.run(flight.deadline.run(fn(flight.deadline)))
+        except BaseException as e:
+            flight.future.set_exception(e)
+        else:
+            flight.future.set_result(result)
+        finally:
+            with self._lock:
+                if self._calls.get(key) is flight:
+                    del self._calls[key]
@@ -0,0 +1,175 @@
+"""
+Deterministic study scheduler.
+
+schedule_study_plan() turns the tasks of a syllabus analysis
+(prompts.json_schemas.SYLLABUS_ANALYSIS_SCHEMA: a difficulty and a
+day_needed [min, max] range per kind of task) and the dated deliverables of a
+calendar (util.calendar_diff.extract_deliverables) into the same
+[{"date", "dues", "start"}] plan the plan agent writes, in milliseconds and
+without an LLM call.
+
+Every deliverable that matches a task of the analysis, or reads like
+something due, becomes a due. Its start is placed day_needed[1] days before
+the due if possible, otherwise as early as possible within its range, with at
+most max_starts_per_day starts on one day. The plan begins the longest
+day_needed before the first date of the calendar, so the first dues are
+started as early as the later ones. Dues are scheduled earliest first,
+so a crowded day goes to the assignments due soonest.
+"""
+
+import datetime
+import re
+from typing import Dict, List, Optional, Tuple
+
+from util.plan_validator import LEAD_DAYS, format_plan_date, parse_plan_date
+
+# Most assignments started on one day, unless the caller gives a cap
+DEFAULT_MAX_STARTS_PER_DAY = 2
+
+# Words of calendar lines that are due even without a matching task
+_DUE_WORDS = {"due", "deadline", "submit", "submission", "exam", "midterm", "final", "quiz", "test",
+              "homework", "hw", "assignment", "lab", "project", "essay", "paper", "report", "presentation"}
+# Short forms of task names
+_ALIASES = {"hw": "homework", "pset": "problem", "ps": "problem", "proj": "project", "asst": "assignment"}
+_DUE_MARKER = re.compile(r"\b(due|deadline)\b\s*:?", re.IGNORECASE)
+_WORD = re.compile(r"[a-z]+")
+
+
+def _words(text: str) -> List[str]:
+    words = []
+    for word in _WORD.findall(str(text).lower()):
+        word = _ALIASES.get(word, word)
+        words.append(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return words
+
+
+def match_task(text: str, tasks: Dict[str, dict]) -> Optional[str]:
+    """Name of the task a deliverable is an instance of, e.g. "Lab" for "Lab 2 due"
+
+    Args:
+        text: Text of the deliverable
+        tasks: Tasks of the syllabus analysis by name
+
+    Returns:
+        str: The task whose name matches the most words of text, None if none matches
+    """
+    text_words = set(_words(text))
+    best, best_score = None, 0
+    for name in tasks:
+        name_words = _words(name)
+        if name_words and all(word in text_words for word in name_words) and len(name_words) > best_score:
+            best, best_score = name, len(name_words)
+    return best
+
+
+def _due_name(text: str) -> str:
+    name = _DUE_MARKER.sub(" ", text)
+    return re.sub(r"\s+", " ", name).strip(" -:|,") or text
+
+
+def _day_range(task: Optional[dict]) -> Tuple[int, int]:
+    day_needed = task.get("day_needed") if isinstance(task, dict) else None
+    if isinstance(day_needed, list) and len(day_needed) == 2:
+        try:
+            low, high = sorted(max(0, int(round(float(d)))) for d in day_needed)
+            return low, high
+        except (TypeError, ValueError):
+            pass
+    return LEAD_DAYS, LEAD_DAYS
+
+
+class ScheduledPlan:
+    """Result of schedule_study_plan()
+
+    Attributes:
+        plan: The study plan, a list of {"date", "dues", "start"} days
+        scheduled: Assignments given a start
+        over_cap: Assignments started on a day already at the cap, because no day in reach had room
+        shortened: Assignments started later than day_needed[0] days before their due
+    """
+
+    def __init__(self, plan: List[dict], scheduled: int, over_cap: List[str], shortened: List[str]):
+        self.plan = plan
+        self.scheduled = scheduled
+        self.over_cap = over_cap
+        self.shortened = shortened
+
+    def review(self) -> str:
+        """Summary of the schedule, in place of the review agent's"""
+        review = f"Scheduled {self.scheduled} assignment(s) from the syllabus estimates."
+        if self.shortened:
+            review += f" Less time than estimated for: {', '.join(self.shortened)}."
+        if self.over_cap:
+            review += f" Started on a busy day: {', '.join(self.over_cap)}."
+        return review
+
+
+def schedule_study_plan(analysis: dict, deliverables: List[dict],
+                        max_starts_per_day: Optional[int] = None) -> ScheduledPlan:
+    """Compute a study plan from syllabus task estimates and calendar due dates
+
+    Args:
+        analysis: The syllabus analysis, with its tasks
+        deliverables: {"date": "m.d", "text"} deliverables of the calendar, in calendar order
+        max_starts_per_day: Most starts on one day, DEFAULT_MAX_STARTS_PER_DAY by default
+
+    Returns:
+        ScheduledPlan: The plan and what could not be scheduled as estimated
+    """
+    cap = max_starts_per_day or DEFAULT_MAX_STARTS_PER_DAY
+    tasks = analysis.get("tasks") if isinstance(analysis, dict) else None
+    tasks = tasks if isinstance(tasks, dict) else {}
+    if not deliverables:
+        return ScheduledPlan([], 0, [], [])
+
+    # Calendars are in order, so the first date places later ones after a new year
+    anchor = parse_plan_date(deliverables[0]["date"])
+    dues = []
+    for deliverable in deliverables:
+        date = parse_plan_date(deliverable["date"], anchor)
+        if date is None:
+            continue
+        task = match_task(deliverable["text"], tasks)
+        if task is None and not set(_words(deliverable["text"])) & _DUE_WORDS:
+            # Lectures and other events without work to plan
+            continue
+        dues.append((date, _due_name(deliverable["text"]), _day_range(tasks.get(task))))
+    if not dues:
+        return ScheduledPlan([], 0, [], [])
+    # The plan starts early enough for the first dues to get their full range too
+    longest = max(high for _date, _name, (_low, high) in dues)
+    plan_start = min(min(date for date, _name, _range in dues), anchor) - datetime.timedelta(days=longest)
+
+    one_day = datetime.timedelta(days=1)
+    starts: Dict[datetime.date, List[str]] = {}
+    over_cap, shortened = [], []
+    # Earliest due first, so crowded days go to what is due soonest
+    for due_date, name, (low, high) in sorted(dues, key=lambda d: (d[0], d[2][1])):
+        latest = max(plan_start, due_date - datetime.timedelta(days=low))
+        preferred = max(plan_start, due_date - datetime.timedelta(days=high))
+        start = _free_day(starts, cap, preferred, latest, one_day) \
+            or _free_day(starts, cap, preferred - one_day, plan_start, -one_day) \
+            or _free_day(starts, cap, latest + one_day, due_date, one_day)
+        if start is None:
+            start = preferred
+            over_cap.append(name)
+        if (due_date - start).days < low:
+            shortened.append(name)
+        starts.setdefault(start, []).append(name)
+
+    days: Dict[datetime.date, dict] = {}
+    for due_date, name, _range in dues:
+        days.setdefault(due_date, {"date": format_plan_date(due_date), "dues": [], "start": []})["dues"].append(name)
+    for date, names in starts.items():
+        days.setdefault(date, {"date": format_plan_date(date), "dues": [], "start": []})["start"].extend(names)
+    plan = [days[date] for date in sorted(days)]
+    return ScheduledPlan(plan, len(dues), over_cap, shortened)
+
+
+def _free_day(starts, cap: int, date: datetime.date, bound: datetime.date, step: datetime.timedelta):
+    """First day from date towards bound, included, with fewer than cap starts"""
+    while (date <= bound) if step.days > 0 else (date >= bound):
+        if len(starts.get(date, [])) < cap:
+            return date
+        date += step
+    return None
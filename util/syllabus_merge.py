@@ -0,0 +1,106 @@
+"""
+Deterministic merge of syllabus analyses of separate parts of one syllabus.
+
+Chunked syllabus analysis (see controller.schedule_service.analyze_syllabus)
+analyzes page groups separately. merge_syllabus_analyses() combines the
+partial analyses, in page order, into the single analysis shape
+(prompts.json_schemas.SYLLABUS_ANALYSIS_SCHEMA) the rest of the pipeline uses.
+The same inputs always give the same output.
+"""
+
+from typing import Dict, List, Sequence
+
+# Difficulties the model is asked for, from easiest
+DIFFICULTY_ORDER = ["easy", "medium", "hard"]
+
+
+def split_pages(pages: Dict, chunk_pages: int) -> List[Dict[str, str]]:
+    """Split extracted page text into groups of consecutive pages
+
+    Args:
+        pages: Page text by page number
+        chunk_pages: Pages per group
+
+    Returns:
+        list: Page dicts, in page order
+    """
+    numbers = sorted(pages, key=lambda n: int(n))
+    return [
+        {str(n): pages[n] for n in numbers[i:i + chunk_pages]}
+        for i in range(0, len(numbers), chunk_pages)
+    ]
+
+
+def _difficulty_rank(difficulty) -> int:
+    value = str(difficulty).strip().lower()
+    return DIFFICULTY_ORDER.index(value) if value in DIFFICULTY_ORDER else -1
+
+
+def _merge_task(merged: dict, task: dict):
+    if _difficulty_rank(task.get("difficulty")) > _difficulty_rank(merged.get("difficulty")):
+        merged["difficulty"] = task["difficulty"]
+
+    day_needed = task.get("day_needed")
+    if isinstance(day_needed, list) and len(day_needed) == 2:
+        current = merged.get("day_needed")
+        if isinstance(current, list) and len(current) == 2:
+            merged["day_needed"] = [min(current[0], day_needed[0]), max(current[1], day_needed[1])]
+        else:
+            merged["day_needed"] = list(day_needed)
+
+
+def merge_syllabus_analyses(analyses: Sequence[dict]) -> dict:
+    """Merge syllabus analyses of consecutive page groups
+
+    - tasks: same-named tasks (case-insensitive) are merged, keeping the hardest
+      difficulty and the widest day_needed range
+    - topic: union in order of first appearance, case-insensitive
+    - contains_schedule: true if any part contains a schedule
+    - thought: the distinct thoughts in page order
+
+    Args:
+        analyses: Analyses of the page groups, in page order
+
+    Returns:
+        dict: The merged analysis
+    """
+    tasks: Dict[str, dict] = {}
+    task_names: Dict[str, str] = {}
+    topics: List[str] = []
+    seen_topics = set()
+    thoughts: List[str] = []
+    contains_schedule = False
+
+    for analysis in analyses:
+        if not isinstance(analysis, dict):
+            continue
+
+        for name, task in (analysis.get("tasks") or {}).items():
+            if not isinstance(task, dict):
+                continue
+            key = name.strip().lower()
+            if key not in task_names:
+                task_names[key] = name.strip()
+                tasks[key] = {}
+            _merge_task(tasks[key], task)
+
+        for topic in analysis.get("topic") or []:
+            key = str(topic).strip().lower()
+            if key and key not in seen_topics:
+                seen_topics.add(key)
+                topics.append(str(topic).strip())
+
+        contains_schedule = contains_schedule or bool(analysis.get("contains_schedule"))
+
+        thought = analysis.get("thought")
+        if isinstance(thought, str) and thought.strip() and thought.strip() not in thoughts:
+            thoughts.append(thought.strip())
+
+    merged = {
+        "tasks": {task_names[key]: task for key, task in tasks.items()},
+        "topic": topics,
+        "contains_schedule": contains_schedule,
+    }
+    if thoughts:
+        merged["thought"] = " ".join(thoughts)
+    return merged
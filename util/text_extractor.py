@@ -17,5 +17,29 @@ def json_extractor(response):
         raise ValueError("Could not extract valid JSON from the response")
 
 
+def find_json_payload(text):
+    """Find the JSON object or array embedded in text
+
+    Unlike a greedy first-bracket-to-last-bracket regex this decodes from the
+    first opening bracket, so text after the JSON (or a second JSON value) does
+    not break it. Only the first bracket is tried: a value decoded from a later
+    one is a fragment of malformed JSON, which is left to the repair.
+
+    Args:
+        text (str): Model output that may wrap JSON in prose or code fences
+
+    Returns:
+        tuple: (parsed value, JSON text) or (None, None) if no valid JSON starts at the first bracket
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None, None
+    start = min(starts)
+    try:
+        value, end = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None, None
+    return value, text[start:end]
+
 if __name__ == '__main__':
     pass
\ No newline at end of file